@@ -0,0 +1,124 @@
+"""
+fast_path.py
+Kural tabanlı hızlı yol: tek araçla cevaplanan basit sorular ("hesaplarım",
+"maaş hesabımın bakiyesi", "döviz kurları", "eft ücreti") için LLM'e hiç
+gitmeden doğrudan MCP aracını seçer.
+
+Yalnızca parametresi metinden güvenle çıkarılabilen, salt-okunur araçlar
+yönlendirilir. Sayı içeren, para hareketi / hesaplama / işlem geçmişi /
+şube-ATM gibi bağlam isteyen mesajlar her zaman ReAct akışına bırakılır.
+"""
+
+from __future__ import annotations
+import re
+from typing import Any, Dict, Optional, Tuple
+
+from mcp_server.data.account_types import fold_tr  # Türkçe katlama: tek kaynak
+
+# Ajanın tool wrapper'ı da bu listeleri kullanır (tek kaynak)
+TRANSACTION_KEYWORDS = ("işlem", "hareket", "transaction", "transactions")
+BALANCE_KEYWORDS = ("bakiye", "balance")
+NEARBY_KEYWORDS = ("en yakın", "en yakin", "yakın", "yakin", "yakindaki", "yakındaki", "civarında")
+BRANCH_KEYWORDS = ("atm", "şube", "sube")
+
+def _folded(words) -> Tuple[str, ...]:
+    return tuple(dict.fromkeys(fold_tr(w) for w in words))
+
+
+_TRANSACTION_F = _folded(TRANSACTION_KEYWORDS)
+_NEARBY_F = _folded(NEARBY_KEYWORDS)
+_BRANCH_F = _folded(BRANCH_KEYWORDS)
+
+# bu kelimeler geçen mesajlar araç parametresi / onay gerektirir -> ReAct
+# ("yatır-" fiili atlanır, "yatırım" hesap türü adı değil)
+_SKIP_RE = re.compile(
+    r"\b(gonder\w*|transfer\w*|yatir(?!im)\w*|aktar\w*|ode\w*|cevir\w*|hesapla(?!r)\w*|simul\w*|"
+    r"kredi\w*|taksit\w*|limit\w*|artir\w*|ac\w*|kapat\w*|iptal\w*|neden|nasil|karsilastir\w*)\b"
+)
+MAX_WORDS = 8
+
+_PORTFOLIO_TYPES = {
+    "dusuk": "düşük", "korumali": "korumalı", "orta": "orta",
+    "dengeli": "dengeli", "yuksek": "yüksek", "buyume": "büyüme",
+}
+
+# (intent, tool, regex, argüman çıkarıcı) — sırayla denenir, ilk eşleşen kazanır
+_RULES = [
+    ("balance_by_type", "get_balance_by_account_type",
+     re.compile(r"\b(vadeli|vadesiz|maas|yatirim)\b.*\bbakiye"),
+     lambda m: {"account_type": m.group(1)}),
+    ("balance_by_type", "get_balance_by_account_type",
+     re.compile(r"\bbakiye\w*\b.*\b(vadeli|vadesiz|maas|yatirim)\b"),
+     lambda m: {"account_type": m.group(1)}),
+    ("accounts", "get_accounts",
+     re.compile(r"\b(hesaplar\w*|bakiye\w*)\b"),
+     lambda m: {}),
+    ("cards", "list_customer_cards",
+     re.compile(r"\bkartlar\w*\b"),
+     lambda m: {}),
+    ("fx_rates", "get_exchange_rates",
+     re.compile(r"\b(doviz|kurlar\w*|kuru|dolar|euro|avro|sterlin)\b"),
+     lambda m: {}),
+    ("interest_rates", "get_interest_rates",
+     re.compile(r"\bfaiz\b.*\boran"),
+     lambda m: {}),
+    ("all_fees", "get_all_fees",
+     re.compile(r"\b(tum|butun)\b.*\b(ucret|masraf)|\b(ucret|masraf)\w*\s+(tablo|liste)"),
+     lambda m: {}),
+    ("fee", "get_fee",
+     re.compile(r"\b(eft|havale|fast|swift)\b.*\b(ucret|masraf|komisyon)"),
+     lambda m: {"service_code": m.group(1)}),
+    ("portfolios", "list_portfolios",
+     re.compile(r"\bportfoy\w*\b"),
+     lambda m: {}),
+]
+
+
+class IntentRouter:
+    """
+    route(text) -> (intent, tool_name, args) | None
+    available_tools verilirse yalnızca yüklü araçlara yönlendirir.
+    """
+
+    def __init__(self, available_tools=None):
+        self.available_tools = set(available_tools or [])
+        self.hits = 0
+        self.misses = 0
+
+    def route(self, text: str) -> Optional[Tuple[str, str, Dict[str, Any]]]:
+        match = self._match(text)
+        if match:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return match
+
+    def _match(self, text: str) -> Optional[Tuple[str, str, Dict[str, Any]]]:
+        low = fold_tr(text)
+        if not low or len(low.split()) > MAX_WORDS:
+            return None
+        if any(ch.isdigit() for ch in low) or _SKIP_RE.search(low):
+            return None
+        if any(k in low for k in _TRANSACTION_F):
+            return None  # hesap sorma akışı ReAct wrapper'ında
+        if any(k in low for k in _NEARBY_F) or any(k in low for k in _BRANCH_F):
+            return None  # şehir/konum gerekir
+
+        for intent, tool, rx, extract in _RULES:
+            if self.available_tools and tool not in self.available_tools:
+                continue
+            m = rx.search(low)
+            if not m:
+                continue
+            args = extract(m)
+            if tool == "list_portfolios":
+                kind = next((v for k, v in _PORTFOLIO_TYPES.items() if re.search(rf"\b{k}\b", low)), None)
+                if kind:
+                    args["portfolio_type"] = kind
+            return intent, tool, args
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0}
@@ -0,0 +1,320 @@
+"""
+llm_gateway.py
+ChatOpenAI istekleri için ortak bağlantı havuzu + dayanıklılık katmanı.
+
+ChatOpenAI'ye http_async_client olarak verilen AsyncClient'ın taşıma katmanı
+(LLMGatewayTransport) her /chat/completions isteğine şunları uygular:
+- Ortak havuz: tüm modeller / bind_tools kopyaları aynı keep-alive havuzunu
+  kullanır; h2 paketi kuruluysa HTTP/2 (tek bağlantı üzerinde çoklu istek).
+- Süre sınırı: llm_deadline(...) ile turun bitiş zamanı verilir. Her deneme
+  kalan süreyle sınırlanır; kalan süre LLM_MIN_ATTEMPT_SECONDS'ın altına
+  düşünce yeni deneme başlatılmaz.
+- Tekrar bütçesi: tekrar + hedge istekleri, son istek sayısının
+  LLM_RETRY_BUDGET_RATIO oranını (+ LLM_RETRY_BUDGET_MIN) aşamaz; upstream
+  çöktüğünde tekrarlar yükü katlamaz.
+- Hedge: yanıt başlıkları gözlenen p95 gecikmesi içinde gelmezse aynı istek
+  ikinci kez gönderilir, önce dönen kazanır, diğeri iptal edilir.
+- Yedek: birincil uç tükenirse istek LLM_FALLBACK_API_BASE / LLM_FALLBACK_MODEL'e
+  (model alanı ve Authorization yeniden yazılarak) gönderilir. Deneme süre
+  aşımıyla biterse aynı uçta tekrar yerine doğrudan yedeğe geçilir.
+- Metrikler: her çağrı "llm_call" olayı olarak loglanır; stats() uç başına
+  p50/p95/p99, deneme/hedge/yedek sayılarını döner.
+
+Gecikme başlıklar gelene kadar ölçülür (akışsız çağrılarda üretim süresinin
+tamamı, akışlı çağrılarda ilk token'a kadar geçen süre).
+"""
+
+from __future__ import annotations
+import asyncio
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import httpx
+
+from stage_timing import record as record_stage
+
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "32"))
+LLM_KEEPALIVE_SECONDS = float(os.getenv("LLM_KEEPALIVE_SECONDS", "60"))
+LLM_ATTEMPT_TIMEOUT_SECONDS = float(os.getenv("LLM_ATTEMPT_TIMEOUT_SECONDS", "15"))
+LLM_MIN_ATTEMPT_SECONDS = float(os.getenv("LLM_MIN_ATTEMPT_SECONDS", "1"))
+LLM_MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", "3"))
+LLM_RETRY_BUDGET_RATIO = float(os.getenv("LLM_RETRY_BUDGET_RATIO", "0.2"))
+LLM_RETRY_BUDGET_MIN = int(os.getenv("LLM_RETRY_BUDGET_MIN", "5"))
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE", "1") not in ("0", "false", "False")
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_HEDGE_MIN_DELAY_SECONDS = float(os.getenv("LLM_HEDGE_MIN_DELAY_SECONDS", "0.5"))
+LLM_TURN_DEADLINE_SECONDS = float(os.getenv("LLM_TURN_DEADLINE_SECONDS", "25"))
+LLM_METRICS_WINDOW = 500        # p95 ve raporlar için son N başarılı çağrı
+LLM_BUDGET_WINDOW_SECONDS = 60  # tekrar bütçesinin baktığı pencere
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+log = logging.getLogger("advanced-agent")
+
+try:  # HTTP/2 isteğe bağlı: h2 yoksa HTTP/1.1 keep-alive havuzu
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("llm_deadline", default=None)
+
+
+@contextlib.contextmanager
+def llm_deadline(seconds: Optional[float]):
+    """Bu blok (ve içinde açılan görevler) içindeki LLM çağrıları için mutlak bitiş zamanı."""
+    token = _deadline.set(time.monotonic() + seconds if seconds else None)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def _pct(values: List[float], p: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))], 1)
+
+
+class Endpoint:
+    """Bir OpenAI uyumlu uç: taban adres + (isteğe bağlı) model/anahtar yeniden yazımı."""
+
+    def __init__(self, name: str, api_base: str, model: Optional[str] = None, api_key: Optional[str] = None):
+        self.name = name
+        self.base = httpx.URL(api_base.rstrip("/") + "/")
+        self.model = model
+        self.api_key = api_key
+        self.latencies: Deque[float] = deque(maxlen=LLM_METRICS_WINDOW)
+        self.calls = 0
+        self.errors = 0
+
+    def p95(self) -> Optional[float]:
+        if len(self.latencies) < LLM_HEDGE_MIN_SAMPLES:
+            return None
+        return _pct(list(self.latencies), 95)
+
+
+class _RetryBudget:
+    """Son LLM_BUDGET_WINDOW_SECONDS içindeki isteklere oranla sınırlı ek deneme hakkı."""
+
+    def __init__(self, ratio: float, minimum: int):
+        self.ratio = ratio
+        self.minimum = minimum
+        self._requests: Deque[float] = deque()
+        self._extra: Deque[float] = deque()
+
+    def _trim(self, now: float) -> None:
+        for q in (self._requests, self._extra):
+            while q and now - q[0] > LLM_BUDGET_WINDOW_SECONDS:
+                q.popleft()
+
+    def record_request(self) -> None:
+        self._requests.append(time.monotonic())
+
+    def try_spend(self) -> bool:
+        now = time.monotonic()
+        self._trim(now)
+        if len(self._extra) >= self.minimum + self.ratio * len(self._requests):
+            return False
+        self._extra.append(now)
+        return True
+
+
+class LLMGatewayTransport(httpx.AsyncBaseTransport):
+    def __init__(self, primary: Endpoint, fallback: Optional[Endpoint] = None, *,
+                 transport: Optional[httpx.AsyncBaseTransport] = None,
+                 max_attempts: int = LLM_MAX_ATTEMPTS, hedge: bool = LLM_HEDGE_ENABLED,
+                 attempt_timeout: float = LLM_ATTEMPT_TIMEOUT_SECONDS):
+        self.primary = primary
+        self.fallback = fallback
+        self.max_attempts = max(1, max_attempts)
+        self.hedge = hedge
+        self.attempt_timeout = attempt_timeout
+        self.budget = _RetryBudget(LLM_RETRY_BUDGET_RATIO, LLM_RETRY_BUDGET_MIN)
+        self._transport = transport or httpx.AsyncHTTPTransport(
+            http2=HTTP2_AVAILABLE,
+            limits=httpx.Limits(max_connections=LLM_MAX_CONNECTIONS,
+                                max_keepalive_connections=LLM_MAX_CONNECTIONS,
+                                keepalive_expiry=LLM_KEEPALIVE_SECONDS),
+        )
+        self.counters = {"requests": 0, "retries": 0, "hedges": 0, "hedge_wins": 0,
+                         "fallbacks": 0, "budget_exhausted": 0, "deadline_exceeded": 0}
+
+    # ---------- istek yeniden yazımı ----------
+    def _rewrite(self, request: httpx.Request, body: bytes, endpoint: Endpoint) -> httpx.Request:
+        if endpoint is self.primary:
+            return httpx.Request(request.method, request.url, headers=request.headers, content=body,
+                                 extensions=request.extensions)
+        raw = str(request.url)
+        base = str(self.primary.base)
+        url = str(endpoint.base) + raw[len(base):] if raw.startswith(base) else raw
+        headers = httpx.Headers(request.headers)
+        if endpoint.model and body:
+            try:
+                payload = json.loads(body)
+                payload["model"] = endpoint.model
+                body = json.dumps(payload).encode()
+            except ValueError:
+                pass
+        if endpoint.api_key:
+            headers["Authorization"] = f"Bearer {endpoint.api_key}"
+        headers.pop("Content-Length", None)
+        return httpx.Request(request.method, url, headers=headers, content=body, extensions=request.extensions)
+
+    # ---------- tek deneme ----------
+    async def _send(self, request: httpx.Request, timeout: float) -> httpx.Response:
+        response = await asyncio.wait_for(self._transport.handle_async_request(request), timeout=timeout)
+        if response.status_code in RETRYABLE_STATUS:
+            await response.aclose()
+            raise httpx.HTTPStatusError(f"upstream {response.status_code}", request=request, response=response)
+        return response
+
+    async def _attempt(self, request: httpx.Request, endpoint: Endpoint, remaining: float,
+                       trace: Dict[str, Any]) -> httpx.Response:
+        """Bir deneme; p95 aşılırsa (ve bütçe varsa) aynı istek ikinci kez gönderilir."""
+        timeout = min(self.attempt_timeout, remaining)
+        first = asyncio.create_task(self._send(request, timeout))
+        tasks = [first]
+        winner: Optional[asyncio.Task] = None
+        hedge_after = endpoint.p95() if self.hedge else None
+        if hedge_after is not None:
+            hedge_after = max(hedge_after / 1000, LLM_HEDGE_MIN_DELAY_SECONDS)
+        try:
+            if hedge_after is not None and hedge_after < timeout:
+                done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+                if not done and self.budget.try_spend():
+                    self.counters["hedges"] += 1
+                    trace["hedged"] = True
+                    tasks.append(asyncio.create_task(self._send(request, timeout - hedge_after)))
+            error: Optional[BaseException] = None
+            pending = set(tasks)
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        winner = task
+                        break
+                    error = task.exception()
+            if winner is None:
+                raise error  # type: ignore[misc]
+            if winner is not first:
+                self.counters["hedge_wins"] += 1
+                trace["hedge_won"] = True
+            return winner.result()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            # kazanan dışında tamamlanmış yanıtlar kapatılıp bağlantı havuza geri verilir
+            for task in tasks:
+                if task is not winner and task.done() and not task.cancelled() and task.exception() is None:
+                    await task.result().aclose()
+
+    # ---------- httpx arayüzü ----------
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        body = await request.aread()
+        deadline = _deadline.get()
+        t0 = time.monotonic()
+        self.counters["requests"] += 1
+        self.budget.record_request()
+        trace: Dict[str, Any] = {"attempts": 0}
+        endpoints = [self.primary] + ([self.fallback] if self.fallback else [])
+        last_error: Optional[BaseException] = None
+        response: Optional[httpx.Response] = None
+        used = self.primary
+
+        for endpoint in endpoints:
+            if endpoint is not self.primary:
+                self.counters["fallbacks"] += 1
+            outgoing = self._rewrite(request, body, endpoint)
+            for attempt in range(self.max_attempts):
+                remaining = (deadline - time.monotonic()) if deadline else self.attempt_timeout
+                if deadline and remaining < LLM_MIN_ATTEMPT_SECONDS:
+                    self.counters["deadline_exceeded"] += 1
+                    last_error = last_error or httpx.ReadTimeout("llm_deadline_exceeded", request=request)
+                    break
+                # her ucun ilk denemesi bütçeden yemez; tekrarlar yer
+                if attempt and not self.budget.try_spend():
+                    self.counters["budget_exhausted"] += 1
+                    break
+                if attempt:
+                    self.counters["retries"] += 1
+                trace["attempts"] += 1
+                endpoint.calls += 1
+                a0 = time.monotonic()
+                try:
+                    response = await self._attempt(outgoing, endpoint, remaining, trace)
+                    endpoint.latencies.append((time.monotonic() - a0) * 1000)
+                    used = endpoint
+                    break
+                except (httpx.TransportError, httpx.HTTPStatusError, asyncio.TimeoutError) as e:
+                    endpoint.errors += 1
+                    last_error = e
+                    if isinstance(e, asyncio.TimeoutError) and endpoint is not endpoints[-1]:
+                        break  # takılan uçta kalan süreyi harcamak yerine yedeğe geç
+                    if attempt + 1 < self.max_attempts:
+                        backoff = min(0.2 * 2 ** attempt, 1.0)
+                        if deadline:
+                            backoff = min(backoff, max(0.0, deadline - time.monotonic() - LLM_MIN_ATTEMPT_SECONDS))
+                        await asyncio.sleep(backoff)
+            if response is not None:
+                break
+            if deadline and deadline - time.monotonic() < LLM_MIN_ATTEMPT_SECONDS:
+                break
+
+        self._log(trace, used if response is not None else None, t0, response, last_error)
+        record_stage("llm", (time.monotonic() - t0) * 1000)
+        if response is not None:
+            return response
+        if isinstance(last_error, httpx.HTTPStatusError):
+            # son upstream yanıtı olduğu gibi iletilir; openai istemcisi kendi hatasını üretir
+            return httpx.Response(last_error.response.status_code, headers=last_error.response.headers,
+                                  content=b'{"error":{"message":"llm_gateway: upstream unavailable"}}',
+                                  request=request)
+        if isinstance(last_error, httpx.TransportError):
+            raise last_error
+        raise httpx.ReadTimeout(f"llm_gateway_timeout:{type(last_error).__name__}", request=request)
+
+    def _log(self, trace: Dict[str, Any], endpoint: Optional[Endpoint], t0: float,
+             response: Optional[httpx.Response], error: Optional[BaseException]) -> None:
+        log.info(json.dumps({
+            "event": "llm_call",
+            "endpoint": endpoint.name if endpoint else None,
+            "status": response.status_code if response is not None else None,
+            "error": type(error).__name__ if response is None and error else None,
+            "attempts": trace["attempts"],
+            "hedged": trace.get("hedged", False),
+            "hedge_won": trace.get("hedge_won", False),
+            "latency_ms": round((time.monotonic() - t0) * 1000, 1),
+        }))
+
+    def stats(self) -> Dict[str, Any]:
+        endpoints = {}
+        for ep in filter(None, (self.primary, self.fallback)):
+            lat = list(ep.latencies)
+            endpoints[ep.name] = {"calls": ep.calls, "errors": ep.errors, "p50_ms": _pct(lat, 50),
+                                  "p95_ms": _pct(lat, 95), "p99_ms": _pct(lat, 99)}
+        return {**self.counters, "http2": HTTP2_AVAILABLE, "endpoints": endpoints}
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+def build_http_client(api_base: str, *, fallback_api_base: Optional[str] = None,
+                      fallback_model: Optional[str] = None, fallback_api_key: Optional[str] = None,
+                      transport: Optional[httpx.AsyncBaseTransport] = None
+                      ) -> Tuple[httpx.AsyncClient, LLMGatewayTransport]:
+    """ChatOpenAI(http_async_client=...) için paylaşılan istemci ve ağ geçidi taşıması."""
+    fallback = Endpoint("fallback", fallback_api_base or api_base, fallback_model, fallback_api_key) \
+        if (fallback_api_base or fallback_model) else None
+    gateway = LLMGatewayTransport(Endpoint("primary", api_base), fallback, transport=transport)
+    # istek başına süre sınırı ağ geçidinde; istemci zaman aşımı yalnızca üst sınır
+    client = httpx.AsyncClient(transport=gateway, timeout=httpx.Timeout(LLM_ATTEMPT_TIMEOUT_SECONDS * 4))
+    return client, gateway
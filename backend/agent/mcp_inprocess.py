@@ -0,0 +1,81 @@
+"""
+mcp_inprocess.py
+MCP sunucusunu (mcp_server.server.mcp) aynı süreçte, FastMCP'nin bellek içi
+taşıması (FastMCPTransport) üzerinden bağlar. Tek düğümlü kurulumlarda ayrı
+MCP süreci, HTTP/SSE bağlantısı ve ağ atlaması ortadan kalkar; araçlar,
+şemalar ve @log_tool kayıtları SSE modundakiyle aynıdır.
+
+MultiServerMCPClient'ın session() arayüzünü taklit eder, böylece
+MCPSessionPool değişmeden kullanılır. Ayrık kurulumlar için SSE modu
+(MCP_TRANSPORT=sse) varsayılan olarak kalır.
+
+MCP araçları senkron fonksiyonlardır (TCMB HTTP, geocoding, SQLite) ve FastMCP
+onları çağıranın olay döngüsünde çalıştırır. Bu modda o döngü API'nin döngüsü
+olduğundan, ilk oturumda her senkron aracın fonksiyonu iş parçacığı havuzunda
+(anyio.to_thread) çalışan bir sarmalayıcıyla değiştirilir: araç süresince API
+döngüsü serbest kalır, paralel araç adımları gerçekten eşzamanlı çalışır ve
+ajanın araç zaman aşımı (asyncio.wait_for) bekleyeni serbest bırakabilir
+(zaman aşımına uğrayan araç iş parçacığında tamamlanır).
+"""
+
+from __future__ import annotations
+import asyncio
+import functools
+import inspect
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Optional
+
+import anyio
+from fastmcp import Client
+from fastmcp.client.transports import FastMCPTransport
+
+
+def _in_worker_thread(fn: Callable[..., Any]) -> Callable[..., Any]:
+    """Senkron fn'i iş parçacığında çalıştıran async sarmalayıcı (imza korunur, şema değişmez)."""
+    @functools.wraps(fn)
+    async def run(*args, **kwargs):
+        return await anyio.to_thread.run_sync(functools.partial(fn, *args, **kwargs))
+    run.offloaded = True
+    return run
+
+
+async def offload_sync_tools(server: Any) -> int:
+    """Sunucudaki senkron araç fonksiyonlarını iş parçacığına taşır; taşınan araç sayısını döner."""
+    count = 0
+    for tool in (await server.get_tools()).values():
+        fn = getattr(tool, "fn", None)
+        if fn is None or inspect.iscoroutinefunction(fn) or getattr(fn, "offloaded", False):
+            continue
+        tool.fn = _in_worker_thread(fn)
+        count += 1
+    return count
+
+
+class InProcessMCPClient:
+    def __init__(self, server: Optional[Any] = None):
+        self._server = server
+        self._offloaded = False
+        self._offload_lock = asyncio.Lock()
+
+    @property
+    def server(self) -> Any:
+        if self._server is None:
+            # geç import: sunucu modülü repo'ları açar ve DB migration'larını çalıştırır
+            from mcp_server.server import mcp
+            self._server = mcp
+        return self._server
+
+    async def _ensure_offloaded(self) -> None:
+        if self._offloaded:
+            return
+        async with self._offload_lock:
+            if not self._offloaded:
+                await offload_sync_tools(self.server)
+                self._offloaded = True
+
+    @asynccontextmanager
+    async def session(self, server_name: Optional[str] = None, *, auto_initialize: bool = True) -> AsyncIterator[Any]:
+        await self._ensure_offloaded()
+        # Client girişte initialize eder; server_name tek sunucu olduğu için yok sayılır
+        async with Client(FastMCPTransport(self.server)) as client:
+            yield client.session
@@ -0,0 +1,252 @@
+"""
+mcp_pool.py
+MCP sunucusuna uzun ömürlü oturum havuzu.
+
+MultiServerMCPClient.get_tools() ile gelen araçlar her çağrıda yeni bir SSE
+oturumu açar (bağlan + initialize + çağrı + kapat). Havuz açılışta
+MCP_POOL_SIZE oturum açar ve açık tutar; ClientSession istekleri JSON-RPC
+kimlikleriyle eşler, bu yüzden tek oturum üzerinde de eşzamanlı çağrı yapılabilir.
+Çağrılar oturumlar arasında sırayla dağıtılır.
+
+- Sağlık kontrolü: her MCP_HEALTH_INTERVAL_SECONDS'da ping; cevap yoksa oturum
+  yeniden açılır.
+- Yeniden bağlanma: bağlantı hatasında oturum yeniden açılır ve araç listesi
+  tazelenir (MCP sunucusu yeniden başlatıldıysa yeni şemalar on_tools_changed
+  ile ajana bildirilir). İstek sunucuya hiç gönderilemediyse (yazma akışı
+  kapalı) çağrı bir kez tekrarlanır; gönderildikten sonra kopan çağrılar
+  tekrarlanmaz (para transferi iki kez yazılmasın).
+
+Araçlar load_mcp_tools(pool) ile üretilir: havuz ClientSession'ın list_tools /
+call_tool arayüzünü taklit eder, araçlar belirli bir oturuma bağlı kalmaz.
+"""
+
+from __future__ import annotations
+import asyncio
+import itertools
+import json
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import anyio
+import httpx
+from mcp.shared.exceptions import McpError
+from langchain_mcp_adapters.tools import load_mcp_tools
+
+MCP_POOL_SIZE = int(os.getenv("MCP_POOL_SIZE", "2"))
+MCP_CONNECT_TIMEOUT_SECONDS = float(os.getenv("MCP_CONNECT_TIMEOUT_SECONDS", "10"))
+MCP_HEALTH_INTERVAL_SECONDS = float(os.getenv("MCP_HEALTH_INTERVAL_SECONDS", "15"))
+MCP_PING_TIMEOUT_SECONDS = float(os.getenv("MCP_PING_TIMEOUT_SECONDS", "3"))
+
+log = logging.getLogger("advanced-agent")
+
+# istek hiç gönderilemedi: tekrar denemek güvenli
+_NOT_SENT_ERRORS = (anyio.ClosedResourceError, anyio.BrokenResourceError)
+# bağlantı koptu: oturum yeniden açılır
+_CONNECTION_ERRORS = _NOT_SENT_ERRORS + (anyio.EndOfStream, httpx.HTTPError, ConnectionError)
+
+
+def _is_connection_error(e: BaseException) -> bool:
+    if isinstance(e, _CONNECTION_ERRORS):
+        return True
+    # McpError araç/parametre hatası da olabilir; yalnızca kopan bağlantı sayılır
+    return isinstance(e, McpError) and "connection closed" in str(e).lower()
+
+
+class _Slot:
+    """Tek bir açık oturum. Oturum, giriş/çıkışı aynı görevde kalsın diye kendi görevinde yaşar."""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.session = None
+        self.task: Optional[asyncio.Task] = None
+        self.ready = asyncio.Event()
+        self.stop = asyncio.Event()
+        self.generation = 0
+        self.error: Optional[BaseException] = None
+        self.lock = asyncio.Lock()
+        self.last_ping_ms: Optional[float] = None
+
+    @property
+    def alive(self) -> bool:
+        return self.session is not None and self.task is not None and not self.task.done()
+
+
+class MCPSessionPool:
+    def __init__(self, client: Any, server_name: str, *, size: int = MCP_POOL_SIZE,
+                 health_interval: float = MCP_HEALTH_INTERVAL_SECONDS,
+                 on_tools_changed: Optional[Callable[[List[Any]], Awaitable[None] | None]] = None):
+        self.client = client
+        self.server_name = server_name
+        self.size = max(1, size)
+        self.health_interval = health_interval
+        self.on_tools_changed = on_tools_changed
+        self.tools: List[Any] = []
+        self._tool_signature: Optional[str] = None
+        self._slots = [_Slot(i) for i in range(self.size)]
+        self._rr = itertools.count()
+        self._health_task: Optional[asyncio.Task] = None
+        self.calls = 0
+        self.reconnects = 0
+        self.retries = 0
+
+    # ---------- yaşam döngüsü ----------
+    async def start(self) -> List[Any]:
+        await asyncio.gather(*(self._open(s) for s in self._slots))
+        if not any(s.alive for s in self._slots):
+            raise RuntimeError(f"mcp_pool_connect_failed:{self._slots[0].error}")
+        await self.refresh_tools()
+        if self.health_interval > 0 and self._health_task is None:
+            self._health_task = asyncio.create_task(self._health_loop())
+        return self.tools
+
+    async def close(self) -> None:
+        if self._health_task:
+            self._health_task.cancel()
+            self._health_task = None
+        await asyncio.gather(*(self._close(s) for s in self._slots), return_exceptions=True)
+
+    async def _run_slot(self, slot: _Slot) -> None:
+        try:
+            async with self.client.session(self.server_name) as session:
+                slot.session = session
+                slot.error = None
+                slot.ready.set()
+                await slot.stop.wait()
+        except BaseException as e:  # bağlantı hatası görevi bitirir; slot ölü sayılır
+            slot.error = e
+        finally:
+            slot.session = None
+            slot.ready.set()
+
+    async def _open(self, slot: _Slot) -> None:
+        slot.ready = asyncio.Event()
+        slot.stop = asyncio.Event()
+        slot.task = asyncio.create_task(self._run_slot(slot))
+        try:
+            await asyncio.wait_for(slot.ready.wait(), timeout=MCP_CONNECT_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            slot.error = TimeoutError("connect_timeout")
+            await self._close(slot)
+        slot.generation += 1
+
+    async def _close(self, slot: _Slot) -> None:
+        task = slot.task
+        if task is None:
+            return
+        slot.stop.set()
+        try:
+            await asyncio.wait_for(asyncio.shield(task), timeout=2)
+        except (asyncio.TimeoutError, Exception):
+            task.cancel()
+        slot.session = None
+
+    async def _reconnect(self, slot: _Slot, generation: int, reason: str) -> bool:
+        """Slot'u yeniden açar; aynı kopmayı eşzamanlı gören çağrılar tek bir yeniden bağlanma yapar."""
+        async with slot.lock:
+            if slot.generation != generation and slot.alive:
+                return True
+            await self._close(slot)
+            await self._open(slot)
+            self.reconnects += 1
+            log.warning(json.dumps({
+                "event": "mcp_reconnect", "slot": slot.index, "reason": reason,
+                "ok": slot.alive, "error": str(slot.error) if slot.error else None,
+            }))
+        if slot.alive:
+            try:
+                await self.refresh_tools()
+            except Exception as e:
+                log.warning(json.dumps({"event": "mcp_tools_refresh_error", "error": str(e)}))
+        return slot.alive
+
+    async def _acquire(self) -> _Slot:
+        for _ in range(self.size):
+            slot = self._slots[next(self._rr) % self.size]
+            if slot.alive:
+                return slot
+        # hepsi ölü: sıradakini yeniden aç
+        slot = self._slots[next(self._rr) % self.size]
+        if not await self._reconnect(slot, slot.generation, "no_live_session"):
+            raise ConnectionError(f"mcp_unavailable:{slot.error}")
+        return slot
+
+    # ---------- ClientSession arayüzü (load_mcp_tools bunları kullanır) ----------
+    async def call_tool(self, name: str, arguments: Optional[Dict[str, Any]] = None) -> Any:
+        self.calls += 1
+        for attempt in (0, 1):
+            slot = await self._acquire()
+            generation = slot.generation
+            try:
+                return await slot.session.call_tool(name, arguments)
+            except Exception as e:
+                if not _is_connection_error(e):
+                    raise
+                reconnected = await self._reconnect(slot, generation, f"call:{type(e).__name__}")
+                if attempt == 0 and reconnected and isinstance(e, _NOT_SENT_ERRORS):
+                    self.retries += 1
+                    continue
+                raise
+
+    async def list_tools(self, cursor: Optional[str] = None) -> Any:
+        slot = await self._acquire()
+        generation = slot.generation
+        try:
+            return await slot.session.list_tools(cursor=cursor)
+        except Exception as e:
+            if not _is_connection_error(e) or not await self._reconnect(slot, generation, f"list_tools:{type(e).__name__}"):
+                raise
+            return await slot.session.list_tools(cursor=cursor)
+
+    # ---------- araç listesi ----------
+    async def refresh_tools(self) -> List[Any]:
+        tools = await load_mcp_tools(self)
+        signature = json.dumps(
+            sorted([t.name, t.description, t.args_schema] for t in tools), sort_keys=True, default=str
+        )
+        changed = self._tool_signature is not None and signature != self._tool_signature
+        self.tools, self._tool_signature = tools, signature
+        if changed:
+            log.info(json.dumps({"event": "mcp_tools_changed", "count": len(tools)}))
+            if self.on_tools_changed:
+                result = self.on_tools_changed(tools)
+                if asyncio.iscoroutine(result):
+                    await result
+        return tools
+
+    # ---------- sağlık ----------
+    async def health_check(self) -> Dict[str, Any]:
+        """Her oturuma ping atar, cevap vermeyenleri yeniden açar."""
+        async def check(slot: _Slot) -> bool:
+            generation = slot.generation
+            if slot.alive:
+                t0 = time.perf_counter()
+                try:
+                    await asyncio.wait_for(slot.session.send_ping(), timeout=MCP_PING_TIMEOUT_SECONDS)
+                    slot.last_ping_ms = round((time.perf_counter() - t0) * 1000, 2)
+                    return True
+                except Exception as e:
+                    reason = f"ping:{type(e).__name__}"
+            else:
+                reason = "dead"
+            return await self._reconnect(slot, generation, reason)
+
+        results = await asyncio.gather(*(check(s) for s in self._slots))
+        return {"healthy": sum(results), "size": self.size, **self.stats()}
+
+    async def _health_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.health_interval)
+            try:
+                status = await self.health_check()
+                if status["healthy"] < self.size:
+                    log.warning(json.dumps({"event": "mcp_health", **status}))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.warning(json.dumps({"event": "mcp_health_error", "error": str(e)}))
+
+    def stats(self) -> Dict[str, Any]:
+        return {"calls": self.calls, "reconnects": self.reconnects, "retries": self.retries,
+                "live": sum(1 for s in self._slots if s.alive)}
@@ -0,0 +1,177 @@
+"""
+memory.py
+Sohbet hafızası: ajanın önceki turları görmesi için chat_history.messages
+üzerinden sınırlı, özetlenmiş bağlam penceresi.
+
+- Son MEMORY_RECENT_TURNS tur (kullanıcı + asistan) aynen verilir; bot
+  mesajlarındaki ui_component kısa bir JSON özetiyle eklenir ("ikinci
+  hesabım" gibi takip sorularında hesap listesi bağlamda kalsın).
+- Daha eski mesajlar kayan bir özete katlanır (her mesaj tek satır, LLM
+  çağrısı yok). Özet MEMORY_SUMMARY_TOKENS, toplam bağlam MEMORY_TOKEN_BUDGET
+  ile sınırlıdır; aşılırsa en eski satırlar atılır.
+- Sıkıştırılmış geçmiş sohbet başına bellekte tutulur (LRU, MEMORY_MAX_SESSIONS);
+  her turda yalnızca son görülen message_id'den sonraki mesajlar okunur ve
+  yalnızca onların token'ları hesaplanır.
+- Enjeksiyon şüpheli eski kullanıcı mesajları bağlama konmaz.
+"""
+
+from __future__ import annotations
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict, deque
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+
+from security import looks_like_injection
+
+MEMORY_ENABLED = os.getenv("AGENT_MEMORY", "1") not in ("0", "false", "False")
+MEMORY_RECENT_TURNS = int(os.getenv("MEMORY_RECENT_TURNS", "4"))
+MEMORY_TOKEN_BUDGET = int(os.getenv("MEMORY_TOKEN_BUDGET", "1200"))
+MEMORY_SUMMARY_TOKENS = int(os.getenv("MEMORY_SUMMARY_TOKENS", "300"))
+MEMORY_MAX_SESSIONS = int(os.getenv("MEMORY_MAX_SESSIONS", "1024"))
+MEMORY_LOAD_LIMIT = 40          # sohbet ilk kez açılırken okunacak en fazla mesaj
+MEMORY_UI_MAX_CHARS = 400       # bot mesajındaki ui_component özeti
+SUMMARY_LINE_MAX_CHARS = 160
+
+log = logging.getLogger("advanced-agent")
+
+
+def approx_tokens(text: Optional[str]) -> int:
+    """Kaba token tahmini (~4 karakter / token); model tokenizer'ı gerektirmez."""
+    return (len(text) + 3) // 4 if text else 0
+
+
+def _shorten(text: str, limit: int) -> str:
+    text = " ".join((text or "").split())
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+
+def _compact_ui(ui_json: Optional[str]) -> Optional[str]:
+    if not ui_json:
+        return None
+    try:
+        ui = json.loads(ui_json)
+    except Exception:
+        return None
+    if not isinstance(ui, dict):
+        return None
+    data = json.dumps(ui.get("data"), ensure_ascii=False, separators=(",", ":"), default=str)
+    return f"[{ui.get('type', 'ui')}] {_shorten(data, MEMORY_UI_MAX_CHARS)}"
+
+
+class _Entry(NamedTuple):
+    role: str          # "user" | "bot"
+    text: str          # bağlama girecek metin (ui özeti dahil)
+    summary: str       # özete katlanırken kullanılacak tek satır
+    tokens: int
+
+
+def _entry(row: Dict[str, Any]) -> _Entry:
+    role = "user" if row.get("sender") == "user" else "bot"
+    text = row.get("text") or ""
+    if role == "user" and looks_like_injection(text):
+        text = "[güvenlik nedeniyle çıkarıldı]"
+    label = "Kullanıcı" if role == "user" else "Asistan"
+    summary = f"- {label}: {_shorten(text, SUMMARY_LINE_MAX_CHARS)}"
+    if role == "bot":
+        ui = _compact_ui(row.get("ui_component"))
+        if ui:
+            text = f"{text}\n{ui}"
+    return _Entry(role, text, summary, approx_tokens(text))
+
+
+class _SessionHistory:
+    def __init__(self):
+        self.last_id = 0
+        self.recent: deque = deque()
+        self.recent_tokens = 0
+        self.summary: deque = deque()
+        self.summary_tokens = 0
+        self.lock = threading.Lock()
+
+    def append(self, entry: _Entry) -> None:
+        self.recent.append(entry)
+        self.recent_tokens += entry.tokens
+
+    def compact(self, recent_turns: int, token_budget: int, summary_budget: int) -> None:
+        # son turlar sığmıyorsa en eskisi özete katlanır (en az son mesaj kalır)
+        while len(self.recent) > 1 and (
+            len(self.recent) > recent_turns * 2
+            or self.recent_tokens + min(self.summary_tokens, summary_budget) > token_budget
+        ):
+            old = self.recent.popleft()
+            self.recent_tokens -= old.tokens
+            self.summary.append(old.summary)
+            self.summary_tokens += approx_tokens(old.summary)
+        while self.summary and self.summary_tokens > summary_budget:
+            self.summary_tokens -= approx_tokens(self.summary.popleft())
+
+    def render(self) -> Tuple[Optional[str], List[BaseMessage]]:
+        summary = "\n".join(self.summary) or None
+        messages = [HumanMessage(content=e.text) if e.role == "user" else AIMessage(content=e.text)
+                    for e in self.recent]
+        return summary, messages
+
+
+def _default_loader(user_id: str, chat_id: str, after_message_id: int, limit: Optional[int]) -> List[Dict[str, Any]]:
+    # geç import: chat_history import anında şemayı oluşturur
+    from chat.chat_history import get_messages_after_sync
+    return get_messages_after_sync(user_id, chat_id, after_message_id, limit)
+
+
+class ConversationMemory:
+    def __init__(self, loader: Callable[..., List[Dict[str, Any]]] = _default_loader, *,
+                 recent_turns: int = MEMORY_RECENT_TURNS, token_budget: int = MEMORY_TOKEN_BUDGET,
+                 summary_tokens: int = MEMORY_SUMMARY_TOKENS, max_sessions: int = MEMORY_MAX_SESSIONS):
+        self.loader = loader
+        self.recent_turns = recent_turns
+        self.token_budget = token_budget
+        self.summary_budget = min(summary_tokens, token_budget)
+        self.max_sessions = max_sessions
+        self._lock = threading.Lock()
+        self._sessions: "OrderedDict[Tuple[str, str], _SessionHistory]" = OrderedDict()
+
+    def _session(self, key: Tuple[str, str]) -> Tuple[_SessionHistory, bool]:
+        with self._lock:
+            hist = self._sessions.get(key)
+            cached = hist is not None
+            if hist is None:
+                hist = self._sessions[key] = _SessionHistory()
+            self._sessions.move_to_end(key)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            return hist, cached
+
+    def load(self, user_id: Any, chat_id: str, current_text: Optional[str] = None
+             ) -> Tuple[Optional[str], List[BaseMessage]]:
+        """
+        (özet, son turların mesajları). Senkron (SQLite); olay döngüsünden to_thread ile çağrılır.
+        current_text: bu turun kullanıcı mesajı; API onu ajan çağrısından önce kaydettiği için
+        geçmişe katılmaz ve bir sonraki turda okunmak üzere bekletilir.
+        """
+        hist, cached = self._session((str(user_id), str(chat_id)))
+        with hist.lock:
+            rows = self.loader(str(user_id), str(chat_id), hist.last_id, None if cached else MEMORY_LOAD_LIMIT)
+            if rows and rows[-1].get("sender") == "user" and (rows[-1].get("text") or "") == (current_text or ""):
+                rows = rows[:-1]
+            for row in rows:
+                hist.append(_entry(row))
+                hist.last_id = max(hist.last_id, int(row["message_id"]))
+            hist.compact(self.recent_turns, self.token_budget, self.summary_budget)
+            summary, messages = hist.render()
+            log.info(json.dumps({
+                "event": "memory",
+                "cached": cached,
+                "new_messages": len(rows),
+                "recent": len(messages),
+                "summary_lines": len(hist.summary),
+                "tokens": hist.recent_tokens + hist.summary_tokens,
+            }))
+            return summary, messages
+
+    def forget(self, user_id: Any, chat_id: str) -> None:
+        with self._lock:
+            self._sessions.pop((str(user_id), str(chat_id)), None)
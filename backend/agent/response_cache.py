@@ -0,0 +1,140 @@
+"""
+response_cache.py
+Müşteriden bağımsız sorular (döviz kurları, faiz oranları, ücretler,
+portföyler) için ajan yanıt önbelleği.
+
+- Yalnızca CACHEABLE_TOOLS içindeki (customer parametresi olmayan) araçlarla
+  üretilmiş ve UI bileşeni dönen yanıtlar saklanır; başka bir araç veya
+  düz LLM metni içeren yanıt asla saklanmaz.
+- Anahtar: normalize edilmiş soru + sohbet bağlamı + veri sürümü.
+  Bağlam, ajanın göreceği önceki turların özetidir (geçmiş yoksa ""):
+  "peki ya diğeri?" gibi takip soruları başka bir sohbetin yanıtını almaz.
+  Veri sürümü TCMB kur güncellemesine (her gün 15:30) hizalı zaman dilimi ile
+  referans tablolarının (ücret, faiz, portföy) içerik özetinden oluşur; ikisinden
+  biri değişince tüm kayıtlar kendiliğinden geçersiz olur.
+- LRU (RESPONSE_CACHE_MAX_ENTRIES) + TTL (RESPONSE_CACHE_TTL_SECONDS).
+"""
+
+from __future__ import annotations
+import copy
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from mcp_server.data.account_types import fold_tr
+
+# Sıkı izin listesi: customer_id almayan, salt-okunur referans verisi araçları
+CACHEABLE_TOOLS = frozenset({
+    "get_exchange_rates", "get_interest_rates", "get_fee", "get_all_fees", "list_portfolios",
+})
+
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE", "1") not in ("0", "false", "False")
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "900"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "256"))
+# TCMB kurları her gün bu saatte yenilenir (tcmb_service.should_update_today ile aynı)
+TCMB_REFRESH_HOUR, TCMB_REFRESH_MINUTE = 15, 30
+# referans tablosu özetinin en fazla bu aralıkla yeniden hesaplanması (ReferenceData ile aynı ayar)
+REFERENCE_VERSION_CHECK_SECONDS = float(os.getenv("REFERENCE_DATA_CHECK_SECONDS", "5"))
+
+_PUNCT_RE = re.compile(r"[^\w\s]")
+
+
+def normalize_question(text: str) -> str:
+    """Büyük/küçük harf, Türkçe karakter ve noktalama farklarını yok sayar."""
+    return fold_tr(_PUNCT_RE.sub(" ", text or ""))
+
+
+def data_version(now: Optional[datetime] = None) -> Tuple[str, float]:
+    """
+    (sürüm, sonraki_yenilemeye_kalan_saniye). Sürüm, en son TCMB yenileme anıdır.
+    """
+    now = now or datetime.now()
+    boundary = now.replace(hour=TCMB_REFRESH_HOUR, minute=TCMB_REFRESH_MINUTE, second=0, microsecond=0)
+    if now < boundary:
+        boundary -= timedelta(days=1)
+    next_refresh = boundary + timedelta(days=1)
+    return boundary.isoformat(timespec="minutes"), (next_refresh - now).total_seconds()
+
+
+class ResponseCache:
+    """
+    reference_version: referans verisi sürümünü dönen çağrılabilir (ör. tablo içerik özeti);
+    en fazla REFERENCE_VERSION_CHECK_SECONDS aralıkla çağrılır. Hata verirse önbellek o an
+    devre dışı kalır (get None, put False).
+    """
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES,
+                 ttl_seconds: float = RESPONSE_CACHE_TTL_SECONDS,
+                 allowed_tools: Iterable[str] = CACHEABLE_TOOLS,
+                 reference_version: Optional[Callable[[], str]] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self.allowed_tools = frozenset(allowed_tools)
+        self.reference_version = reference_version
+        self._lock = threading.Lock()
+        self._items: "OrderedDict[Tuple[str, str, str], Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._ref = (0.0, None)  # (kontrol anı, sürüm)
+        self.hits = 0
+        self.misses = 0
+
+    def _version(self) -> Tuple[Optional[str], float]:
+        """(TCMB dilimi + referans sürümü, sonraki_kur_yenilemesine_kalan_saniye); sürüm bilinmiyorsa None."""
+        tcmb, until_refresh = data_version()
+        if self.reference_version is None:
+            return tcmb, until_refresh
+        checked_at, ref = self._ref
+        now = time.monotonic()
+        if ref is None or now - checked_at >= REFERENCE_VERSION_CHECK_SECONDS:
+            try:
+                ref = self.reference_version()
+            except Exception:
+                ref = None
+            self._ref = (now, ref)
+        return (f"{tcmb}|{ref}" if ref is not None else None), until_refresh
+
+    def get(self, question: str, context: str = "") -> Optional[Dict[str, Any]]:
+        version, _ = self._version()
+        if version is None:
+            return None
+        key = (normalize_question(question), context, version)
+        now = time.monotonic()
+        with self._lock:
+            item = self._items.get(key)
+            if item and item[0] > now:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return copy.deepcopy(item[1])
+            if item:
+                del self._items[key]
+            self.misses += 1
+            return None
+
+    def is_cacheable(self, tools_used: Iterable[str], response: Any) -> bool:
+        tools = set(tools_used or ())
+        return (bool(tools) and tools <= self.allowed_tools
+                and isinstance(response, dict) and bool(response.get("ui_component")))
+
+    def put(self, question: str, response: Dict[str, Any], tools_used: Iterable[str], context: str = "") -> bool:
+        if not self.is_cacheable(tools_used, response):
+            return False
+        version, until_refresh = self._version()
+        if version is None:
+            return False
+        key = (normalize_question(question), context, version)
+        expires = time.monotonic() + min(self.ttl, until_refresh)
+        with self._lock:
+            self._items[key] = (expires, copy.deepcopy(response))
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._items),
+                    "hit_ratio": round(self.hits / total, 4) if total else 0.0}
@@ -0,0 +1,97 @@
+"""
+tool_node.py
+ReAct adımındaki bağımsız araç çağrılarını eşzamanlı çalıştıran ToolNode.
+
+Model tek adımda birden fazla araç çağırdığında (ör. get_accounts +
+list_customer_cards, get_exchange_rates + get_interest_rates) çağrılar aynı
+anda başlatılır:
+- her çağrıya TOOL_CALL_TIMEOUT_SECONDS süre tanınır,
+- adımın tamamı TOOL_STEP_DEADLINE_SECONDS içinde biter; süresi dolan
+  çağrılar iptal edilir ve modele {"ok": false, "error": "timeout"} döner,
+- her adım için "tool_step" olayı loglanır: çağrı başına başlangıç/bitiş
+  (adım başına göre ms), toplam süre ve örtüşme oranı (sum / wall; >1 ise
+  çağrılar gerçekten paralel koşmuştur).
+"""
+
+from __future__ import annotations
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, List
+
+from langchain_core.messages import ToolMessage
+from langgraph.prebuilt import ToolNode
+
+from stage_timing import record as record_stage
+
+TOOL_CALL_TIMEOUT_SECONDS = float(os.getenv("TOOL_CALL_TIMEOUT_SECONDS", "4"))
+TOOL_STEP_DEADLINE_SECONDS = float(os.getenv("TOOL_STEP_DEADLINE_SECONDS", "6"))
+
+log = logging.getLogger("advanced-agent")
+
+
+def _timeout_message(call: Dict[str, Any], error: str) -> ToolMessage:
+    return ToolMessage(
+        content=json.dumps({"ok": False, "error": error}),
+        name=call["name"],
+        tool_call_id=call["id"],
+        status="error",
+    )
+
+
+class ParallelToolNode(ToolNode):
+    """create_react_agent(..., version="v1") ile kullanılır: adımın tüm çağrıları bu düğüme gelir."""
+
+    def __init__(self, tools, *, call_timeout: float = TOOL_CALL_TIMEOUT_SECONDS,
+                 step_deadline: float = TOOL_STEP_DEADLINE_SECONDS, **kwargs):
+        super().__init__(tools, **kwargs)
+        self.call_timeout = call_timeout
+        self.step_deadline = step_deadline
+
+    async def _afunc(self, input, config, *, store=None):
+        tool_calls, input_type = self._parse_input(input, store)
+        t0 = time.perf_counter()
+        trace: List[Dict[str, Any]] = [{"tool": c["name"], "status": "pending"} for c in tool_calls]
+
+        async def run(i: int, call: Dict[str, Any]):
+            trace[i]["start_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+            try:
+                out = await asyncio.wait_for(self._arun_one(call, input_type, config), timeout=self.call_timeout)
+                trace[i]["status"] = "ok"
+            except asyncio.TimeoutError:
+                out = _timeout_message(call, "timeout")
+                trace[i]["status"] = "timeout"
+            trace[i]["end_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+            return out
+
+        tasks = [asyncio.create_task(run(i, c)) for i, c in enumerate(tool_calls)]
+        _done, pending = await asyncio.wait(tasks, timeout=self.step_deadline)
+        for task in pending:
+            task.cancel()
+
+        outputs = []
+        for i, (call, task) in enumerate(zip(tool_calls, tasks)):
+            if task in pending:
+                trace[i]["status"] = "step_deadline"
+                trace[i]["end_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+                outputs.append(_timeout_message(call, "timeout"))
+            else:
+                outputs.append(task.result())
+
+        wall_ms = (time.perf_counter() - t0) * 1000
+        self._log_trace(trace, wall_ms)
+        record_stage("tools", wall_ms)
+        return self._combine_tool_outputs(outputs, input_type)
+
+    @staticmethod
+    def _log_trace(trace: List[Dict[str, Any]], wall_ms: float) -> None:
+        busy_ms = sum(t.get("end_ms", 0) - t.get("start_ms", 0) for t in trace)
+        log.info(json.dumps({
+            "event": "tool_step",
+            "calls": trace,
+            "wall_ms": round(wall_ms, 1),
+            "sum_ms": round(busy_ms, 1),
+            "overlap": round(busy_ms / wall_ms, 2) if wall_ms > 0 else None,
+        }))
@@ -0,0 +1,150 @@
+"""
+tool_selector.py
+LLM'e gönderilen araç listesini mesaja göre daraltır ve kısaltır.
+
+- Seçim: kelime kökü ön filtresi (Türkçe karakterler katlanmış). Mesaj hiçbir
+  gruba uymuyorsa ("evet", "onaylıyorum" gibi) tüm araçlar gönderilir.
+- Kısaltma: server.py docstring'lerinin yalnızca ilk paragrafı ve
+  Parameters/Parametreler/Args bölümündeki parametre satırlarının kısa hâli
+  kalır; Returns/Examples blokları atılır. Müşteri parametresi (ajan
+  enjekte eder) LLM'in gördüğü şemadan çıkarılır.
+- Kısaltılmış şemalar açılışta bir kez hesaplanır; her istekte yalnızca seçim
+  yapılır ve prompt token raporu (approx_tokens) loglanır.
+
+Araçların kendisi (ToolNode'daki wrapper'lar) değişmez; yalnızca modele
+bind_tools ile verilen şemalar küçülür.
+"""
+
+from __future__ import annotations
+import copy
+import json
+import re
+from typing import Any, Dict, Iterable, List, Sequence
+
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from mcp_server.data.account_types import fold_tr
+from agent.memory import approx_tokens
+
+TOOL_DESCRIPTION_MAX_CHARS = 240
+PARAM_DESCRIPTION_MAX_CHARS = 120
+
+# akışı docstring'in sonraki paragraflarına bağlı araçlar için elle yazılmış kısa açıklamalar
+DESCRIPTION_OVERRIDES = {
+    "payment_request": (
+        "Own-accounts transfer. confirm=false → preview (returns suggested_client_ref); "
+        "confirm=true → commit; on commit pass the preview's suggested_client_ref as client_ref."
+    ),
+    "payment_request_by_type": (
+        "Hesap tipiyle transfer (vadeli | vadesiz | maaş | yatırım), hesap numarası gerekmez. "
+        "confirm=false → önizleme (suggested_client_ref döner); confirm=true → gerçekleştir; "
+        "commit'te önizlemedeki suggested_client_ref'i client_ref olarak ver."
+    ),
+}
+
+# kök (katlanmış, önek eşleşmesi) -> araçlar
+TOOL_GROUPS: Sequence[tuple] = (
+    (("hesap", "hesab", "bakiye", "vadeli", "vadesiz", "maas", "iban", "param"),
+     ("get_accounts", "get_balance", "get_balance_by_account_type")),
+    (("kart", "limit", "ekstre", "borc"),
+     ("list_customer_cards", "get_card_info")),
+    (("doviz", "kur", "dolar", "euro", "avro", "sterlin", "usd", "eur", "gbp", "cevir"),
+     ("get_exchange_rates", "fx_convert")),
+    (("faiz", "mevduat", "getiri", "oran"),
+     ("get_interest_rates", "interest_compute")),
+    (("ucret", "masraf", "komisyon", "eft", "havale", "fast", "swift"),
+     ("get_fee", "get_all_fees")),
+    (("kredi", "taksit", "odeme plan", "amortisman"),
+     ("loan_amortization_schedule", "get_interest_rates")),
+    (("sube", "atm", "yakin", "adres"),
+     ("branch_atm_search",)),
+    (("islem", "hareket", "harcama", "gecmis"),
+     ("transactions_list", "transactions_list_by_type", "get_accounts")),
+    (("portfoy", "yatirim", "roi", "simulasyon", "risk", "fon"),
+     ("run_roi_simulation", "list_portfolios")),
+    (("gonder", "transfer", "aktar", "havale", "odeme yap", "para yatir"),
+     ("payment_request", "payment_request_by_type", "get_accounts")),
+)
+
+_SECTION_RE = re.compile(r"^\s*(parameters|parametreler|args|arguments)\s*:\s*$", re.IGNORECASE)
+_END_SECTION_RE = re.compile(r"^\s*(returns?|dönüş|döner|examples?|örnek\w*|raises|notes?|not)\s*:?\s*$", re.IGNORECASE)
+_PARAM_RE = re.compile(r"^\s*-?\s*([A-Za-z_][\w/]*)\s*(\([^)]*\))?\s*:\s*(.+)$")
+
+
+def _clip(text: str, limit: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+
+def compact_description(doc: str, skip_params: Iterable[str] = ()) -> str:
+    """İlk paragraf + kısa parametre satırları."""
+    doc = (doc or "").strip()
+    if not doc:
+        return ""
+    paragraphs = re.split(r"\n\s*\n", doc)
+    summary = _clip(paragraphs[0], TOOL_DESCRIPTION_MAX_CHARS)
+
+    skip = set(skip_params)
+    params: List[List[str]] = []
+    in_params = False
+    current = None
+    for line in doc.splitlines():
+        if _SECTION_RE.match(line):
+            in_params = True
+            continue
+        if not in_params:
+            continue
+        if _END_SECTION_RE.match(line) or not line.strip():
+            if params or _END_SECTION_RE.match(line):
+                break
+            continue
+        m = _PARAM_RE.match(line)
+        if m:
+            current = None if m.group(1) in skip else [m.group(1), m.group(3)]
+            if current:
+                params.append(current)
+        elif current:
+            current[1] += " " + line.strip()  # çok satırlı parametre açıklaması
+    parts = [f"{name}: {_clip(desc, PARAM_DESCRIPTION_MAX_CHARS)}" for name, desc in params]
+    return summary + (" | " + "; ".join(parts) if parts else "")
+
+
+class ToolSelector:
+    def __init__(self, tools: Sequence[Any], customer_aliases: Iterable[str] = ()):
+        aliases = set(customer_aliases)
+        self.names = [t.name for t in tools]
+        self._specs: Dict[str, Dict[str, Any]] = {}
+        self._tokens: Dict[str, int] = {}
+        self.full_tokens = 0
+        for t in tools:
+            full = convert_to_openai_tool(t)
+            self.full_tokens += approx_tokens(json.dumps(full, ensure_ascii=False))
+            spec = copy.deepcopy(full)
+            fn = spec["function"]
+            fn["description"] = (DESCRIPTION_OVERRIDES.get(t.name)
+                                 or compact_description(t.description, aliases) or fn.get("description", ""))
+            params = fn.get("parameters") or {}
+            for alias in aliases:
+                (params.get("properties") or {}).pop(alias, None)
+            if "required" in params:
+                params["required"] = [p for p in params["required"] if p not in aliases]
+            self._specs[t.name] = spec
+            self._tokens[t.name] = approx_tokens(json.dumps(spec, ensure_ascii=False))
+        self._groups = [(tuple(fold_tr(k) for k in keys), [n for n in names if n in self._specs])
+                        for keys, names in TOOL_GROUPS]
+
+    def select(self, text: str) -> List[str]:
+        words = fold_tr(text).split()
+        low = " ".join(words)
+        picked: Dict[str, None] = {}
+        for keys, names in self._groups:
+            # kelime başı önek eşleşmesi ("hesaplarım" -> hesap); çok kelimeli kökler metinde aranır
+            if any((" " in k and k in low) or any(w.startswith(k) for w in words) for k in keys):
+                picked.update(dict.fromkeys(names))
+        return list(picked) or list(self.names)
+
+    def specs(self, names: Iterable[str]) -> List[Dict[str, Any]]:
+        return [self._specs[n] for n in names if n in self._specs]
+
+    def tool_tokens(self, names: Iterable[str]) -> int:
+        return sum(self._tokens.get(n, 0) for n in names)
@@ -3,6 +3,7 @@ import os
 from typing import Optional
 
 from config_local import DB_PATH, SECRET_KEY
+from stage_timing import stage
 from fastapi import APIRouter, HTTPException, Depends
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
@@ -19,6 +20,11 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30  # Token’ın geçerlilik süresi
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
 def get_current_user(token: str = Depends(oauth2_scheme)) -> int: # int döndürecek şekilde güncellendi
+    with stage("auth"):
+        return _current_user(token)
+
+
+def _current_user(token: str) -> int:
     credentials_exception = HTTPException(
         status_code=401,
         detail="Kimlik bilgileri doğrulanamadı",
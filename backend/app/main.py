@@ -5,6 +5,7 @@ from datetime import datetime, timezone
 from typing import Optional
 from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
 ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
@@ -22,7 +23,8 @@ from chat.chat_history import (
     ensure_session_exists_sync,
     update_session_updated_at_sync,
 )
-from agent.AdvancedAgent import agent_handle_message_async
+from stage_timing import begin as begin_stages, stage, server_timing
+from agent.AdvancedAgent import agent_handle_message_async, agent_stream_message_async, agent_llm_stats
 from mcp_server.tools.general_tools import GeneralTools
 from mcp_server.data.sqlite_repo import SQLiteRepository
 from config_local import DB_PATH
@@ -44,6 +46,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Aşama süreleri (auth / history / llm / tools / format) -> Server-Timing başlığı
+@app.middleware("http")
+async def stage_timing_middleware(request, call_next):
+    stages = begin_stages()
+    response = await call_next(request)
+    if stages:
+        response.headers["Server-Timing"] = server_timing(stages)
+    return response
+
 # Routers
 app.include_router(chat_router)
 app.include_router(auth_router)
@@ -55,6 +66,18 @@ def _strip_think(text: str) -> str:
     cleaned = re.sub(r"</?ask\b[^>]*>", "", cleaned, flags=re.IGNORECASE)
     return cleaned.strip()
 
+def _extract_reply(agent_result):
+    """Ajan sonucundan (metin, ui_component) çıkarır."""
+    ui_component = None
+    if isinstance(agent_result, dict) and ("YANIT" in agent_result or "text" in agent_result):
+        final_text = agent_result.get("YANIT") or agent_result.get("text") or ""
+        ui_component = agent_result.get("ui_component")
+    elif isinstance(agent_result, str):
+        final_text = agent_result
+    else:
+        final_text = "Şu anda yanıt veremiyorum, lütfen tekrar deneyin."
+    return _strip_think(final_text), ui_component
+
 class ChatRequest(BaseModel):
     message: str
     session_id: Optional[str] = None
@@ -68,6 +91,47 @@ class ChatResponse(BaseModel):
     ui_component: Optional[dict] = None
     chat_id: str
 
+async def _save_user_message(request: ChatRequest, user_id: str) -> None:
+    try:
+        # Başlık için ilk 30 karakteri kullan
+        title = request.message[:30] + "..." if len(request.message) > 30 else request.message
+
+        # Tek tek çağrıları threadpool'a atıyoruz (sqlite senkron)
+        with stage("history"):
+            await to_thread.run_sync(ensure_session_exists_sync, request.chat_id, user_id, title)
+            await to_thread.run_sync(save_message_sync, user_id, request.chat_id, request.message, "user", None, None)
+        log.info("user_message_saved", extra={
+            "user_id": user_id,
+            "chat_id": request.chat_id,
+            "message_length": len(request.message)
+        })
+    except Exception as e:
+        log.error("database_error", extra={
+            "error": str(e),
+            "user_id": user_id,
+            "chat_id": request.chat_id
+        })
+        raise
+
+async def _save_bot_message(chat_id: str, user_id: str, final_text: str, ui_component: Optional[dict]) -> None:
+    try:
+        ui_component_json = json.dumps(ui_component) if ui_component else None
+        with stage("history"):
+            await to_thread.run_sync(save_message_sync, user_id, chat_id, final_text, "bot", ui_component_json, None)
+            await to_thread.run_sync(update_session_updated_at_sync, chat_id, user_id, None)
+        log.info("bot_message_saved", extra={
+            "user_id": user_id,
+            "chat_id": chat_id,
+            "response_length": len(final_text)
+        })
+    except Exception as e:
+        log.error("bot_message_database_error", extra={
+            "error": str(e),
+            "user_id": user_id,
+            "chat_id": chat_id
+        })
+        raise
+
 @app.get("/")
 async def root():
     return {"message": "InterChat API - InterChat Chatbot"}
@@ -76,6 +140,10 @@ async def root():
 async def health_check():
     return {"status": "healthy", "app": "InterChat", "module": "1"}
 
+@app.get("/metrics/llm")
+async def llm_metrics():
+    return agent_llm_stats()
+
 @app.post("/chat", response_model=ChatResponse)
 async def chat_endpoint(request: ChatRequest, current_user: int = Depends(get_current_user)):
     user_id = str(current_user)
@@ -99,34 +167,18 @@ async def chat_endpoint(request: ChatRequest, current_user: int = Depends(get_cu
     })
 
     # === DB: kullanıcı mesajını kaydet + session'ı garanti et ===
-    try:
-        # Başlık için ilk 30 karakteri kullan
-        title = request.message[:30] + "..." if len(request.message) > 30 else request.message
-
-        # Tek tek çağrıları threadpool'a atıyoruz (sqlite senkron)
-        await to_thread.run_sync(ensure_session_exists_sync, request.chat_id, user_id, title)
-        await to_thread.run_sync(save_message_sync, user_id, request.chat_id, request.message, "user", None, None)
-        log.info("user_message_saved", extra={
-            "user_id": user_id,
-            "chat_id": request.chat_id,
-            "message_length": len(request.message)
-        })
-    except Exception as e:
-        log.error("database_error", extra={
-            "error": str(e),
-            "user_id": user_id,
-            "chat_id": request.chat_id
-        })
-        raise
+    await _save_user_message(request, user_id)
 
     # === Agent / LLM çağrısı (ASYNC) ===
     agent_t0 = time.perf_counter()
     try:
-        agent_result = await agent_handle_message_async(
-            request.message,
-            customer_id=current_user,
-            session_id=session_id,
-        )
+        with stage("agent"):
+            agent_result = await agent_handle_message_async(
+                request.message,
+                customer_id=current_user,
+                session_id=session_id,
+                chat_id=request.chat_id,
+            )
 
         #agent_result = await to_thread.run_sync(agent_handle_message, request.message, current_user)
         agent_dur = int((time.perf_counter() - agent_t0) * 1000)
@@ -147,34 +199,10 @@ async def chat_endpoint(request: ChatRequest, current_user: int = Depends(get_cu
         })
 
     # === Cevabı hazırla ===
-    ui_component = None
-    if isinstance(agent_result, dict) and ("YANIT" in agent_result or "text" in agent_result):
-        final_text = agent_result.get("YANIT") or agent_result.get("text") or ""
-        ui_component = agent_result.get("ui_component")
-    elif isinstance(agent_result, str):
-        final_text = agent_result
-    else:
-        final_text = "Şu anda yanıt veremiyorum, lütfen tekrar deneyin."
-
-    final_text = _strip_think(final_text)
+    final_text, ui_component = _extract_reply(agent_result)
 
     # === DB: bot mesajını kaydet + session updated_at ===
-    try:
-        ui_component_json = json.dumps(ui_component) if ui_component else None
-        await to_thread.run_sync(save_message_sync, user_id, request.chat_id, final_text, "bot", ui_component_json, None)
-        await to_thread.run_sync(update_session_updated_at_sync, request.chat_id, user_id, None)
-        log.info("bot_message_saved", extra={
-            "user_id": user_id,
-            "chat_id": request.chat_id,
-            "response_length": len(final_text)
-        })
-    except Exception as e:
-        log.error("bot_message_database_error", extra={
-            "error": str(e),
-            "user_id": user_id,
-            "chat_id": request.chat_id
-        })
-        raise
+    await _save_bot_message(request.chat_id, user_id, final_text, ui_component)
 
     # çıkış logu
     log.info("chat_response", extra={
@@ -197,6 +225,92 @@ async def chat_endpoint(request: ChatRequest, current_user: int = Depends(get_cu
         chat_id=request.chat_id,
     )
 
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/chat/stream")
+async def chat_stream_endpoint(request: ChatRequest, current_user: int = Depends(get_current_user)):
+    """
+    /chat'in akışlı (Server-Sent Events) sürümü. Olaylar:
+      tool   {"tool", "status": "start|end", "ok"}   — araç ilerlemesi
+      token  {"text"}                                 — LLM çıktısı geldikçe
+      final  ChatResponse alanları                     — biçimlenmiş yanıt + ui_component
+    Bot mesajı final olayından hemen önce kaydedilir.
+    """
+    user_id = str(current_user)
+    if not request.chat_id:
+        request.chat_id = str(uuid.uuid4())
+    corr_id = str(uuid.uuid4())
+    session_id = request.session_id or str(uuid.uuid4())
+    message_id = str(uuid.uuid4())
+
+    log.info("chat_request", extra={
+        "event": "chat_request",
+        "corr_id": corr_id,
+        "user_id": user_id,
+        "meta": {"session_id": session_id, "message_id": message_id, "chat_id": request.chat_id, "stream": True},
+        "message_masked": mask_text(request.message),
+    })
+    await _save_user_message(request, user_id)
+
+    async def events():
+        agent_t0 = time.perf_counter()
+        first_token_ms = None
+        agent_result = None
+        try:
+            async for ev in agent_stream_message_async(request.message, customer_id=current_user, session_id=session_id,
+                                                     chat_id=request.chat_id):
+                if ev["type"] == "tool_start":
+                    yield _sse("tool", {"tool": ev["tool"], "status": "start"})
+                elif ev["type"] == "tool_end":
+                    yield _sse("tool", {"tool": ev["tool"], "status": "end", "ok": ev["ok"]})
+                elif ev["type"] == "token":
+                    if first_token_ms is None:
+                        first_token_ms = int((time.perf_counter() - agent_t0) * 1000)
+                    yield _sse("token", {"text": ev["text"]})
+                elif ev["type"] == "final":
+                    agent_result = ev["response"]
+        except Exception as exc:
+            log.error("agent_error", extra={
+                "event": "agent_error",
+                "corr_id": corr_id,
+                "duration_ms": int((time.perf_counter() - agent_t0) * 1000),
+                "error": str(exc),
+            })
+        log.info("agent_response_raw", extra={
+            "event": "agent_response_raw",
+            "corr_id": corr_id,
+            "duration_ms": int((time.perf_counter() - agent_t0) * 1000),
+            "meta": {"type": str(type(agent_result)), "stream": True, "first_token_ms": first_token_ms},
+        })
+
+        final_text, ui_component = _extract_reply(agent_result)
+        try:
+            await _save_bot_message(request.chat_id, user_id, final_text, ui_component)
+        except Exception:
+            yield _sse("error", {"message": "Yanıt kaydedilemedi."})
+            return
+
+        log.info("chat_response", extra={
+            "event": "chat_response",
+            "corr_id": corr_id,
+            "user_id": user_id,
+            "meta": {"session_id": session_id, "message_id": message_id, "has_ui_component": ui_component is not None,
+                     "chat_id": request.chat_id, "stream": True},
+            "response_masked": mask_text(final_text),
+        })
+        yield _sse("final", ChatResponse(
+            session_id=session_id,
+            message_id=message_id,
+            response=final_text,
+            timestamp=datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            ui_component=ui_component,
+            chat_id=request.chat_id,
+        ).model_dump())
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 # Accounts endpoint
 @app.get("/accounts")
 async def get_user_accounts(current_user: int = Depends(get_current_user)):
@@ -0,0 +1,265 @@
+# bench/chat_load.py
+"""
+/chat uçtan uca yük testi: sahte LLM (bench.mock_llm) + gerçek MCP sunucusu +
+gerçek API (app.main), dummy_bank.db'nin geçici bir kopyası üzerinde.
+
+Harness süreçleri kendisi başlatır (--api-url verilirse yalnızca yük üretir):
+  1) python -m bench.mock_llm         (deterministik araç çağrıları, sabit gecikme)
+  2) python -m mcp_server.server      (SSE, 127.0.0.1:8081; --mcp-transport inprocess ile atlanır)
+  3) uvicorn app.main:app             (LLM_API_BASE=sahte LLM, BANK_DB_PATH/CHAT_DB_PATH geçici)
+
+DB'den --users müşteri seçilir, her biri /auth/login ile token alır ve kendi
+sohbetinde --requests mesajı sırayla gönderir (kapalı döngü; tüm kullanıcılar
+eşzamanlı). Hızlı yol ve yanıt önbelleği varsayılan olarak kapatılır ki her
+istek LLM + araç yolundan geçsin (--fast-path / --response-cache ile açılır).
+
+Rapor: istemci gecikmesi p50/p95/p99, throughput ve API'nin Server-Timing
+başlığından aşama dağılımı (auth, history yazımı, memory, llm, tools, format;
+agent_other = ajan süresinin geri kalanı: LangGraph + şema/mesaj hazırlığı;
+http_other = istemci süresinden sunucu aşamaları çıktıktan sonra kalan).
+
+Kullanım (backend dizininde):
+    python -m bench.chat_load --users 16 --requests 5 [--tool-call-ms 300 --final-ms 150]
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+BACKEND = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+ROOT = os.path.dirname(BACKEND)
+
+import httpx
+
+PROMPTS = [
+    "Hesaplarımı göster",
+    "Kredi kartlarımı listele",
+    "Vadesiz hesabımın son işlemleri",
+    "100 USD kaç TL eder?",
+    "Güncel faiz oranları nedir?",
+    "Tüm ücret ve masrafları göster",
+    "100000 TL kredi için 12 ay taksit planı",
+    "İstanbul'daki ATM'ler",
+]
+STAGES = ["auth", "history", "memory", "llm", "tools", "format", "agent_other", "agent", "http_other"]
+MCP_PORT = 8081
+
+
+def pct(values, p):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def pick_users(db_path: str, n: int):
+    con = sqlite3.connect(db_path)
+    try:
+        rows = con.execute(
+            "SELECT customer_no, password FROM customers "
+            "WHERE customer_no IS NOT NULL AND password IS NOT NULL ORDER BY customer_id LIMIT ?", (n,)
+        ).fetchall()
+    finally:
+        con.close()
+    if not rows:
+        raise SystemExit("[HATA] Giriş bilgisi olan müşteri bulunamadı.")
+    # müşteri sayısından fazla kullanıcı istenirse hesaplar tekrar kullanılır (ayrı sohbetler)
+    return [rows[i % len(rows)] for i in range(n)]
+
+
+def parse_server_timing(header: Optional[str]) -> Dict[str, float]:
+    stages = {}
+    for part in (header or "").split(","):
+        name, _, dur = part.strip().partition(";dur=")
+        if name and dur:
+            stages[name] = float(dur)
+    return stages
+
+
+def spawn(name: str, cmd: List[str], env: dict, log_dir: str) -> subprocess.Popen:
+    out = open(os.path.join(log_dir, f"{name}.log"), "wb")
+    print(f"[INFO] {name}: {' '.join(cmd)}")
+    return subprocess.Popen(cmd, cwd=BACKEND, env=env, stdout=out, stderr=subprocess.STDOUT)
+
+
+def port_open(port: int) -> bool:
+    with socket.socket() as s:
+        s.settimeout(0.2)
+        return s.connect_ex(("127.0.0.1", port)) == 0
+
+
+async def tcp_ready(port: int) -> bool:
+    return port_open(port)
+
+
+async def wait_ready(check, what: str, procs: List[subprocess.Popen], timeout: float = 60):
+    t0 = time.monotonic()
+    while time.monotonic() - t0 < timeout:
+        if any(p.poll() is not None for p in procs):
+            raise SystemExit(f"[HATA] {what} başlamadan bir süreç kapandı (logları inceleyin).")
+        try:
+            if await check():
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.2)
+    raise SystemExit(f"[HATA] {what} {timeout:.0f}s içinde hazır olmadı.")
+
+
+async def login(client: httpx.AsyncClient, api: str, customer_no: str, password: str) -> str:
+    r = await client.post(f"{api}/auth/login", json={"customer_no": customer_no, "password": password})
+    r.raise_for_status()
+    return r.json()["token"]
+
+
+async def user_loop(client: httpx.AsyncClient, api: str, token: str, index: int, requests: int, results: list):
+    headers = {"Authorization": f"Bearer {token}"}
+    chat_id = None
+    for i in range(requests):
+        message = PROMPTS[(index + i) % len(PROMPTS)]
+        t0 = time.perf_counter()
+        try:
+            r = await client.post(f"{api}/chat", json={"message": message, "chat_id": chat_id}, headers=headers)
+            ok = r.status_code == 200
+            if ok:
+                chat_id = r.json().get("chat_id") or chat_id
+            stages = parse_server_timing(r.headers.get("Server-Timing"))
+        except httpx.HTTPError as e:
+            ok, stages = False, {}
+            print(f"[WARN] istek hatası: {type(e).__name__}: {e}")
+        results.append({"ms": (time.perf_counter() - t0) * 1000, "ok": ok, "stages": stages})
+
+
+def report(results: list, wall: float, llm_stats: Optional[dict]):
+    lat = [r["ms"] for r in results if r["ok"]]
+    errors = sum(not r["ok"] for r in results)
+    print(f"\nistek={len(results)} hata={errors} süre={wall:.1f}s throughput={len(results) / wall:.2f} istek/s")
+    print(f"gecikme  p50={pct(lat, 50):8.1f}ms  p95={pct(lat, 95):8.1f}ms  p99={pct(lat, 99):8.1f}ms")
+
+    per_stage: Dict[str, List[float]] = {s: [] for s in STAGES}
+    for r in results:
+        if not r["ok"]:
+            continue
+        st = dict(r["stages"])
+        agent = st.get("agent", 0.0)
+        st["agent_other"] = max(0.0, agent - sum(st.get(k, 0.0) for k in ("memory", "llm", "tools", "format")))
+        st["http_other"] = max(0.0, r["ms"] - sum(st.get(k, 0.0) for k in ("auth", "history", "agent")))
+        for s in STAGES:
+            per_stage[s].append(st.get(s, 0.0))
+    mean_total = sum(lat) / len(lat) if lat else 0.0
+    print(f"\n{'aşama':<12}{'ort':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'pay':>7}")
+    for s in STAGES:
+        v = per_stage[s]
+        if not v:
+            continue
+        mean = sum(v) / len(v)
+        share = "" if s == "agent" else f"{100 * mean / mean_total:5.1f}%" if mean_total else ""
+        print(f"{s:<12}{mean:9.1f}{pct(v, 50):9.1f}{pct(v, 95):9.1f}{pct(v, 99):9.1f}{share:>7}")
+    print("(agent = memory + llm + tools + format + agent_other; pay: ortalama istemci süresine oran)")
+    if llm_stats:
+        print(f"\nsahte LLM yanıtları: {llm_stats}")
+
+
+async def main_async(a):
+    tmp = tempfile.mkdtemp(prefix="chat_load_")
+    log_dir = os.path.join(tmp, "logs")
+    os.makedirs(log_dir)
+    db = os.path.join(tmp, "bank.db")
+    shutil.copyfile(a.db, db)
+    users = pick_users(db, a.users)
+
+    procs: List[subprocess.Popen] = []
+    api = a.api_url.rstrip("/") if a.api_url else f"http://127.0.0.1:{a.api_port}"
+    llm = f"http://127.0.0.1:{a.llm_port}"
+    try:
+        if not a.api_url:
+            if a.mcp_transport == "sse" and port_open(MCP_PORT):
+                raise SystemExit(f"[HATA] {MCP_PORT} portu dolu; çalışan MCP sunucusunu kapatın.")
+            env = dict(os.environ)
+            env.update({
+                "PYTHONPATH": os.pathsep.join([BACKEND, ROOT, env.get("PYTHONPATH", "")]),
+                "BANK_DB_PATH": db,
+                "CHAT_DB_PATH": os.path.join(tmp, "chat.db"),
+                "LOG_DIR": log_dir,
+                "LLM_API_BASE": f"{llm}/v1",
+                "LLM_API_KEY": "mock",
+                "MCP_TRANSPORT": a.mcp_transport,
+                "AGENT_FAST_PATH": "1" if a.fast_path else "0",
+                "RESPONSE_CACHE": "1" if a.response_cache else "0",
+            })
+            procs.append(spawn("mock_llm", [sys.executable, "-m", "bench.mock_llm", "--port", str(a.llm_port),
+                                            "--tool-call-ms", str(a.tool_call_ms), "--final-ms", str(a.final_ms)],
+                               env, log_dir))
+            if a.mcp_transport == "sse":
+                procs.append(spawn("mcp", [sys.executable, "-m", "mcp_server.server"], env, log_dir))
+            procs.append(spawn("api", [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(a.api_port),
+                                       "--log-level", "warning"], env, log_dir))
+
+        async with httpx.AsyncClient(timeout=a.timeout,
+                                     limits=httpx.Limits(max_connections=a.users * 2)) as client:
+            if procs:
+                async def health():
+                    return (await client.get(f"{api}/health")).status_code == 200
+                await wait_ready(lambda: tcp_ready(a.llm_port), "sahte LLM", procs)
+                if a.mcp_transport == "sse":
+                    await wait_ready(lambda: tcp_ready(MCP_PORT), "MCP sunucusu", procs)
+                await wait_ready(health, "API", procs)
+
+            tokens = await asyncio.gather(*(login(client, api, cno, pw) for cno, pw in users))
+            # ısınma: ajanın ilk kurulumu (MCP araçları, model) ölçüme girmesin
+            await user_loop(client, api, tokens[0], 0, 1, [])
+
+            results: list = []
+            t0 = time.perf_counter()
+            await asyncio.gather(*(user_loop(client, api, tok, i, a.requests, results)
+                                   for i, tok in enumerate(tokens)))
+            wall = time.perf_counter() - t0
+
+            llm_stats = None
+            if procs:
+                try:
+                    llm_stats = (await client.get(f"{llm}/stats")).json()
+                except httpx.HTTPError:
+                    pass
+        report(results, wall, llm_stats)
+    finally:
+        for p in reversed(procs):
+            p.terminate()
+        for p in procs:
+            try:
+                p.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                p.kill()
+        if a.keep:
+            print(f"[INFO] loglar ve DB kopyası: {tmp}")
+        else:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="/chat uçtan uca yük testi (sahte LLM + gerçek MCP)")
+    ap.add_argument("--users", type=int, default=16, help="eşzamanlı kullanıcı sayısı")
+    ap.add_argument("--requests", type=int, default=5, help="kullanıcı başına mesaj sayısı")
+    ap.add_argument("--db", default=os.path.join(BACKEND, "dummy_bank.db"), help="kaynak DB (kopyası kullanılır)")
+    ap.add_argument("--api-url", help="çalışan bir API'ye yük ver (süreç başlatılmaz)")
+    ap.add_argument("--api-port", type=int, default=8099)
+    ap.add_argument("--llm-port", type=int, default=8790)
+    ap.add_argument("--mcp-transport", choices=["sse", "inprocess"], default="sse")
+    ap.add_argument("--tool-call-ms", type=float, default=300.0)
+    ap.add_argument("--final-ms", type=float, default=150.0)
+    ap.add_argument("--fast-path", action="store_true", help="kural tabanlı hızlı yolu açık bırak")
+    ap.add_argument("--response-cache", action="store_true", help="yanıt önbelleğini açık bırak")
+    ap.add_argument("--timeout", type=float, default=60.0)
+    ap.add_argument("--keep", action="store_true", help="geçici dizini (loglar, DB) silme")
+    asyncio.run(main_async(ap.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# bench/hot_account.py
+"""
+Sıcak hesap (hot account) transfer throughput benchmark'ı.
+
+Tek bir kaynak hesaptan hedef hesaba, artan sayıda thread ile doğrudan
+SQLitePaymentRepository.insert_payment_posted çağırır. Her koşuda tx/s,
+hata dağılımı ve bakiye tutarlılığını (toplam korunur, negatif bakiye yok)
+raporlar. dummy_bank.db'nin geçici kopyası kullanılır.
+
+Kullanım (backend dizininde):
+    python -m bench.hot_account --transfers 3000 --threads 1,4,16,32
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if BACKEND not in sys.path:
+    sys.path.insert(0, BACKEND)
+
+from bench.payment_load import pick_account_pair
+from mcp_server.data.sql_payment_repo import SQLitePaymentRepository
+
+
+def balances(db_path: str, *account_ids: int) -> list[float]:
+    con = sqlite3.connect(db_path)
+    try:
+        return [float(con.execute("SELECT balance FROM accounts WHERE account_id=?", (a,)).fetchone()[0])
+                for a in account_ids]
+    finally:
+        con.close()
+
+
+def run_once(src_db: str, transfers: int, threads: int, amount: float):
+    tmp_dir = tempfile.mkdtemp(prefix="hot_account_")
+    db_path = os.path.join(tmp_dir, "bank.db")
+    shutil.copyfile(src_db, db_path)
+    try:
+        repo = SQLitePaymentRepository(db_path=db_path)
+        customer_id, hot, other = pick_account_pair(db_path)
+        before = balances(db_path, hot, other)
+
+        def one(i: int):
+            try:
+                repo.insert_payment_posted(customer_id, hot, other, amount, "TRY", 0.0, f"hot#{i}")
+                return "ok"
+            except ValueError as ve:
+                return str(ve)
+            except Exception as e:
+                return type(e).__name__
+
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as ex:
+            outcomes = Counter(ex.map(one, range(transfers)))
+        elapsed = time.perf_counter() - t0
+
+        after = balances(db_path, hot, other)
+        conserved = abs(sum(before) - sum(after)) < 1e-6
+        expected_hot = before[0] - outcomes.get("ok", 0) * amount
+        return {
+            "threads": threads,
+            "elapsed_s": round(elapsed, 3),
+            "tx_per_s": round(outcomes.get("ok", 0) / elapsed, 1),
+            "outcomes": dict(outcomes),
+            "balance_conserved": conserved,
+            "hot_balance_ok": abs(after[0] - expected_hot) < 1e-6 and after[0] >= 0,
+        }
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Sıcak hesap transfer throughput benchmark'ı")
+    ap.add_argument("--transfers", type=int, default=3000)
+    ap.add_argument("--threads", default="1,4,16,32", help="virgülle ayrılmış thread sayıları")
+    ap.add_argument("--amount", type=float, default=1.0)
+    ap.add_argument("--db", default=os.path.join(BACKEND, "dummy_bank.db"))
+    args = ap.parse_args()
+
+    for n in [int(x) for x in args.threads.split(",") if x.strip()]:
+        print(run_once(args.db, args.transfers, n, args.amount))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+# bench/llm_gateway_check.py
+"""
+LLM ağ geçidinin (agent/llm_gateway.py) yerel sahte OpenAI uyumlu sunucuya
+karşı doğrulaması. Sunucu bu süreçte açılır (uvicorn); davranışı yol önekiyle
+seçilir:
+    /ok/v1          ~40ms, her 25 istekten biri 1.5s takılır (hedge senaryosu)
+    /down/v1        hep 503 (yedek uç + tekrar bütçesi senaryosu)
+    /hang/v1        cevap vermez (süre sınırı senaryosu)
+    /fallback/v1    ~20ms; gelen model adını yanıtta geri döner
+
+İstekler gerçek ChatOpenAI (http_async_client=ağ geçidi) üzerinden gönderilir.
+
+Kullanım (backend dizininde):
+    python -m bench.llm_gateway_check [--port 8799]
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import sys
+import time
+
+BACKEND = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if BACKEND not in sys.path:
+    sys.path.insert(0, BACKEND)
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from langchain_openai import ChatOpenAI
+
+from agent.llm_gateway import build_http_client, llm_deadline
+
+app = FastAPI()
+_counter = itertools.count()
+hits = {"ok": 0, "down": 0, "hang": 0, "fallback": 0}
+
+
+def _completion(model: str, text: str) -> dict:
+    return {
+        "id": "chatcmpl-fake", "object": "chat.completion", "created": int(time.time()), "model": model,
+        "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": text}}],
+        "usage": {"prompt_tokens": 10, "completion_tokens": 2, "total_tokens": 12},
+    }
+
+
+@app.post("/{mode}/v1/chat/completions")
+async def completions(mode: str, request: Request):
+    body = await request.json()
+    hits[mode] = hits.get(mode, 0) + 1
+    if mode == "down":
+        return JSONResponse({"error": {"message": "unavailable"}}, status_code=503)
+    if mode == "hang":
+        await asyncio.sleep(3600)
+    if mode == "fallback":
+        await asyncio.sleep(0.02)
+        return _completion(body["model"], f"fallback:{body['model']}")
+    await asyncio.sleep(1.5 if next(_counter) % 25 == 24 else 0.04)
+    return _completion(body["model"], "ok")
+
+
+def pct(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def make_model(base: str, **fallback):
+    http, gateway = build_http_client(base, **fallback)
+    model = ChatOpenAI(model="primary-model", openai_api_base=base, openai_api_key="x",
+                       max_retries=0, http_async_client=http)
+    return model, gateway
+
+
+async def timed_calls(model, n: int, concurrency: int = 4):
+    sem = asyncio.Semaphore(concurrency)
+    latencies, outputs = [], []
+
+    async def one():
+        async with sem:
+            t0 = time.perf_counter()
+            try:
+                outputs.append((await model.ainvoke("merhaba")).content)
+            except Exception as e:
+                outputs.append(f"error:{type(e).__name__}")
+            latencies.append((time.perf_counter() - t0) * 1000)
+
+    await asyncio.gather(*(one() for _ in range(n)))
+    return latencies, outputs
+
+
+async def scenario_hedge(root: str):
+    print("== hedge (p95 sonrası ikinci istek) ==")
+    for hedge in (False, True):
+        model, gateway = make_model(f"{root}/ok/v1")
+        gateway.hedge = hedge
+        await timed_calls(model, 30, 1)  # p95 için örnek topla
+        lat, _ = await timed_calls(model, 60, 4)
+        print(f"hedge={hedge!s:<5} p50={pct(lat, 50):7.1f}ms p95={pct(lat, 95):7.1f}ms "
+              f"p99={pct(lat, 99):7.1f}ms max={max(lat):7.1f}ms  hedges={gateway.counters['hedges']} "
+              f"wins={gateway.counters['hedge_wins']}")
+        await gateway.aclose()
+
+
+async def scenario_fallback(root: str):
+    print("== yedek uç (birincil hep 503) ==")
+    model, gateway = make_model(f"{root}/down/v1", fallback_api_base=f"{root}/fallback/v1",
+                                fallback_model="fallback-model", fallback_api_key="y")
+    before = hits["down"]
+    lat, out = await timed_calls(model, 5, 1)
+    print(f"yanıtlar={sorted(set(out))} birincil_istek={hits['down'] - before} "
+          f"p50={pct(lat, 50):.1f}ms stats={json.dumps(gateway.stats()['endpoints'])}")
+    await gateway.aclose()
+
+
+async def scenario_budget(root: str):
+    print("== tekrar bütçesi (birincil hep 503, yedek yok) ==")
+    model, gateway = make_model(f"{root}/down/v1")
+    before = hits["down"]
+    _, out = await timed_calls(model, 40, 8)
+    sent = hits["down"] - before
+    print(f"istek=40 upstream_istek={sent} (bütçesiz: {40 * gateway.max_attempts}) "
+          f"retries={gateway.counters['retries']} budget_exhausted={gateway.counters['budget_exhausted']} "
+          f"hatalar={sum(o.startswith('error') for o in out)}")
+    await gateway.aclose()
+
+
+async def scenario_deadline(root: str):
+    print("== süre sınırı (birincil cevap vermiyor, tur sınırı 4s) ==")
+    model, gateway = make_model(f"{root}/hang/v1", fallback_api_base=f"{root}/fallback/v1",
+                                fallback_model="fallback-model")
+    gateway.attempt_timeout = 2
+    t0 = time.perf_counter()
+    with llm_deadline(4):
+        try:
+            out = (await model.ainvoke("merhaba")).content
+        except Exception as e:
+            out = f"error:{type(e).__name__}"
+    print(f"sonuç={out} süre={(time.perf_counter() - t0) * 1000:.0f}ms counters={gateway.counters}")
+    await gateway.aclose()
+
+
+async def main_async(port: int):
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="critical"))
+    serve = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    root = f"http://127.0.0.1:{port}"
+    try:
+        await scenario_hedge(root)
+        await scenario_fallback(root)
+        await scenario_budget(root)
+        await scenario_deadline(root)
+    finally:
+        server.should_exit = server.force_exit = True  # /hang bağlantısını beklemeden kapan
+        await serve
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--port", type=int, default=8799)
+    a = ap.parse_args()
+    asyncio.run(main_async(a.port))
+
+
+if __name__ == "__main__":
+    main()
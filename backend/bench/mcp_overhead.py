@@ -0,0 +1,115 @@
+# bench/mcp_overhead.py
+"""
+MCP araç çağrısı başına ek yük benchmark'ı: çağrı başına yeni SSE oturumu
+(MultiServerMCPClient.get_tools), kalıcı oturum havuzu (MCPSessionPool) ve
+--inprocess verilirse aynı süreçte bellek içi bağlanan havuz
+(InProcessMCPClient) karşılaştırılır. Ucuz, salt-okunur bir araç (varsayılan
+get_interest_rates; referans verisi bellekte) çağrılır, böylece ölçülen süre
+neredeyse tamamen taşıma + oturum maliyetidir.
+
+Çalışan bir MCP sunucusu gerekir (python -m mcp_server.server); bellek içi mod
+sunucuyu bu süreçte açar (BANK_DB_PATH ile geçici bir DB kopyası önerilir).
+
+Kullanım (backend dizininde):
+    python -m bench.mcp_overhead --calls 200 --concurrency 1,8 [--inprocess]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+BACKEND = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if BACKEND not in sys.path:
+    sys.path.insert(0, BACKEND)
+
+from langchain_mcp_adapters.client import MultiServerMCPClient
+
+from agent.mcp_inprocess import InProcessMCPClient
+from agent.mcp_pool import MCPSessionPool
+from config_local import MCP_SSE_URL
+
+SERVER = "fortuna_banking"
+
+
+def pct(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+async def run_mode(tool, calls: int, concurrency: int, args: dict):
+    sem = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one():
+        async with sem:
+            t0 = time.perf_counter()
+            await tool.ainvoke(args)
+            latencies.append((time.perf_counter() - t0) * 1000)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(calls)))
+    wall = time.perf_counter() - t0
+    return {
+        "mean_ms": statistics.mean(latencies),
+        "p50_ms": pct(latencies, 50),
+        "p95_ms": pct(latencies, 95),
+        "calls_per_s": calls / wall,
+    }
+
+
+def report(label: str, concurrency: int, r: dict):
+    print(f"{label:<10} c={concurrency:<3} mean={r['mean_ms']:7.2f}ms  p50={r['p50_ms']:7.2f}ms  "
+          f"p95={r['p95_ms']:7.2f}ms  {r['calls_per_s']:8.1f} çağrı/s")
+
+
+async def main_async(url: str, tool_name: str, calls: int, concurrency: list[int], pool_size: int,
+                     inprocess: bool):
+    client = MultiServerMCPClient({SERVER: {"url": url, "transport": "sse"}})
+
+    per_call = {t.name: t for t in await client.get_tools()}[tool_name]
+    pool = MCPSessionPool(client, SERVER, size=pool_size, health_interval=0)
+    pooled = {t.name: t for t in await pool.start()}[tool_name]
+    local_pool = local = None
+    if inprocess:
+        local_pool = MCPSessionPool(InProcessMCPClient(), SERVER, size=pool_size, health_interval=0)
+        local = {t.name: t for t in await local_pool.start()}[tool_name]
+    try:
+        for tool in (per_call, pooled, local):  # ısınma
+            if tool is not None:
+                await tool.ainvoke({})
+        for c in concurrency:
+            before = await run_mode(per_call, calls, c, {})
+            after = await run_mode(pooled, calls, c, {})
+            report("per-call", c, before)
+            report("pool", c, after)
+            print(f"{'':<10} çağrı başına kazanç: {before['mean_ms'] - after['mean_ms']:.2f}ms "
+                  f"({before['mean_ms'] / after['mean_ms']:.1f}x)")
+            if local is not None:
+                in_proc = await run_mode(local, calls, c, {})
+                report("inprocess", c, in_proc)
+                print(f"{'':<10} SSE havuzuna göre: {after['mean_ms'] - in_proc['mean_ms']:.2f}ms "
+                      f"({after['mean_ms'] / in_proc['mean_ms']:.1f}x)")
+        print("pool stats:", pool.stats())
+    finally:
+        await pool.close()
+        if local_pool is not None:
+            await local_pool.close()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--url", default=MCP_SSE_URL)
+    ap.add_argument("--tool", default="get_interest_rates")
+    ap.add_argument("--calls", type=int, default=200)
+    ap.add_argument("--concurrency", default="1,8")
+    ap.add_argument("--pool-size", type=int, default=2)
+    ap.add_argument("--inprocess", action="store_true", help="bellek içi taşımayı da ölç")
+    a = ap.parse_args()
+    asyncio.run(main_async(a.url, a.tool, a.calls, [int(x) for x in a.concurrency.split(",")], a.pool_size,
+                           a.inprocess))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+# bench/mock_llm.py
+"""
+Deterministik, OpenAI uyumlu sahte chat-completions sunucusu (yük testi için).
+
+Aynı istek her zaman aynı yanıtı alır:
+- Son mesaj bir araç sonucuysa (role=tool) kısa bir son yanıt metni döner.
+- Değilse son kullanıcı mesajı SCRIPT'teki anahtar kelimelerle (Türkçe
+  karakterler katlanmış) eşlenir ve ilgili araç çağrısı üretilir. Araç
+  istekte gönderilen tools listesinde yoksa (araç seçimi) veya eşleşme yoksa
+  düz metin döner.
+- Gecikme sabittir: araç çağrısı üreten yanıtlar --tool-call-ms, son yanıtlar
+  --final-ms bekler (upstream model süresinin yerine geçer).
+
+stream=true desteklenir (tool_calls ve içerik delta'ları + [DONE]).
+GET /stats: yanıt sayıları (araç adına göre), model başına istek ve iptal sayısı.
+
+Arıza enjeksiyonu (testler): faults[model] = {...} o modele gelen isteklere uygulanır
+- "status": 503        → hep bu HTTP durumuyla döner
+- "delay_ms": 5000     → yanıttan önce ek bekleme (takılan uç)
+- "slow_next": 1, "slow_ms": 800 → sonraki N istek ek bekler (hedge senaryosu)
+
+Kullanım (backend dizininde):
+    python -m bench.mock_llm --port 8790 [--tool-call-ms 300 --final-ms 150]
+    LLM_API_BASE=http://127.0.0.1:8790/v1 ile API'yi başlatın.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import time
+from collections import Counter
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+_FOLD = str.maketrans("çğıöşüÇĞİÖŞÜ", "cgiosuCGIOSU")
+
+# (anahtar kelimeler, araç, argümanlar); ilk eşleşen kazanır
+SCRIPT = [
+    (("islem", "hareket"), "transactions_list_by_type", {"account_type": "vadesiz mevduat", "limit": 10}),
+    (("kart",), "list_customer_cards", {}),
+    (("hesap", "bakiye"), "get_accounts", {}),
+    (("usd", "dolar", "euro", "cevir"), "fx_convert", {"amount": 100, "from_currency": "USD", "to_currency": "TRY"}),
+    (("kredi", "taksit"), "loan_amortization_schedule", {"principal": 100000, "term": 12, "rate": 0.35, "currency": "TRY"}),
+    (("faiz",), "get_interest_rates", {}),
+    (("ucret", "masraf"), "get_all_fees", {}),
+    (("atm", "sube"), "branch_atm_search", {"city": "İstanbul", "limit": 3}),
+]
+
+app = FastAPI()
+settings = {"tool_call_ms": 300.0, "final_ms": 150.0}
+faults: dict = {}
+served = Counter()
+by_model = Counter()
+cancelled = Counter()
+
+
+def fold(text: str) -> str:
+    return (text or "").translate(_FOLD).lower()
+
+
+def _text(content) -> str:
+    if isinstance(content, list):
+        return " ".join(p.get("text", "") for p in content if isinstance(p, dict))
+    return content or ""
+
+
+def plan(body: dict):
+    """-> ("tool", ad, argümanlar) | ("text", metin)"""
+    messages = body.get("messages") or []
+    last = messages[-1] if messages else {}
+    if last.get("role") == "tool":
+        return "text", "İşleminiz tamamlandı, sonuçlar yukarıda."
+    user = next((_text(m.get("content")) for m in reversed(messages) if m.get("role") == "user"), "")
+    offered = {t.get("function", {}).get("name") for t in body.get("tools") or []}
+    folded = fold(user)
+    for keys, tool, args in SCRIPT:
+        if any(k in folded for k in keys) and tool in offered:
+            return "tool", tool, args
+    return "text", "Size nasıl yardımcı olabilirim?"
+
+
+def _call_id(body: dict) -> str:
+    return "call_" + hashlib.sha1(json.dumps(body.get("messages"), sort_keys=True).encode()).hexdigest()[:12]
+
+
+def _usage(body: dict, completion: str) -> dict:
+    prompt = (len(json.dumps(body.get("messages"))) + len(json.dumps(body.get("tools") or []))) // 4
+    out = max(1, len(completion) // 4)
+    return {"prompt_tokens": prompt, "completion_tokens": out, "total_tokens": prompt + out}
+
+
+@app.post("/v1/chat/completions")
+async def completions(request: Request):
+    body = await request.json()
+    created, model = int(time.time()), body.get("model", "mock")
+    by_model[model] += 1
+    fault = faults.get(model) or {}
+    if fault.get("status"):
+        return JSONResponse({"error": {"message": "injected failure"}}, status_code=fault["status"])
+
+    decision = plan(body)
+    delay_ms = fault.get("delay_ms", 0.0)
+    if fault.get("slow_next"):
+        fault["slow_next"] -= 1
+        delay_ms += fault.get("slow_ms", 0.0)
+    delay_ms += settings["tool_call_ms"] if decision[0] == "tool" else settings["final_ms"]
+    try:
+        await asyncio.sleep(delay_ms / 1000)
+    except asyncio.CancelledError:
+        cancelled[model] += 1  # istemci (hedge / süre sınırı) isteği bıraktı
+        raise
+    served[decision[1] if decision[0] == "tool" else "text"] += 1
+
+    if decision[0] == "tool":
+        _, name, args = decision
+        arguments = json.dumps(args, ensure_ascii=False)
+        tool_call = {"id": _call_id(body), "type": "function", "function": {"name": name, "arguments": arguments}}
+        message, finish, completion = {"role": "assistant", "content": None, "tool_calls": [tool_call]}, "tool_calls", arguments
+    else:
+        message, finish, completion = {"role": "assistant", "content": decision[1]}, "stop", decision[1]
+    usage = _usage(body, completion)
+
+    if not body.get("stream"):
+        return {"id": "chatcmpl-mock", "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": message, "finish_reason": finish}], "usage": usage}
+
+    def chunk(delta: dict, finish_reason=None, **extra) -> str:
+        data = {"id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}], **extra}
+        return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    def events():
+        yield chunk({"role": "assistant", "content": ""})
+        if decision[0] == "tool":
+            yield chunk({"tool_calls": [{"index": 0, **tool_call}]})
+        else:
+            words = decision[1].split(" ")
+            for i, word in enumerate(words):
+                yield chunk({"content": word + (" " if i < len(words) - 1 else "")})
+        yield chunk({}, finish)
+        if (body.get("stream_options") or {}).get("include_usage"):
+            data = {"id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": created, "model": model,
+                    "choices": [], "usage": usage}
+            yield f"data: {json.dumps(data)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.get("/stats")
+async def stats():
+    return {"served": dict(served), "total": sum(served.values()),
+            "by_model": dict(by_model), "cancelled": dict(cancelled)}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Deterministik sahte OpenAI sunucusu")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8790)
+    ap.add_argument("--tool-call-ms", type=float, default=300.0, help="araç çağrısı üreten yanıt gecikmesi")
+    ap.add_argument("--final-ms", type=float, default=150.0, help="son (metin) yanıt gecikmesi")
+    a = ap.parse_args()
+    settings.update(tool_call_ms=a.tool_call_ms, final_ms=a.final_ms)
+    uvicorn.run(app, host=a.host, port=a.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+# bench/payment_load.py
+"""
+Eşzamanlı transfer yük testi.
+
+dummy_bank.db'nin geçici bir kopyası üzerinde binlerce transferi thread'ler
+(ve istenirse birden fazla süreç) ile aynı anda PaymentService.create'ten
+geçirir; throughput, hata dağılımı ve payment_id çakışmalarını raporlar.
+
+Kullanım (backend dizininde):
+    python -m bench.payment_load --transfers 5000 --workers 32 --processes 4
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+# Limitler testte engel olmasın (modül import edilmeden önce)
+os.environ.setdefault("PAYMENT_DAILY_LIMIT", "1e12")
+os.environ.setdefault("PAYMENT_PER_TXN_LIMIT", "1e12")
+
+BACKEND = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if BACKEND not in sys.path:
+    sys.path.insert(0, BACKEND)
+
+from mcp_server.data.sql_payment_repo import SQLitePaymentRepository
+from mcp_server.tools.payment_tools import PaymentService
+
+
+def pick_account_pair(db_path: str):
+    """Aynı müşteriye ait, aktif ve aynı para birimli iki hesap bulur."""
+    con = sqlite3.connect(db_path)
+    try:
+        row = con.execute(
+            """
+            SELECT a.customer_id, a.account_id, b.account_id
+            FROM accounts a
+            JOIN accounts b ON a.customer_id = b.customer_id
+                           AND a.currency = b.currency
+                           AND a.account_id < b.account_id
+            WHERE a.status = 'Aktif' AND b.status = 'Aktif'
+            ORDER BY a.balance DESC
+            LIMIT 1
+            """
+        ).fetchone()
+        if not row:
+            raise SystemExit("[HATA] Uygun hesap çifti bulunamadı.")
+        return int(row[0]), int(row[1]), int(row[2])
+    finally:
+        con.close()
+
+
+def run_worker(db_path: str, customer_id: int, from_acc: int, to_acc: int,
+               transfers: int, workers: int, amount: float):
+    repo = SQLitePaymentRepository(db_path=db_path)
+    pay = PaymentService(repo)
+
+    def one(i: int):
+        # yönü değiştirerek bakiyeyi dengede tut
+        src, dst = (from_acc, to_acc) if i % 2 == 0 else (to_acc, from_acc)
+        res = pay.create(customer_id, src, dst, amount, None, f"load#{i}")
+        if res.get("ok"):
+            return ("ok", res["txn"]["payment_id"])
+        return (res.get("error") or "unknown", None)
+
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        return list(ex.map(one, range(transfers)))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Eşzamanlı transfer yük testi")
+    ap.add_argument("--transfers", type=int, default=2000, help="toplam transfer sayısı")
+    ap.add_argument("--workers", type=int, default=16, help="süreç başına thread sayısı")
+    ap.add_argument("--processes", type=int, default=1, help="paralel süreç sayısı")
+    ap.add_argument("--amount", type=float, default=1.0)
+    ap.add_argument("--db", default=os.path.join(BACKEND, "dummy_bank.db"), help="kaynak DB (kopyası kullanılır)")
+    args = ap.parse_args()
+
+    tmp_dir = tempfile.mkdtemp(prefix="payment_load_")
+    db_path = os.path.join(tmp_dir, "bank.db")
+    shutil.copyfile(args.db, db_path)
+    SQLitePaymentRepository(db_path=db_path)  # migration'ları bir kez uygula
+
+    customer_id, from_acc, to_acc = pick_account_pair(db_path)
+    per_proc = max(1, args.transfers // max(1, args.processes))
+    print(f"[INFO] db={db_path} customer={customer_id} {from_acc}<->{to_acc} "
+          f"transfers={per_proc * args.processes} processes={args.processes} workers={args.workers}")
+
+    t0 = time.perf_counter()
+    results = []
+    if args.processes <= 1:
+        results = run_worker(db_path, customer_id, from_acc, to_acc, per_proc, args.workers, args.amount)
+    else:
+        with ProcessPoolExecutor(max_workers=args.processes) as ex:
+            futs = [
+                ex.submit(run_worker, db_path, customer_id, from_acc, to_acc, per_proc, args.workers, args.amount)
+                for _ in range(args.processes)
+            ]
+            for f in futs:
+                results.extend(f.result())
+    elapsed = time.perf_counter() - t0
+
+    outcomes = Counter(r[0] for r in results)
+    ids = [r[1] for r in results if r[1]]
+    dup = len(ids) - len(set(ids))
+    con = sqlite3.connect(db_path)
+    try:
+        stored = con.execute("SELECT COUNT(*) FROM payments").fetchone()[0]
+    finally:
+        con.close()
+
+    print(f"[RESULT] elapsed={elapsed:.2f}s throughput={outcomes.get('ok', 0) / elapsed:.1f} tx/s")
+    print(f"[RESULT] outcomes={dict(outcomes)}")
+    print(f"[RESULT] payments_rows={stored} duplicate_ids={dup} sorted_ids={ids == sorted(ids) if args.processes <= 1 and args.workers == 1 else 'n/a'}")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    if dup:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
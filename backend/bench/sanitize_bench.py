@@ -0,0 +1,136 @@
+# bench/sanitize_bench.py
+"""
+Tool çıktısı temizleyici benchmark'ı: önceki uygulama (string başına
+strip_dangerous_html + üç re.sub maskeleme, aşağıda referans olarak kopyalı)
+ile derlenmiş tek geçişli ToolOutputSanitizer karşılaştırılır.
+
+Yük: dummy_bank.db'deki işlemlerden (txns) üretilen büyük işlem listeleri,
+transactions_list çıktısı biçiminde (işlem listesi + aynı satırlarla
+ui_component). Her boyutta iki temizleyicinin çıktısının aynı olduğu da
+doğrulanır. Ayrıca kapanmamış/iç içe etiketlerle dolu düşmanca bir string
+ölçülür (eski uygulamada karesel).
+
+Kullanım (backend dizininde):
+    python -m bench.sanitize_bench --rows 500,2000,6000 --repeat 5
+"""
+import argparse
+import os
+import re
+import sqlite3
+import sys
+import time
+
+BACKEND = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if BACKEND not in sys.path:
+    sys.path.insert(0, BACKEND)
+
+from security import ToolOutputSanitizer, _SENSITIVE_KEYS
+
+
+# ---------- referans: önceki uygulama ----------
+_LEGACY_TAGS = [("<script", "</script>"), ("<iframe", "</iframe>"), ("<object", "</object>"),
+                ("<embed", "</embed>"), ("<style", "</style>")]
+_LEGACY_ATTR = re.compile(r"\son\w+\s*=\s*['\"].*?['\"]", re.IGNORECASE | re.DOTALL)
+
+
+def legacy_strip(s):
+    if not isinstance(s, str) or not s:
+        return s
+    txt = s
+    low = txt.lower()
+    for open_tag, close_tag in _LEGACY_TAGS:
+        while True:
+            lo = low.find(open_tag)
+            if lo == -1:
+                break
+            hi = low.find(close_tag, lo)
+            if hi == -1:
+                txt = txt[:lo]
+                break
+            txt = txt[:lo] + txt[hi + len(close_tag):]
+            low = txt.lower()
+    return _LEGACY_ATTR.sub("", txt)
+
+
+def legacy_mask(s):  # AdvancedAgent._mask
+    s = re.sub(r'\b\d{11,}\b', '***', s)
+    return re.sub(r'[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}', '***@***', s)
+
+
+def legacy_sanitize(obj, max_str_len=4000):
+    if isinstance(obj, dict):
+        return {k: "*" if str(k).lower() in _SENSITIVE_KEYS else legacy_sanitize(v, max_str_len)
+                for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [legacy_sanitize(x, max_str_len) for x in obj]
+    if isinstance(obj, str):
+        s = legacy_mask(legacy_strip(obj) or "")
+        return s[:max_str_len] + "..." if len(s) > max_str_len else s
+    return obj
+
+
+# ---------- yük ----------
+def load_txns(db_path: str):
+    con = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    con.row_factory = sqlite3.Row
+    try:
+        rows = con.execute(
+            "SELECT t.txn_id, t.account_id, t.amount, t.txn_type, t.txn_date, t.description, "
+            "a.account_number, a.currency FROM txns t JOIN accounts a ON a.account_id = t.account_id "
+            "ORDER BY t.txn_date DESC"
+        ).fetchall()
+        return [dict(r) for r in rows]
+    finally:
+        con.close()
+
+
+def build_payload(txns, n: int):
+    rows = [dict(txns[i % len(txns)], txn_id=i + 1) for i in range(n)]
+    for r in rows[::50]:  # arada bir PII/HTML taşıyan açıklama
+        r["description"] = f"{r['description']} ref 12345678901 destek@fortuna.example <b onclick='x'>"
+    return {
+        "ok": True,
+        "data": {
+            "account_id": rows[0]["account_id"],
+            "account_number": rows[0]["account_number"],
+            "transactions": rows,
+            "ui_component": {"type": "transactions_list", "items": [
+                {"date": r["txn_date"], "amount": f"{r['amount']:,.2f}", "description": r["description"],
+                 "type": r["txn_type"]} for r in rows
+            ]},
+        },
+    }
+
+
+def timed(fn, payload, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(payload)
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--db", default=os.path.join(BACKEND, "dummy_bank.db"))
+    ap.add_argument("--rows", default="500,2000,6000")
+    ap.add_argument("--repeat", type=int, default=5)
+    a = ap.parse_args()
+
+    compiled = ToolOutputSanitizer(iban_mask=None, digits_mask="***", email_mask="***@***")  # AdvancedAgent ile aynı
+    txns = load_txns(a.db)
+    print(f"{'satır':>7} {'önceki':>10} {'derlenmiş':>10} {'hız':>6}  aynı")
+    for n in (int(x) for x in a.rows.split(",")):
+        payload = build_payload(txns, n)
+        before, after = timed(legacy_sanitize, payload, a.repeat), timed(compiled, payload, a.repeat)
+        same = legacy_sanitize(payload) == compiled(payload)
+        print(f"{n:>7} {before:>8.1f}ms {after:>8.1f}ms {before / after:>5.1f}x  {same}")
+
+    hostile = ("<script>" * 2000 + "x" + "</script>" * 10 + "<style>a</style>" * 2000) * 2
+    before, after = timed(legacy_strip, hostile, 1), timed(compiled.clean_str, hostile, 1)
+    print(f"düşmanca string ({len(hostile)} karakter): önceki {before:.1f}ms, derlenmiş {after:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -107,6 +107,21 @@ def update_session_updated_at_sync(chat_id: str, user_id: str, timestamp: Option
         )
         conn.commit()
 
+def get_messages_after_sync(user_id: str, chat_id: str, after_message_id: int = 0, limit: Optional[int] = None) -> List[dict]:
+    """
+    message_id'si after_message_id'den büyük mesajlar (artan sırada). limit verilirse
+    yalnızca en yeni limit kadarı okunur. Ajan hafızası artımlı okuma için kullanır.
+    """
+    sql = ("SELECT message_id, text, sender, ui_component FROM messages "
+           "WHERE user_id=? AND chat_id=? AND message_id>? ORDER BY message_id DESC")
+    params: tuple = (user_id, chat_id, after_message_id)
+    if limit:
+        sql += " LIMIT ?"
+        params += (limit,)
+    with get_conn() as conn:
+        rows = conn.execute(sql, params).fetchall()
+    return [dict(r) for r in reversed(rows)]
+
 # =========================
 # API Endpoints (router)
 # =========================
@@ -5,12 +5,18 @@ import os
 
 USE_MCP = True
 MCP_SSE_URL = "http://127.0.0.1:8081/sse"
+# "sse": ayrı MCP süreci (run_all.py başlatır) | "inprocess": MCP sunucusu API sürecinde, bellek içi
+MCP_TRANSPORT = os.getenv("MCP_TRANSPORT", "sse")
 
 # LLM (OpenAI-compatible / Ollama / HF Router) ayarları
-LLM_API_BASE = "https://router.huggingface.co/v1"
+LLM_API_BASE = os.getenv("LLM_API_BASE", "https://router.huggingface.co/v1")
 LLM_CHAT_PATH = "/chat/completions"
 LLM_MODEL = "Qwen/Qwen3-30B-A3B:fireworks-ai"
-LLM_API_KEY = ""  # Hugging Face API anahtarını sitesinden alabilirsiniz
+LLM_API_KEY = os.getenv("LLM_API_KEY", "")  # Hugging Face API anahtarını sitesinden alabilirsiniz
+# Yedek uç/model (boş: yedek yok). Birincil uç tekrar bütçesi veya süre içinde yanıt vermezse kullanılır.
+LLM_FALLBACK_API_BASE = os.getenv("LLM_FALLBACK_API_BASE", "")
+LLM_FALLBACK_MODEL = os.getenv("LLM_FALLBACK_MODEL", "")
+LLM_FALLBACK_API_KEY = os.getenv("LLM_FALLBACK_API_KEY", "")
 
 # JWT Secret Key (Güvenli bir anahtar kullanın)
 SECRET_KEY = os.getenv("SECRET_KEY", "your_secret_key")
@@ -0,0 +1,71 @@
+# data/account_types.py
+"""
+Hesap türü eşleştirmesi (tek kaynak).
+
+Kullanıcının yazdığı tür ("maaş hesabım", "vadesizden", "Yatirim") Türkçe
+karakterleri katlanmış küçük harfli bir anahtara çevrilir ("maas", "vadesiz
+mevduat", ...). Aynı katlama accounts.account_type_norm kolonunda SQL ile
+tutulur; böylece sorgu (customer_id, account_type_norm) indeksinden gider.
+"""
+import re
+
+# veritabanındaki tür -> kullanıcı eş anlamlıları
+ACCOUNT_TYPE_ALIASES = {
+    "Vadeli Mevduat": ["vadeli mevduat", "vadeli", "vadeli hesap"],
+    "Vadesiz Mevduat": ["vadesiz mevduat", "vadesiz", "vadesiz hesap"],
+    "Maaş": ["maaş", "maaş hesabı"],
+    "Yatırım": ["yatırım", "yatırım hesabı"],
+}
+
+_TR_FOLD = {
+    "İ": "i", "I": "i", "ı": "i",
+    "Ş": "s", "ş": "s",
+    "Ğ": "g", "ğ": "g",
+    "Ü": "u", "ü": "u",
+    "Ö": "o", "ö": "o",
+    "Ç": "c", "ç": "c",
+}
+_TR_TABLE = str.maketrans(_TR_FOLD)
+_SPACES_RE = re.compile(r"\s+")
+# "maaş hesabımdan", "vadeliye", "yatırım hesabına" gibi ekleri at
+_SUFFIX_RE = re.compile(r"(\s+(hesabi|hesabim|hesap)\w*|(den|dan|ten|tan|ye|ya|e|a))$")
+
+
+def fold_tr(text: str) -> str:
+    """Türkçe karakterleri ASCII'ye katlar, küçük harfe çevirir, boşlukları sadeleştirir (None -> "")."""
+    return _SPACES_RE.sub(" ", str(text or "").translate(_TR_TABLE).lower()).strip()
+
+
+def fold_tr_sql(expr: str) -> str:
+    """fold_tr ile aynı sonucu veren SQLite ifadesi (kolon/trigger tanımları için)."""
+    for src, dst in _TR_FOLD.items():
+        expr = f"replace({expr}, '{src}', '{dst}')"
+    return f"trim(lower({expr}))"
+
+
+# katlanmış eş anlamlı -> katlanmış DB türü (modül yüklenirken bir kez kurulur)
+_ALIAS_TO_NORM = {
+    fold_tr(alias): fold_tr(db_type)
+    for db_type, aliases in ACCOUNT_TYPE_ALIASES.items()
+    for alias in [db_type, *aliases]
+}
+_NORM_TO_LABEL = {fold_tr(db_type): db_type for db_type in ACCOUNT_TYPE_ALIASES}
+
+
+def normalize_account_type(text: str | None) -> str | None:
+    """
+    Kullanıcı girdisini account_type_norm anahtarına çevirir; tanınmazsa None.
+    Örn. "Maaş hesabımdan" -> "maas", "vadesize" -> "vadesiz mevduat".
+    """
+    if not text:
+        return None
+    key = fold_tr(text)
+    if key in _ALIAS_TO_NORM:
+        return _ALIAS_TO_NORM[key]
+    stripped = _SUFFIX_RE.sub("", key)
+    return _ALIAS_TO_NORM.get(stripped)
+
+
+def account_type_label(norm: str) -> str:
+    """Norm anahtarının veritabanındaki görünen adı (örn. "maas" -> "Maaş")."""
+    return _NORM_TO_LABEL.get(norm, norm)
@@ -0,0 +1,73 @@
+# data/ids.py
+"""
+Çakışmasız, zamana göre sıralanabilir kimlik üretimi (ULID).
+
+Yapı: 48 bit milisaniye zaman damgası + 80 bit rastgelelik, Crockford base32
+ile 26 karakter. Aynı milisaniye içinde rastgele kısım bir artırılır, böylece
+süreç içinde üretilen kimlikler kesin monoton artar. Rastgele başlangıç
+değeri sayesinde aynı DB'ye yazan birden fazla MCP süreci koordinasyon
+olmadan çakışmaz.
+"""
+import os
+import threading
+import time
+
+_CROCKFORD = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+_RAND_BITS = 80
+_RAND_MAX = (1 << _RAND_BITS) - 1
+
+
+def _encode(value: int, length: int) -> str:
+    out = []
+    for _ in range(length):
+        out.append(_CROCKFORD[value & 31])
+        value >>= 5
+    return "".join(reversed(out))
+
+
+class MonotonicIdGenerator:
+    """
+    Thread-safe ULID üreticisi.
+    Saat geri giderse son görülen zaman damgası kullanılmaya devam edilir.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last_ms = -1
+        self._last_rand = 0
+
+    def reset(self):
+        with self._lock:
+            self._last_ms = -1
+            self._last_rand = 0
+
+    def new_id(self) -> str:
+        with self._lock:
+            now_ms = time.time_ns() // 1_000_000
+            if now_ms > self._last_ms:
+                self._last_ms = now_ms
+                self._last_rand = int.from_bytes(os.urandom(10), "big")
+            else:
+                # aynı (veya geri giden) milisaniye: sıralamayı koru
+                self._last_rand += 1
+                if self._last_rand > _RAND_MAX:
+                    self._last_ms += 1
+                    self._last_rand = int.from_bytes(os.urandom(10), "big")
+            value = (self._last_ms << _RAND_BITS) | self._last_rand
+        return _encode(value, 26)
+
+
+_generator = MonotonicIdGenerator()
+
+# fork edilen çocuk süreç ebeveynin rastgele durumunu devralmasın
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_generator.reset)
+
+
+def new_ulid() -> str:
+    return _generator.new_id()
+
+
+def new_payment_id() -> str:
+    """Ödeme kimliği: 'TX' + ULID (örn. TX01J8Z3K6V7W2Q9R5T4M1N0P8XY)."""
+    return "TX" + _generator.new_id()
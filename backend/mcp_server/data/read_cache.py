@@ -0,0 +1,198 @@
+# data/read_cache.py
+"""
+Müşteri bazlı kısa ömürlü (TTL) okuma önbelleği.
+
+Hesap/kart okumaları (bakiye, hesap listesi, kart detayları) aynı sohbet
+turunda defalarca tekrarlanır. Kayıtlar müşteri başına bir kovada tutulur;
+para transferi veya kart limit talebi yazıldığında ilgili müşterilerin kovası
+aynı anda (commit'ten hemen sonra) silinir. TTL yalnızca bu süreç dışından
+gelen yazmalar için üst sınırdır.
+"""
+import copy
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from .sqlite_repo import SQLiteRepository
+from .reference_data import ReferenceData
+
+READ_CACHE_TTL_SECONDS = float(os.getenv("ACCOUNT_CACHE_TTL_SECONDS", "5"))
+# her N okumada bir isabet oranını logla (0: kapalı)
+READ_CACHE_STATS_EVERY = int(os.getenv("ACCOUNT_CACHE_STATS_EVERY", "500"))
+
+log = logging.getLogger("mcp_server")
+
+
+class CustomerReadCache:
+    """
+    customer_id -> {anahtar: (son_geçerlilik, değer)}.
+    Hesap id'si ile yapılan okumalar için account_id -> customer_id eşlemesi tutulur
+    (hesabın sahibi değişmez), böylece get_account da müşteri kovasına düşer.
+    """
+
+    def __init__(self, ttl_seconds: float = READ_CACHE_TTL_SECONDS):
+        self.ttl = ttl_seconds
+        self._lock = threading.Lock()
+        self._buckets: Dict[int, Dict[Hashable, tuple]] = {}
+        self._owners: Dict[Hashable, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._generation = 0  # her invalidate'te artar; yükleme sırasında yazma olduysa sonuç saklanmaz
+
+    def get_or_load(self, customer_id: Optional[int], key: Hashable, loader: Callable[[], Any]) -> Any:
+        """
+        Kovada geçerli kayıt varsa kopyasını döner, yoksa loader() ile okuyup saklar.
+        customer_id None ise (sahip henüz bilinmiyor) owner eşlemesine bakılır.
+        """
+        if self.ttl <= 0:
+            return loader()
+
+        now = time.monotonic()
+        with self._lock:
+            owner = customer_id if customer_id is not None else self._owners.get(key)
+            entry = self._buckets.get(owner, {}).get(key) if owner is not None else None
+            if entry and entry[0] > now:
+                self.hits += 1
+                value = entry[1]
+                self._maybe_log_stats()
+                return copy.deepcopy(value)
+            self.misses += 1
+            self._maybe_log_stats()
+            generation = self._generation
+
+        value = loader()
+        if customer_id is None:
+            # get_account: sahibi sonuçtan öğren
+            customer_id = value.get("customer_id") if isinstance(value, dict) else None
+            if customer_id is None:
+                return value
+        with self._lock:
+            if generation != self._generation:
+                return value
+            self._owners[key] = customer_id
+            self._buckets.setdefault(customer_id, {})[key] = (now + self.ttl, copy.deepcopy(value))
+        return value
+
+    def invalidate(self, *customer_ids: Optional[int]) -> None:
+        """Verilen müşterilerin tüm kayıtlarını siler (yazma commit'inden hemen sonra çağrılır)."""
+        with self._lock:
+            self._generation += 1
+            for cid in customer_ids:
+                if cid is not None and self._buckets.pop(int(cid), None) is not None:
+                    self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+            self._owners.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+                "invalidations": self.invalidations,
+                "customers": len(self._buckets),
+                "entries": sum(len(b) for b in self._buckets.values()),
+                "ttl_seconds": self.ttl,
+            }
+
+    def _maybe_log_stats(self) -> None:
+        # _lock altında çağrılır
+        total = self.hits + self.misses
+        if READ_CACHE_STATS_EVERY > 0 and total % READ_CACHE_STATS_EVERY == 0:
+            log.info("read_cache_stats", extra={
+                "event": "read_cache_stats",
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4),
+                "invalidations": self.invalidations,
+            })
+
+
+_caches: Dict[str, CustomerReadCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_read_cache(db_path: str) -> CustomerReadCache:
+    """DB dosyası başına tek önbellek; okuyan ve yazan repo'lar aynı örneği paylaşır."""
+    key = os.path.abspath(db_path)
+    with _caches_lock:
+        if key not in _caches:
+            _caches[key] = CustomerReadCache()
+        return _caches[key]
+
+
+class CachedSQLiteRepository(SQLiteRepository):
+    """
+    SQLiteRepository'nin hesap/kart okumalarını müşteri bazlı TTL önbelleğinden
+    geçiren sürümü. Transfer ön kontrolü gibi para hareketi kararları bu sınıfı
+    değil, her zaman taze okuyan SQLitePaymentRepository'yi kullanır.
+
+    Ücret / faiz / portföy okumaları ReferenceData anlık görüntüsünden gelir
+    (pricing_json önceden parse edilmiş, satırlarda "pricing" alanı hazır).
+    """
+
+    def __init__(self, db_path: str = SQLiteRepository.DB_PATH):
+        super().__init__(db_path)
+        self.migrate_accounts()  # get_accounts_by_type account_type_norm kolonuna dayanır
+        self.cache = get_read_cache(db_path)
+        self.reference = ReferenceData(db_path)
+
+    def get_account(self, account_id: int):
+        if account_id is None:
+            return None
+        return self.cache.get_or_load(None, ("account", int(account_id)),
+                                      lambda: super(CachedSQLiteRepository, self).get_account(account_id))
+
+    def get_accounts_by_customer(self, customer_id: int, account_type: str = None):
+        if customer_id is None:
+            return super().get_accounts_by_customer(customer_id, account_type)
+        return self.cache.get_or_load(int(customer_id), ("accounts", account_type),
+                                      lambda: super(CachedSQLiteRepository, self).get_accounts_by_customer(customer_id, account_type))
+
+    def get_accounts_by_type(self, customer_id: int, account_type: str):
+        if customer_id is None:
+            return super().get_accounts_by_type(customer_id, account_type)
+        return self.cache.get_or_load(int(customer_id), ("accounts_by_type", account_type),
+                                      lambda: super(CachedSQLiteRepository, self).get_accounts_by_type(customer_id, account_type))
+
+    def get_card_details(self, card_id: int, customer_id: int):
+        if card_id is None or customer_id is None:
+            return super().get_card_details(card_id, customer_id)
+        return self.cache.get_or_load(int(customer_id), ("card", int(card_id)),
+                                      lambda: super(CachedSQLiteRepository, self).get_card_details(card_id, customer_id))
+
+    def get_all_cards_for_customer(self, customer_id: int):
+        if customer_id is None:
+            return super().get_all_cards_for_customer(customer_id)
+        return self.cache.get_or_load(int(customer_id), ("cards",),
+                                      lambda: super(CachedSQLiteRepository, self).get_all_cards_for_customer(customer_id))
+
+    def cache_stats(self) -> Dict[str, Any]:
+        return {**self.cache.stats(), "reference_reloads": self.reference.reloads}
+
+    # --- referans verileri ---
+
+    def get_fee(self, service_code: str):
+        return self.reference.get_fee(service_code)
+
+    def list_fees(self):
+        return self.reference.list_fees()
+
+    def resolve_fee_code(self, query: str) -> Dict[str, Any]:
+        return self.reference.resolve_fee_code(query)
+
+    def get_interest_rates(self):
+        return self.reference.get_interest_rates()
+
+    def get_interest_rate(self, product: str) -> float:
+        return self.reference.get_interest_rate(product)
+
+    def get_portfolios(self, risk_level: Optional[str] = None) -> list[dict]:
+        return self.reference.get_portfolios(risk_level)
@@ -0,0 +1,303 @@
+# data/reference_data.py
+"""
+Referans verileri (ücretler, faiz oranları, portföy karışımları) için
+süreç içi anlık görüntü.
+
+Bu tablolar nadiren değişir ama her ücret/faiz/portföy sorusunda yeniden
+okunuyor ve pricing_json her seferinde parse ediliyordu. MCP açılışında bir
+kez yüklenir; pricing_json yükleme sırasında bir kez parse edilir. DB
+dosyasının (ve varsa -wal dosyasının) mtime/boyutu en fazla
+REFERENCE_DATA_CHECK_SECONDS aralıkla kontrol edilir, değiştiyse yeniden yüklenir.
+"""
+import copy
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from types import MappingProxyType
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+from .account_types import fold_tr
+
+REFERENCE_DATA_CHECK_SECONDS = float(os.getenv("REFERENCE_DATA_CHECK_SECONDS", "5"))
+
+
+class ReferenceSnapshot:
+    """
+    Tek bir yüklemenin değişmez görünümü. Satırlar MappingProxyType, listeler tuple;
+    dışarıya verilen kopyalardır (çağıran taraf değiştirse de anlık görüntü bozulmaz).
+    """
+
+    def __init__(self, version: Tuple, fees: Tuple[Mapping, ...], interest_rates: Tuple[Mapping, ...],
+                 rates_by_product: Dict[str, Mapping], portfolios: Tuple[Mapping, ...], rate_column: str):
+        self.version = version
+        self.loaded_at = time.time()
+        self.fees = fees
+        self.fees_by_code = MappingProxyType({f["service_code"].lower(): f for f in fees})
+        self.fee_matcher = FeeMatcher(fees)
+        self.interest_rates = interest_rates
+        self.rate_column = rate_column
+        self.rates_by_product = MappingProxyType(rates_by_product)  # ürün -> en güncel satır
+        self.portfolios = portfolios
+
+
+def _file_version(db_path: str) -> Tuple:
+    out = []
+    for path in (db_path, db_path + "-wal"):
+        try:
+            st = os.stat(path)
+            out.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            out.append(None)
+    return tuple(out)
+
+
+# içerik özetine giren tablolar (ReferenceSnapshot'ın okuduklarıyla aynı)
+_REFERENCE_TABLES = ("fees", "interest_rates", "portfolio_mixes")
+
+
+def reference_fingerprint(db_path: str) -> str:
+    """
+    Ücret / faiz / portföy tablolarının içerik özeti. _file_version'dan farklı olarak
+    yalnızca bu tablolar değişince değişir (transfer yazmaları etkilemez); API
+    sürecindeki yanıt önbelleği anahtarına katılır.
+    """
+    digest = hashlib.sha1()
+    con = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        for table in _REFERENCE_TABLES:
+            digest.update(table.encode())
+            for row in con.execute(f"SELECT * FROM {table} ORDER BY rowid"):
+                digest.update(repr(tuple(row)).encode("utf-8"))
+    finally:
+        con.close()
+    return digest.hexdigest()[:16]
+
+
+def _parse_pricing(raw: Any) -> Any:
+    try:
+        return json.loads(raw) if isinstance(raw, str) else raw
+    except Exception:
+        return None  # bozuk JSON: çağıran ham pricing_json'a düşer
+
+
+def _load_snapshot(db_path: str, version: Tuple) -> ReferenceSnapshot:
+    con = sqlite3.connect(db_path)
+    con.row_factory = sqlite3.Row
+    try:
+        fees = tuple(
+            MappingProxyType({**dict(r), "pricing": _parse_pricing(r["pricing_json"])})
+            for r in con.execute(
+                "SELECT service_code, description, pricing_json, updated_at FROM fees ORDER BY service_code"
+            )
+        )
+
+        cols = {r[1] for r in con.execute("PRAGMA table_info('interest_rates')")}
+        rate_col = "annual_rate" if "annual_rate" in cols else "rate_apy"
+        date_col = "effective_date" if "effective_date" in cols else "updated_at"
+        # ürün başına en güncel satır ilk gelsin (get_interest_rate ile aynı sıralama)
+        rates = tuple(
+            MappingProxyType(dict(r))
+            for r in con.execute(f"""
+                SELECT * FROM interest_rates
+                ORDER BY product,
+                  COALESCE(datetime({date_col}), datetime('1970-01-01')) DESC,
+                  rowid DESC
+            """)
+        )
+        latest: Dict[str, Mapping] = {}
+        for r in rates:
+            if r.get("product") is not None:
+                latest.setdefault(str(r["product"]).lower(), r)
+
+        portfolios = tuple(
+            MappingProxyType(dict(r))
+            for r in con.execute("SELECT portfoy_adi, risk_seviyesi, varlik_dagilimi FROM portfolio_mixes")
+        )
+    finally:
+        con.close()
+
+    return ReferenceSnapshot(version, fees, rates, latest, portfolios, rate_col)
+
+
+class ReferenceData:
+    """
+    Referans verisi deposu. snapshot() her zaman güncel (en fazla
+    REFERENCE_DATA_CHECK_SECONDS eski) değişmez görünümü döner.
+    """
+
+    def __init__(self, db_path: str, check_seconds: float = REFERENCE_DATA_CHECK_SECONDS):
+        self.db_path = db_path
+        self.check_seconds = check_seconds
+        self._lock = threading.Lock()
+        self._snapshot: Optional[ReferenceSnapshot] = None
+        self._checked_at = 0.0
+        self.reloads = 0
+
+    def load(self) -> ReferenceSnapshot:
+        """Zorla (yeniden) yükler; MCP açılışında ön yükleme için çağrılır."""
+        with self._lock:
+            return self._reload()
+
+    def snapshot(self) -> ReferenceSnapshot:
+        snap = self._snapshot
+        now = time.monotonic()
+        if snap is not None and now - self._checked_at < self.check_seconds:
+            return snap
+        with self._lock:
+            self._checked_at = time.monotonic()
+            version = _file_version(self.db_path)
+            if self._snapshot is None or self._snapshot.version != version:
+                return self._reload(version)
+            return self._snapshot
+
+    def _reload(self, version: Optional[Tuple] = None) -> ReferenceSnapshot:
+        # _lock altında çağrılır
+        self._snapshot = _load_snapshot(self.db_path, version or _file_version(self.db_path))
+        self._checked_at = time.monotonic()
+        self.reloads += 1
+        return self._snapshot
+
+    # --- SQLiteRepository ile aynı dönüş biçimleri (kopya) ---
+
+    def get_fee(self, service_code: str) -> Optional[Dict[str, Any]]:
+        row = self.snapshot().fees_by_code.get((service_code or "").lower())
+        return _thaw(row) if row else None
+
+    def list_fees(self) -> List[Dict[str, Any]]:
+        return [_thaw(r) for r in self.snapshot().fees]
+
+    def resolve_fee_code(self, query: str) -> Dict[str, Any]:
+        return self.snapshot().fee_matcher.resolve(query)
+
+    def get_interest_rates(self) -> List[Dict[str, Any]]:
+        return [
+            {"product": r.get("product"), "rate_apy": r.get("rate_apy"), "updated_at": r.get("updated_at")}
+            for r in self.snapshot().interest_rates
+        ]
+
+    def get_interest_rate(self, product: str) -> float:
+        snap = self.snapshot()
+        row = snap.rates_by_product.get((product or "").lower())
+        if not row or row.get(snap.rate_column) is None:
+            raise ValueError(f"Interest rate not found for product={product}")
+        rate_value = float(row[snap.rate_column])
+        # rate_apy sütunundan geliyorsa 100'e böl (zaten yüzde olarak geliyor)
+        if snap.rate_column == "rate_apy":
+            rate_value = rate_value / 100.0
+        return rate_value
+
+    def get_portfolios(self, risk_level: Optional[str] = None) -> List[Dict[str, Any]]:
+        return [
+            dict(p) for p in self.snapshot().portfolios
+            if not risk_level or p["risk_seviyesi"] == risk_level
+        ]
+
+
+def _thaw(row: Mapping) -> Dict[str, Any]:
+    out = dict(row)
+    if isinstance(out.get("pricing"), (dict, list)):
+        out["pricing"] = copy.deepcopy(out["pricing"])
+    return out
+
+
+# --- ücret kodu bulanık eşleştirme ---
+
+# sorguda anlam taşımayan kelimeler ("eft ücreti ne kadar")
+_FEE_STOPWORDS = frozenset({
+    "ucret", "ucreti", "ucretleri", "ucretler", "masraf", "masrafi", "komisyon", "komisyonu",
+    "islem", "islemi", "fiyat", "fiyati", "ne", "kadar", "nedir", "icin", "ile", "bedel", "bedeli",
+})
+# açıklamalarda geçmeyen yaygın ifadeler -> açıklamadaki karşılığı
+_FEE_SYNONYMS = {"yurtdisi": "uluslararasi", "yurt": "uluslararasi", "disi": "uluslararasi", "kur": "doviz", "yabanci": "doviz"}
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_APOSTROPHE_SUFFIX_RE = re.compile(r"['’][a-z]+")  # "atm'den" -> "atm"
+FEE_MATCH_MIN_SCORE = float(os.getenv("FEE_MATCH_MIN_SCORE", "0.5"))
+FEE_MATCH_MIN_MARGIN = 0.1
+_FUZZY_TOKEN_MIN = 0.5  # yazım hatası toleransı (trigram Dice benzerliği)
+_STEM_PREFIX = 5  # ortak gövde: "degistirme" ~ "degisikligi" ("degis")
+_STEM_SCORE = 0.9
+
+
+def _fee_tokens(text: str) -> Tuple[str, ...]:
+    return tuple(
+        _FEE_SYNONYMS.get(t, t)
+        for t in _TOKEN_RE.findall(_APOSTROPHE_SUFFIX_RE.sub("", fold_tr(text)).replace("_", " "))
+        if t not in _FEE_STOPWORDS
+    )
+
+
+def _trigrams(token: str) -> frozenset:
+    s = f"  {token} "
+    return frozenset(s[i:i + 3] for i in range(len(s) - 2))
+
+
+class FeeMatcher:
+    """
+    service_code çözümleyici. Kod ve açıklamalar Türkçe karakterleri katlanarak
+    kelimelere ve kelime trigramlarına bir kez ayrılır. Sorgu önce birebir
+    (kod / açıklama), sonra kelime bazında eşleştirilir: birebir veya önek
+    eşleşmesi 1 puan, yazım hatasında trigram benzerliği kadar puan.
+
+    Bir aday ancak sorgunun her anlamlı kelimesi onda karşılık buluyorsa seçilir:
+    "kart aidatı" sorgusunda "aidat" hiçbir kayıtta yok, tek ortak "kart" kelimesi
+    card_replacement'ı seçtirmez (öneri olarak döner).
+    """
+
+    def __init__(self, rows: Iterable[Mapping]):
+        self._entries = []
+        self._by_text = {}
+        for r in rows:
+            code = str(r["service_code"])
+            desc = r.get("description") or ""
+            tokens = tuple(dict.fromkeys(_fee_tokens(code) + _fee_tokens(desc)))
+            self._entries.append((code, frozenset(tokens), tuple((t, _trigrams(t)) for t in tokens if len(t) >= 3)))
+            self._by_text[code.lower()] = code
+            self._by_text[" ".join(_fee_tokens(code))] = code
+            self._by_text[" ".join(_fee_tokens(desc))] = code
+
+    @staticmethod
+    def _token_score(q: str, q_grams: frozenset, tokens: frozenset, token_grams: tuple) -> float:
+        if q in tokens:
+            return 1.0
+        best = 0.0
+        for t, grams in token_grams:
+            if len(q) >= 3 and (t.startswith(q) or q.startswith(t)):
+                return 1.0
+            if q[:_STEM_PREFIX] == t[:_STEM_PREFIX] and len(q) >= _STEM_PREFIX:
+                best = max(best, _STEM_SCORE)
+                continue
+            best = max(best, 2 * len(q_grams & grams) / (len(q_grams) + len(grams)))
+        return best if best >= _FUZZY_TOKEN_MIN else 0.0
+
+    def resolve(self, query: str, limit: int = 3) -> Dict[str, Any]:
+        """
+        Dönüş: {"service_code": <kod|None>, "score": float, "match": "exact|token|fuzzy",
+                "suggestions": [kod, ...]}
+        service_code yalnızca en iyi aday yeterince iyi ve ikinciden açıkça ayrışıyorsa dolu.
+        """
+        q_tokens = _fee_tokens(query or "")
+        direct = self._by_text.get((query or "").strip().lower()) or self._by_text.get(" ".join(q_tokens))
+        if direct:
+            return {"service_code": direct, "score": 1.0, "match": "exact", "suggestions": [direct]}
+        if not q_tokens:
+            return {"service_code": None, "score": 0.0, "match": None, "suggestions": []}
+
+        q_grams = [_trigrams(q) for q in q_tokens]
+        scored = []
+        for code, tokens, token_grams in self._entries:
+            per_token = [self._token_score(q, g, tokens, token_grams) for q, g in zip(q_tokens, q_grams)]
+            score = sum(per_token) / len(per_token)
+            covered = 0.0 not in per_token  # sorgu kelimelerinin hepsi bu kayıtta var
+            scored.append((score, covered, "token" if all(x in (0.0, 1.0) for x in per_token) else "fuzzy", code))
+        scored.sort(key=lambda x: x[0], reverse=True)
+
+        best_score, covered, how, best_code = scored[0]
+        second = scored[1][0] if len(scored) > 1 else 0.0
+        suggestions = [c for sc, _, _, c in scored[:limit] if sc > 0]
+        if covered and best_score >= FEE_MATCH_MIN_SCORE and best_score - second >= FEE_MATCH_MIN_MARGIN:
+            return {"service_code": best_code, "score": round(best_score, 3), "match": how, "suggestions": suggestions}
+        return {"service_code": None, "score": round(best_score, 3), "match": None, "suggestions": suggestions}
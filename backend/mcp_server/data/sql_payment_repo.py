@@ -154,24 +154,20 @@
 # --- Payment (transfer) yardımcıları ---
 import sqlite3
 import datetime
+import hashlib
+import json
 import os
+import random
+import time
 from .sqlite_repo import SQLiteRepository
+from .ids import new_payment_id
+from .read_cache import get_read_cache
 
-class SQLitePaymentRepository(SQLiteRepository):
-    """
-    Kendi hesapları arasında transfer (havale) işlemleri için repo.
-    payments tablosu yoksa otomatik oluşturur.
-    """
-    BASE_DIR = os.path.dirname(__file__)
-    DEFAULT_DB = os.environ.get("BANK_DB_PATH", os.path.join(BASE_DIR, "dummy_bank.db"))
-
-    def __init__(self, db_path: str = None):
-        super().__init__(db_path )  # SQLiteAccountRepository db_path kurar
-        self.db_path = db_path 
-
-    def _ensure_schema(self, con: sqlite3.Connection):
-        cur = con.cursor()
-        cur.execute("""
+# Şema migration'ları: (sürüm, [SQL, ...]). Sırayla ve yalnızca bir kez uygulanır;
+# uygulanan son sürüm veritabanında PRAGMA user_version olarak tutulur.
+_MIGRATIONS = [
+    (1, [
+        """
         CREATE TABLE IF NOT EXISTS payments (
           payment_id TEXT PRIMARY KEY,
           customer_id INTEGER NOT NULL,
@@ -187,12 +183,177 @@ class SQLitePaymentRepository(SQLiteRepository):
           from_balance_after REAL,
           to_balance_after REAL
         )
-        """)
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS card_limit_requests (
+          request_id      INTEGER PRIMARY KEY AUTOINCREMENT,
+          created_at      TEXT NOT NULL,
+          card_id         INTEGER NOT NULL,
+          customer_id     INTEGER NOT NULL,
+          requested_limit REAL NOT NULL,
+          reason          TEXT,
+          status          TEXT NOT NULL   -- received|approved|rejected
+        )
+        """,
+        # (customer_id, gün) -> günlük çıkış toplamı; limit kontrolü tek PK okuması olsun
+        """
+        CREATE TABLE IF NOT EXISTS daily_out_totals (
+          customer_id INTEGER NOT NULL,
+          day         TEXT NOT NULL,         -- YYYY-MM-DD, yerel gün (today_str ile aynı anahtar)
+          total       REAL NOT NULL DEFAULT 0,
+          PRIMARY KEY (customer_id, day)
+        ) WITHOUT ROWID
+        """,
+        # mevcut 'posted' kayıtlardan sayaçları doldur
+        """
+        INSERT OR IGNORE INTO daily_out_totals(customer_id, day, total)
+        SELECT a.customer_id, date(p.created_at, 'localtime'), SUM(p.amount)
+        FROM payments p
+        JOIN accounts a ON a.account_id = p.from_account
+        WHERE p.status='posted'
+        GROUP BY a.customer_id, date(p.created_at, 'localtime')
+        """,
+    ]),
+    (2, [
+        "CREATE INDEX IF NOT EXISTS idx_payments_customer_created ON payments(customer_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_payments_from_status ON payments(from_account, status)",
+    ]),
+    (3, [
+        # commit idempotency: aynı (müşteri, client_ref) tekrar gelirse saklı sonuç döner
+        """
+        CREATE TABLE IF NOT EXISTS payment_idempotency (
+          customer_id INTEGER NOT NULL,
+          idem_key    TEXT NOT NULL,
+          payment_id  TEXT NOT NULL,
+          result_json TEXT NOT NULL,
+          created_at  TEXT NOT NULL,
+          expires_at  TEXT NOT NULL,
+          PRIMARY KEY (customer_id, idem_key)
+        ) WITHOUT ROWID
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_payment_idempotency_expires ON payment_idempotency(expires_at)",
+    ]),
+    # 4: accounts.account_type_norm; artık SQLiteRepository.migrate_accounts'ta (numara ayrılmış kalır)
+    (4, []),
+    (5, [
+        # anahtarın hangi transfer için kullanıldığı: farklı istekle tekrar gelirse çakışma
+        "ALTER TABLE payment_idempotency ADD COLUMN request_hash TEXT",
+    ]),
+]
+
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("PAYMENT_IDEMPOTENCY_TTL_SECONDS", "86400"))
+# SQLITE_BUSY ("database is locked") için sınırlı, jitter'lı yeniden deneme
+BUSY_RETRIES = int(os.getenv("PAYMENT_BUSY_RETRIES", "5"))
+BUSY_BACKOFF_SECONDS = float(os.getenv("PAYMENT_BUSY_BACKOFF_SECONDS", "0.02"))
+
+
+def today_str() -> str:
+    """Günlük limit gün anahtarı (yerel tarih); ön kontrol ve sayaç artırımı bunu kullanır."""
+    return datetime.date.today().isoformat()
+
+
+def request_fingerprint(from_account: int, to_account: int, amount: float, currency: str) -> str:
+    """Idempotency anahtarının bağlandığı transferin özeti (hesaplar, 2 haneli tutar, para birimi)."""
+    raw = f"{int(from_account)}|{int(to_account)}|{round(float(amount), 2):.2f}|{(currency or '').upper()}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def local_timestamp() -> str:
+    """txns.txn_date biçimi: 'YYYY-MM-DD HH:MM:SS' (yerel saat, mevcut kayıtlarla aynı)."""
+    return datetime.datetime.now().replace(microsecond=0).isoformat(sep=" ")
+
+
+def _txn_description(base: str, note: str | None) -> str:
+    return f"{base} | {note}" if note else base
+
+
+def _is_busy(exc: Exception) -> bool:
+    msg = str(exc).lower()
+    return "database is locked" in msg or "database is busy" in msg
+
+
+_ACCOUNT_FIELDS = ("account_id", "customer_id", "account_number", "account_type",
+                   "balance", "currency", "created_at", "status")
+
+
+def _account_cols(alias: str) -> str:
+    """Birleşik sorgularda hesap kolonlarını '<alias>_<kolon>' adıyla seçer."""
+    return ", ".join(f"{alias}.{c} AS {alias}_{c}" for c in _ACCOUNT_FIELDS)
+
+
+def _account_from_row(row: sqlite3.Row, alias: str) -> dict | None:
+    """SQLiteRepository.get_account ile aynı tiplerde hesap sözlüğü (LEFT JOIN boşsa None)."""
+    if row is None or row[f"{alias}_account_id"] is None:
+        return None
+    return {
+        "account_id": int(row[f"{alias}_account_id"]),
+        "customer_id": int(row[f"{alias}_customer_id"]),
+        "account_number": row[f"{alias}_account_number"],
+        "account_type": str(row[f"{alias}_account_type"]),
+        "balance": float(row[f"{alias}_balance"]),
+        "currency": str(row[f"{alias}_currency"]),
+        "created_at": str(row[f"{alias}_created_at"]),
+        "status": str(row[f"{alias}_status"]),
+    }
+
+
+def _with_busy_retry(fn, *args):
+    """SQLITE_BUSY durumunda fn'i BUSY_RETRIES kez jitter'lı geri çekilmeyle yeniden dener."""
+    for attempt in range(BUSY_RETRIES + 1):
+        try:
+            return fn(*args)
+        except sqlite3.OperationalError as e:
+            if not _is_busy(e) or attempt >= BUSY_RETRIES:
+                raise
+            time.sleep(random.uniform(0, BUSY_BACKOFF_SECONDS * (2 ** attempt)))
+
+
+class SQLitePaymentRepository(SQLiteRepository):
+    """
+    Kendi hesapları arasında transfer (havale) işlemleri için repo.
+    Şema (payments, card_limit_requests, sayaçlar, indeksler) repo kurulurken
+    migration adımıyla bir kez garanti edilir; bağlantı açarken DDL çalışmaz.
+    """
+    BASE_DIR = os.path.dirname(__file__)
+    DEFAULT_DB = os.environ.get("BANK_DB_PATH", os.path.join(BASE_DIR, "dummy_bank.db"))
+
+    def __init__(self, db_path: str = None):
+        super().__init__(db_path )  # SQLiteAccountRepository db_path kurar
+        self.db_path = db_path 
+        self.migrate_accounts()  # get_accounts_by_type (transfer by type) bu şemaya dayanır
+        self.migrate()
+
+    def migrate(self) -> int:
+        """
+        Bekleyen şema migration'larını uygular ve güncel şema sürümünü döner.
+        BEGIN IMMEDIATE sayesinde aynı DB'yi açan birden fazla süreç
+        aynı migration'ı iki kez çalıştırmaz.
+        """
+        con = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            con.isolation_level = None  # explicit tx
+            cur = con.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                version = int(cur.execute("PRAGMA user_version").fetchone()[0])
+                for target, statements in _MIGRATIONS:
+                    if target <= version:
+                        continue
+                    for sql in statements:
+                        cur.execute(sql)
+                    cur.execute(f"PRAGMA user_version = {int(target)}")
+                    version = target
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+            return version
+        finally:
+            con.close()
 
     def _connect(self) -> sqlite3.Connection:
         con = sqlite3.connect(self.db_path)
         con.row_factory = sqlite3.Row
-        self._ensure_schema(con)  # <-- her bağlantıda şema garantisi
         return con
 
     def _now(self) -> str:
@@ -209,22 +370,101 @@ class SQLitePaymentRepository(SQLiteRepository):
     def get_daily_out_total(self, customer_id: int, date_yyyy_mm_dd: str) -> float:
         """
         Bugün için bu müşterinin 'posted' durumundaki toplam çıkış tutarı.
+        daily_out_totals sayacından tek primary-key okumasıyla gelir.
         """
         con = self._connect()
         try:
             cur = con.cursor()
-            cur.execute("""
-              SELECT COALESCE(SUM(amount), 0)
-              FROM payments
-              WHERE status='posted'
-                AND from_account IN (SELECT account_id FROM accounts WHERE customer_id=?)
-                AND substr(created_at,1,10)=?
-            """, (customer_id, date_yyyy_mm_dd))
+            cur.execute(
+                "SELECT total FROM daily_out_totals WHERE customer_id=? AND day=?",
+                (customer_id, date_yyyy_mm_dd),
+            )
             row = cur.fetchone()
-            return float(row[0] or 0.0)
+            return float(row[0]) if row else 0.0
         finally:
             con.close()
 
+    def get_transfer_context(self, from_account: int, to_account: int, date_yyyy_mm_dd: str) -> dict:
+        """
+        Transfer ön kontrolü için gereken her şeyi tek sorguda getirir:
+        kaynak ve hedef hesap kayıtları + kaynak hesap sahibinin o günkü çıkış toplamı.
+        Dönüş: {"from_account": dict|None, "to_account": dict|None, "used_today": float}
+        """
+        con = self._connect()
+        try:
+            cur = con.cursor()
+            cur.execute(f"""
+              WITH ids(from_id, to_id) AS (VALUES (?, ?))
+              SELECT {_account_cols("f")}, {_account_cols("t")}, COALESCE(d.total, 0) AS used_today
+              FROM ids
+              LEFT JOIN accounts f ON f.account_id = ids.from_id
+              LEFT JOIN accounts t ON t.account_id = ids.to_id
+              LEFT JOIN daily_out_totals d ON d.customer_id = f.customer_id AND d.day = ?
+            """, (from_account, to_account, date_yyyy_mm_dd))
+            row = cur.fetchone()
+            return {
+                "from_account": _account_from_row(row, "f"),
+                "to_account": _account_from_row(row, "t"),
+                "used_today": float(row["used_today"]),
+            }
+        finally:
+            con.close()
+
+    def get_customer_transfer_context(self, customer_id: int, date_yyyy_mm_dd: str) -> tuple[list[dict], float]:
+        """
+        Müşterinin tüm hesapları + o günkü çıkış toplamı, tek sorguda.
+        Hesap türüyle transferde (payment_request_by_type) iki hesabı çözmek ve
+        limit kontrolü için kullanılır. Dönüş: (hesaplar, used_today)
+        """
+        con = self._connect()
+        try:
+            cur = con.cursor()
+            cur.execute(f"""
+              SELECT {_account_cols("a")},
+                     COALESCE((SELECT total FROM daily_out_totals WHERE customer_id = ? AND day = ?), 0) AS used_today
+              FROM accounts a
+              WHERE a.customer_id = ?
+              ORDER BY a.account_id
+            """, (customer_id, date_yyyy_mm_dd, customer_id))
+            rows = cur.fetchall()
+            if not rows:
+                return [], 0.0
+            return [_account_from_row(r, "a") for r in rows], float(rows[0]["used_today"])
+        finally:
+            con.close()
+
+    def find_idempotent_result(self, customer_id: int, idem_key: str, from_account: int, to_account: int,
+                               amount: float, currency: str | None = None) -> dict | None:
+        """
+        Süresi dolmamış bir idempotency kaydı varsa saklanan transfer sonucunu döner.
+        Anahtar başka bir transfer (hesaplar / tutar / para birimi) için kullanılmışsa
+        ValueError("idempotency_key_conflict"). currency None ise saklı kaydınki kabul edilir.
+        """
+        con = self._connect()
+        try:
+            return self._load_idempotent(con.cursor(), customer_id, idem_key, self._now(),
+                                         (from_account, to_account, amount, currency))
+        finally:
+            con.close()
+
+    def _load_idempotent(self, cur: sqlite3.Cursor, customer_id: int, idem_key: str, now: str,
+                         request: tuple) -> dict | None:
+        cur.execute(
+            "SELECT result_json, request_hash FROM payment_idempotency WHERE customer_id=? AND idem_key=? AND expires_at > ?",
+            (customer_id, idem_key, now),
+        )
+        row = cur.fetchone()
+        if not row:
+            return None
+        stored = json.loads(row[0])
+        from_account, to_account, amount, currency = request
+        # request_hash'ten önce yazılmış kayıtlar için özet saklı sonuçtan çıkarılır
+        stored_hash = row[1] or request_fingerprint(stored["from_account"], stored["to_account"],
+                                                    stored["amount"], stored["currency"])
+        if request_fingerprint(from_account, to_account, amount, currency or stored["currency"]) != stored_hash:
+            raise ValueError("idempotency_key_conflict")
+        return stored
+
     def find_by_customer_id(self, customer_id: int):
         con = self._connect()
         try:
@@ -236,36 +476,61 @@ class SQLitePaymentRepository(SQLiteRepository):
             con.close()
 
     def insert_payment_posted(self, customer_id: int, from_account: int, to_account: int,
-                              amount: float, currency: str, fee: float, note: str) -> dict:
+                              amount: float, currency: str, fee: float, note: str,
+                              idempotency_key: str | None = None) -> dict:
         """
         Tek transaction içinde: bakiyeleri güncelle + payments'a 'posted' kayıt ekle
-        + varsa txns tablosuna 2 satır.
+        + günlük çıkış sayacını artır + txns tablosuna 2 hareket satırı.
+        idempotency_key verilirse sonuç TTL süresince saklanır; aynı anahtarla gelen
+        tekrar bakiyelere dokunmadan saklı sonucu döner ("idempotent_replay": True).
+        Anahtar farklı bir transferle gelirse ValueError("idempotency_key_conflict").
+
+        Transaction BEGIN IMMEDIATE ile açılır (yazma kilidi baştan alınır) ve
+        SQLITE_BUSY durumunda BUSY_RETRIES kez jitter'lı geri çekilmeyle yeniden denenir.
         """
+        return _with_busy_retry(
+            self._insert_payment_posted_once,
+            customer_id, from_account, to_account, amount, currency, fee, note, idempotency_key,
+        )
+
+    def _insert_payment_posted_once(self, customer_id: int, from_account: int, to_account: int,
+                                    amount: float, currency: str, fee: float, note: str,
+                                    idempotency_key: str | None) -> dict:
         now = self._now()
-        payment_id = f"TX{now.replace('-','').replace(':','').replace('T','').replace('Z','')}"
+        payment_id = new_payment_id()  # ms çözünürlüklü, çakışmasız ve sıralanabilir
         con = self._connect()
         try:
             con.isolation_level = None  # explicit tx
             cur = con.cursor()
-            cur.execute("BEGIN")
-
-            # bakiyeler
-            cur.execute("SELECT balance FROM accounts WHERE account_id=?", (from_account,))
+            cur.execute("BEGIN IMMEDIATE")
+
+            if idempotency_key:
+                cur.execute("DELETE FROM payment_idempotency WHERE expires_at <= ?", (now,))
+                stored = self._load_idempotent(cur, customer_id, idempotency_key, now,
+                                               (from_account, to_account, amount, currency))
+                if stored is not None:
+                    cur.execute("ROLLBACK")
+                    return {**stored, "idempotent_replay": True}
+
+            # bakiyeler: koşullu UPDATE ... RETURNING ile kontrol + yazma + okuma tek adımda
+            cur.execute(
+                "UPDATE accounts SET balance = balance - ? WHERE account_id=? AND balance >= ? RETURNING balance, customer_id",
+                (amount + fee, from_account, amount + fee),
+            )
             r = cur.fetchone()
             if not r:
-                raise ValueError("from_account_not_found")
-            from_bal = float(r[0])
-            if from_bal < amount + fee:
-                raise ValueError("insufficient_funds")
-
-            cur.execute("UPDATE accounts SET balance = balance - ? WHERE account_id=?", (amount + fee, from_account))
-            cur.execute("UPDATE accounts SET balance = balance + ? WHERE account_id=?", (amount, to_account))
-
-            # güncel bakiyeler
-            cur.execute("SELECT balance FROM accounts WHERE account_id=?", (from_account,))
-            from_bal_after = float(cur.fetchone()[0])
-            cur.execute("SELECT balance FROM accounts WHERE account_id=?", (to_account,))
-            to_bal_after = float(cur.fetchone()[0])
+                cur.execute("SELECT 1 FROM accounts WHERE account_id=?", (from_account,))
+                raise ValueError("insufficient_funds" if cur.fetchone() else "from_account_not_found")
+            from_bal_after, from_owner = float(r[0]), r[1]
+
+            cur.execute(
+                "UPDATE accounts SET balance = balance + ? WHERE account_id=? RETURNING balance, customer_id",
+                (amount, to_account),
+            )
+            r = cur.fetchone()
+            if not r:
+                raise ValueError("to_account_not_found")
+            to_bal_after, to_owner = float(r[0]), r[1]
 
             # payments kaydı
             cur.execute("""
@@ -273,21 +538,24 @@ class SQLitePaymentRepository(SQLiteRepository):
               VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'posted', ?, ?, ?, ?)
             """, (payment_id, customer_id, from_account, to_account, amount, currency, fee, note, now, now, from_bal_after, to_bal_after))
 
-            # opsiyonel txns
-            try:
-                cur.execute("""
-                  INSERT INTO txns(account_id, ts, amount, currency, direction, desc, counterparty)
-                  VALUES (?, ?, ?, ?, 'out', ?, ?)
-                """, (from_account, now, amount + fee, currency, f"Transfer to #{to_account} | {note or ''}", str(to_account)))
-                cur.execute("""
-                  INSERT INTO txns(account_id, ts, amount, currency, direction, desc, counterparty)
-                  VALUES (?, ?, ?, ?, 'in', ?, ?)
-                """, (to_account, now, amount, currency, f"Transfer from #{from_account} | {note or ''}", str(from_account)))
-            except Exception:
-                pass
-
-            cur.execute("COMMIT")
-            return {
+            # günlük çıkış sayacı (aynı transaction)
+            cur.execute("""
+              INSERT INTO daily_out_totals(customer_id, day, total)
+              SELECT customer_id, ?, ? FROM accounts WHERE account_id=?
+              ON CONFLICT(customer_id, day) DO UPDATE SET total = total + excluded.total
+            """, (today_str(), amount, from_account))
+
+            # hesap hareketleri (txns şemasıyla: tutar işaretli, yerel zaman)
+            txn_date = local_timestamp()
+            cur.executemany("""
+              INSERT INTO txns(account_id, amount, txn_type, txn_date, description)
+              VALUES (?, ?, 'havale', ?, ?)
+            """, [
+                (from_account, -(amount + fee), txn_date, _txn_description(f"Transfer: #{to_account}", note)),
+                (to_account, amount, txn_date, _txn_description(f"Transfer: #{from_account}", note)),
+            ])
+
+            txn = {
                 "payment_id": payment_id,
                 "customer_id": customer_id,
                 "from_account": from_account,
@@ -302,6 +570,31 @@ class SQLitePaymentRepository(SQLiteRepository):
                 "from_balance_after": from_bal_after,
                 "to_balance_after": to_bal_after
             }
+
+            if idempotency_key:
+                expires = (
+                    datetime.datetime.utcnow().replace(microsecond=0)
+                    + datetime.timedelta(seconds=IDEMPOTENCY_TTL_SECONDS)
+                ).isoformat() + "Z"
+                try:
+                    cur.execute("""
+                      INSERT INTO payment_idempotency(customer_id, idem_key, payment_id, result_json, created_at, expires_at, request_hash)
+                      VALUES (?, ?, ?, ?, ?, ?, ?)
+                    """, (customer_id, idempotency_key, payment_id, json.dumps(txn, ensure_ascii=False), now, expires,
+                          request_fingerprint(from_account, to_account, amount, currency)))
+                except sqlite3.IntegrityError:
+                    # aynı anahtarla eşzamanlı commit önce yazdı: bu transferi geri al
+                    cur.execute("ROLLBACK")
+                    stored = self.find_idempotent_result(customer_id, idempotency_key,
+                                                         from_account, to_account, amount, currency)
+                    if stored is None:
+                        raise
+                    return {**stored, "idempotent_replay": True}
+
+            cur.execute("COMMIT")
+            # okuma önbelleği: iki tarafın bakiyesi değişti
+            get_read_cache(self.db_path).invalidate(customer_id, from_owner, to_owner)
+            return txn
         except Exception:
             try: cur.execute("ROLLBACK")
             except Exception: pass
@@ -309,24 +602,115 @@ class SQLitePaymentRepository(SQLiteRepository):
         finally:
             con.close()
 
-    def ensure_card_limit_request_schema(self, con: sqlite3.Connection):
+    def insert_payments_posted_batch(self, customer_id: int, transfers: list[dict], plan) -> list[dict]:
         """
-        'card_limit_requests' tablosunu garanti eder.
-        Eğer yoksa oluşturur.
+        Birden çok transferi tek BEGIN IMMEDIATE transaction içinde doğrular ve yazar.
+        transfers: [{"from_account", "to_account", "amount", "currency", "note"}, ...]
+
+        Kalemlerin dokunduğu hesaplar ve kaynak hesap sahiplerinin bugünkü çıkış
+        toplamları yazma kilidi alındıktan sonra bir kez okunur; plan(hesaplar, kullanımlar)
+        bu anlık görüntüyle kalem başına {"ok": True, amount, currency, fee, note, ...}
+        veya hata sözlüğü döner. Geçerli kalemler executemany ile accounts, payments,
+        daily_out_totals (kaynak hesabın sahibi) ve txns'e yazılır.
+        Dönüş: girişle aynı sırada kalem başına txn sözlüğü veya plan'ın hata sözlüğü.
         """
-        cur = con.cursor()
-        # YENİ: kart limit artış talepleri
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS card_limit_requests (
-          request_id      INTEGER PRIMARY KEY AUTOINCREMENT,
-          created_at      TEXT NOT NULL,
-          card_id         INTEGER NOT NULL,
-          customer_id     INTEGER NOT NULL,
-          requested_limit REAL NOT NULL,
-          reason          TEXT,
-          status          TEXT NOT NULL   -- received|approved|rejected
-        )
-        """)
+        return _with_busy_retry(self._insert_payments_posted_batch_once, customer_id, transfers, plan)
+
+    def _insert_payments_posted_batch_once(self, customer_id: int, transfers: list[dict], plan) -> list[dict]:
+        now = self._now()
+        day = today_str()
+        con = self._connect()
+        try:
+            con.isolation_level = None  # explicit tx
+            cur = con.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+
+            # anlık görüntü: kilit altında okunduğu için commit'e kadar değişmez
+            ids = sorted({int(t["from_account"]) for t in transfers} | {int(t["to_account"]) for t in transfers})
+            cur.execute(
+                f"SELECT {_account_cols('a')} FROM accounts a WHERE a.account_id IN ({','.join('?' * len(ids))})",
+                ids,
+            )
+            accounts = {acc["account_id"]: acc for acc in (_account_from_row(r, "a") for r in cur.fetchall())}
+            owners = sorted({accounts[t["from_account"]]["customer_id"]
+                             for t in transfers if t["from_account"] in accounts})
+            used = {}
+            if owners:
+                cur.execute(
+                    f"SELECT customer_id, total FROM daily_out_totals WHERE day=? AND customer_id IN ({','.join('?' * len(owners))})",
+                    [day, *owners],
+                )
+                used = {int(r[0]): float(r[1]) for r in cur.fetchall()}
+
+            decisions = plan(accounts, used)
+
+            balances = {aid: acc["balance"] for aid, acc in accounts.items()}
+            deltas: dict[int, float] = {}
+            out_by_owner: dict[int, float] = {}
+            payment_rows, txn_rows, results = [], [], []
+            txn_date = local_timestamp()
+            for item, pre in zip(transfers, decisions):
+                if not pre.get("ok"):
+                    results.append(pre)
+                    continue
+                src, dst = item["from_account"], item["to_account"]
+                amount, fee, note = float(pre["amount"]), float(pre["fee"]), pre.get("note") or ""
+                balances[src] -= amount + fee
+                balances[dst] += amount
+                deltas[src] = deltas.get(src, 0.0) - (amount + fee)
+                deltas[dst] = deltas.get(dst, 0.0) + amount
+                owner = accounts[src]["customer_id"]
+                out_by_owner[owner] = out_by_owner.get(owner, 0.0) + amount
+                txn = {
+                    "payment_id": new_payment_id(),
+                    "customer_id": customer_id,
+                    "from_account": src,
+                    "to_account": dst,
+                    "amount": amount,
+                    "currency": pre["currency"],
+                    "fee": fee,
+                    "note": note,
+                    "status": "posted",
+                    "created_at": now,
+                    "posted_at": now,
+                    "from_balance_after": round(balances[src], 2),
+                    "to_balance_after": round(balances[dst], 2),
+                }
+                payment_rows.append((txn["payment_id"], customer_id, src, dst, amount, txn["currency"], fee, note,
+                                     now, now, txn["from_balance_after"], txn["to_balance_after"]))
+                txn_rows.append((src, -(amount + fee), txn_date, _txn_description(f"Transfer: #{dst}", note)))
+                txn_rows.append((dst, amount, txn_date, _txn_description(f"Transfer: #{src}", note)))
+                results.append(txn)
+
+            if not payment_rows:
+                cur.execute("ROLLBACK")
+                return results
+
+            cur.executemany("UPDATE accounts SET balance = balance + ? WHERE account_id=?",
+                            [(d, aid) for aid, d in deltas.items()])
+            cur.executemany("""
+              INSERT INTO payments(payment_id, customer_id, from_account, to_account, amount, currency, fee, note, status, created_at, posted_at, from_balance_after, to_balance_after)
+              VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'posted', ?, ?, ?, ?)
+            """, payment_rows)
+            cur.executemany("""
+              INSERT INTO daily_out_totals(customer_id, day, total) VALUES (?, ?, ?)
+              ON CONFLICT(customer_id, day) DO UPDATE SET total = total + excluded.total
+            """, [(owner, day, total) for owner, total in out_by_owner.items()])
+            cur.executemany("""
+              INSERT INTO txns(account_id, amount, txn_type, txn_date, description)
+              VALUES (?, ?, 'havale', ?, ?)
+            """, txn_rows)
+
+            cur.execute("COMMIT")
+            touched = {accounts[aid]["customer_id"] for aid in deltas}
+            get_read_cache(self.db_path).invalidate(customer_id, *touched)
+            return results
+        except Exception:
+            try: cur.execute("ROLLBACK")
+            except Exception: pass
+            raise
+        finally:
+            con.close()
 
     def save_card_limit_increase_request(
         self,
@@ -346,6 +730,7 @@ class SQLitePaymentRepository(SQLiteRepository):
               VALUES (?, ?, ?, ?, ?, ?)
             """, (now, int(card_id), int(customer_id), float(requested_limit), reason, status))
             con.commit()
+            get_read_cache(self.db_path).invalidate(customer_id)
             rid = cur.lastrowid
             return {
                 "request_id": int(rid),
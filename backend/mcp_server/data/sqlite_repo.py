@@ -5,6 +5,31 @@ from datetime import datetime
 from typing import Any, Dict, List, Optional,Tuple
 import pandas as pd
 
+from .account_types import normalize_account_type, fold_tr, fold_tr_sql
+from .reference_data import FeeMatcher
+
+# accounts şeması: hesap türü aramaları için katlanmış tür kolonu + (müşteri, tür) indeksi;
+# trigger'larla güncel tutulur. Kolon eklenmişse ALTER/UPDATE atlanır, gerisi IF NOT EXISTS.
+_ACCOUNTS_TYPE_NORM_BACKFILL = [
+    "ALTER TABLE accounts ADD COLUMN account_type_norm TEXT",
+    f"UPDATE accounts SET account_type_norm = {fold_tr_sql('account_type')}",
+]
+_ACCOUNTS_SCHEMA = [
+    "CREATE INDEX IF NOT EXISTS idx_accounts_customer_type_norm ON accounts(customer_id, account_type_norm)",
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_accounts_type_norm_ins AFTER INSERT ON accounts
+    BEGIN
+      UPDATE accounts SET account_type_norm = {fold_tr_sql('NEW.account_type')} WHERE rowid = NEW.rowid;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_accounts_type_norm_upd AFTER UPDATE OF account_type ON accounts
+    BEGIN
+      UPDATE accounts SET account_type_norm = {fold_tr_sql('NEW.account_type')} WHERE rowid = NEW.rowid;
+    END
+    """,
+]
+
 
 class SQLiteRepository:
     """
@@ -17,6 +42,31 @@ class SQLiteRepository:
     def __init__(self, db_path: str = DB_PATH):
         self.db_path = db_path
 
+    def migrate_accounts(self) -> None:
+        """
+        get_accounts_by_type'ın dayandığı accounts.account_type_norm kolonunu,
+        indeksini ve trigger'larını garanti eder. Uzun ömürlü repo'lar kurulurken
+        (MCP sunucusu açılışı) bir kez çağrılır; istek başına açılan örnekler çağırmaz.
+        """
+        con = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            con.isolation_level = None  # explicit tx
+            cur = con.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                cols = {r[1] for r in cur.execute("PRAGMA table_info(accounts)").fetchall()}
+                if "account_type_norm" not in cols:
+                    for sql in _ACCOUNTS_TYPE_NORM_BACKFILL:
+                        cur.execute(sql)
+                for sql in _ACCOUNTS_SCHEMA:
+                    cur.execute(sql)
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+        finally:
+            con.close()
+
     def get_account(self, account_id: int) -> Optional[Dict[str, Any]]:
         if account_id is None:
             return None
@@ -59,6 +109,43 @@ class SQLiteRepository:
         finally:
             con.close()
 
+    def get_accounts_by_type(self, customer_id: int, account_type: str) -> List[Dict[str, Any]]:
+        """
+        Müşterinin verilen türdeki hesaplarını getirir. account_type kullanıcı
+        girdisi olabilir ("maaş hesabım", "vadesiz"); eş anlamlılar tablosundan
+        çözülür ve (customer_id, account_type_norm) indeksiyle aranır.
+        Tanınmayan tür katlanmış haliyle aranır (genelde boş liste döner).
+        """
+        norm = normalize_account_type(account_type) or fold_tr(account_type or "")
+        con = sqlite3.connect(self.db_path)
+        con.row_factory = sqlite3.Row
+        try:
+            cur = con.cursor()
+            cur.execute(
+                """
+                SELECT account_id, customer_id, account_number, account_type, balance, currency, created_at, status
+                FROM accounts
+                WHERE customer_id = ? AND account_type_norm = ?
+                ORDER BY account_id
+                """,
+                (customer_id, norm),
+            )
+            return [
+                {
+                    "account_id": int(row["account_id"]),
+                    "customer_id": int(row["customer_id"]),
+                    "account_number": row["account_number"],
+                    "account_type": str(row["account_type"]),
+                    "balance": float(row["balance"]),
+                    "currency": str(row["currency"]),
+                    "created_at": str(row["created_at"]),
+                    "status": str(row["status"]),
+                }
+                for row in cur.fetchall()
+            ]
+        finally:
+            con.close()
+
     def get_accounts_by_customer(self, customer_id: int, account_type: str = None) -> List[Dict[str, Any]]:
         """
         Müşteriye ait hesapları getirir. İsteğe bağlı olarak hesap türüne göre filtreleme yapabilir.
@@ -251,6 +338,13 @@ class SQLiteRepository:
         finally:
             conn.close()
 
+    def resolve_fee_code(self, query: str) -> Dict[str, Any]:
+        """
+        Serbest metni ("eft ücreti", "para çekme", "swft") service_code'a çözer.
+        Dönüş: {"service_code": kod|None, "score", "match", "suggestions": [...]}
+        """
+        return FeeMatcher(self.list_fees()).resolve(query)
+
     def find_branch_atm(
         self,
         city: str,
@@ -4,8 +4,11 @@ import os
 import sys
 from typing import Any, Dict, Optional
 from .data.sql_payment_repo import SQLitePaymentRepository
-from .data.sqlite_repo import SQLiteRepository
+from .data.read_cache import CachedSQLiteRepository
+from .data.ids import new_ulid
 from fastmcp import FastMCP
+from starlette.requests import Request
+from starlette.responses import JSONResponse
 from .tools.general_tools import GeneralTools
 from .tools.calculation_tools import CalculationTools
 from .tools.roi_simulator_tool import ROISimulatorTool
@@ -23,7 +26,8 @@ from common.mcp_decorators import log_tool
 # === Initialize MCP server ===
 mcp = FastMCP("Fortuna Banking Services")
 # === Initialize tool classes ===
-repo = SQLiteRepository(db_path=DB_PATH)
+repo = CachedSQLiteRepository(db_path=DB_PATH)  # hesap/kart okumaları müşteri bazlı TTL önbellekli
+repo.reference.load()  # ücret/faiz/portföy referans verileri açılışta bir kez yüklenir
 general_tools = GeneralTools(repo)
 calc_tools = CalculationTools(repo)
 roi_simulator_tool = ROISimulatorTool(repo)
@@ -32,6 +36,12 @@ repo_payment = SQLitePaymentRepository(db_path=DB_PATH)
 pay = PaymentService(repo_payment)
 
 
+# ============ METRICS ==============#
+@mcp.custom_route("/metrics/read-cache", methods=["GET"])
+async def read_cache_metrics(request: Request) -> JSONResponse:
+    """Hesap/kart okuma önbelleği: isabet oranı, invalidation ve kayıt sayıları (LLM'e araç olarak açılmaz)."""
+    return JSONResponse(repo.cache_stats())
+
 
 # ============ GENERAL TOOL ==============#
 @mcp.tool()
@@ -807,6 +817,7 @@ def payment_request(
     currency: str = "TRY",
     note: str = "",
     confirm: bool = False,
+    client_ref: str = "",
 ):
     """
     Own-accounts transfer (preview or commit) with idempotency and safety checks.
@@ -819,14 +830,23 @@ def payment_request(
     from_account:int, to_account:int, amount:float,
     currency:str="TRY", note:str="", client_ref:str="", confirm:bool=False
 
+    On commit pass the preview's `suggested_client_ref` as `client_ref`; retries with
+    the same `client_ref` return the original result without posting again.
+
     Returns:
     - Preview: { ok, phase:"precheck", suggested_client_ref, preview{...} }
-    - Commit:  { ok, phase:"commit", txn{...}, receipt{...} }
+    - Commit:  { ok, phase:"commit", txn{...}, receipt{...}, idempotent_replay? }
     - Error:   { ok:false, error:<code>, ... }
 
     Rules: accounts exist/active, same currency, sufficient funds, per-txn & daily limits,
-    idempotent by `client_ref`. Reads `accounts`; writes `payments` (and optionally `txns`).
+    idempotent by `client_ref`. Reads `accounts`; writes `payments` and `txns`.
     """
+    # 0) Onaylı tekrar deneme: ilk commit bakiyeyi / limiti tüketmiş olabilir, precheck'ten önce bak
+    if confirm:
+        replay = pay.replay(customer_id, client_ref, from_account, to_account, amount, currency)
+        if replay is not None:
+            return [{"type": "json", "json": {"phase": "commit", **replay}}]
+
     # 1) Her zaman precheck: güvenlik ağımız
     pre = pay.precheck(from_account, to_account, amount, currency, note, customer_id)
     if not pre.get("ok"):
@@ -838,7 +858,7 @@ def payment_request(
             "ok": True,
             "phase": "precheck",
             "confirm_required": True,
-            "suggested_client_ref": str(customer_id),  # customer_id'yi string olarak kullan
+            "suggested_client_ref": new_ulid(),  # commit'te client_ref olarak geri gelir
             "preview": {
                 "from_account": from_account,
                 "to_account": to_account,
@@ -854,8 +874,8 @@ def payment_request(
         }
         return [{"type": "json", "json": preview}]
 
-    # 3) Onaylandı → create (idempotent)
-    res = pay.create(customer_id, from_account, to_account, amount, currency, note)
+    # 3) Onaylandı → create (client_ref ile idempotent)
+    res = pay.create(customer_id, from_account, to_account, amount, currency, note, client_ref)
     return [{"type": "json", "json": {"phase": "commit", **res}}]
 
 
@@ -869,6 +889,7 @@ def payment_request_by_type(
     currency: str = "TRY",
     note: str = "",
     confirm: bool = False,
+    client_ref: str = "",
 ) -> dict:
     """
     Account type ile para transferi (preview veya commit) - hesap numarası belirtmeye gerek yok.
@@ -887,37 +908,38 @@ def payment_request_by_type(
     Phases (via `confirm`):
     - False → preview/dry-run: validate and return summary
     - True  → commit: re-validate and post transfer atomically
+      (preview'daki `suggested_client_ref` değerini `client_ref` olarak verin;
+      aynı client_ref ile tekrar gelen commit ilk sonucu döner, tekrar transfer yapmaz)
 
     Returns:
     - Preview: { ok, phase:"precheck", suggested_client_ref, preview{...} }
     - Commit:  { ok, phase:"commit", txn{...}, receipt{...} }
     - Error:   { ok:false, error:<code>, message:<text> }
     """
-    # 1) Account type'larından hesap numaralarını bul
-    from_result = pay.find_account_by_type(customer_id, from_account_type)
-    if not from_result.get("ok"):
-        return [{"type": "json", "json": {"ok": False, "phase": "precheck", **from_result}}]
-    
-    to_result = pay.find_account_by_type(customer_id, to_account_type)
-    if not to_result.get("ok"):
-        return [{"type": "json", "json": {"ok": False, "phase": "precheck", **to_result}}]
-    
-    from_account_id = from_result["account"]["account_id"]
-    to_account_id = to_result["account"]["account_id"]
-    
-    # 2) Normal payment işlemini gerçekleştir
-    # 1) Her zaman precheck: güvenlik ağımız
-    pre = pay.precheck(from_account_id, to_account_id, amount, currency, note, customer_id)
+    # 0) Onaylı tekrar deneme: türleri hesaplara çöz, saklı sonucu precheck'ten önce ara
+    if confirm and (client_ref or "").strip():
+        pair = pay.resolve_accounts_by_type(customer_id, from_account_type, to_account_type)
+        if pair.get("ok"):
+            replay = pay.replay(customer_id, client_ref, pair["from"]["account_id"], pair["to"]["account_id"],
+                                amount, currency)
+            if replay is not None:
+                return [{"type": "json", "json": {"phase": "commit", **replay}}]
+
+    # 1) Hesap türlerini çöz + precheck (hesaplar ve günlük kullanım tek sorguda)
+    pre = pay.precheck_by_type(customer_id, from_account_type, to_account_type, amount, currency, note)
     if not pre.get("ok"):
         return [{"type": "json", "json": {"ok": False, "phase": "precheck", **pre}}]
 
+    from_account_id = pre["from_account"]
+    to_account_id = pre["to_account"]
+
     # 2) Kullanıcıdan onay istenecekse (dry-run cevabı)
     if not confirm:
         preview = {
             "ok": True,
             "phase": "precheck",
             "confirm_required": True,
-            "suggested_client_ref": str(customer_id),
+            "suggested_client_ref": new_ulid(),
             "preview": {
                 "from_account": from_account_id,
                 "to_account": to_account_id,
@@ -933,8 +955,8 @@ def payment_request_by_type(
         }
         return [{"type": "json", "json": preview}]
 
-    # 3) Onaylandı → create (idempotent)
-    res = pay.create(customer_id, from_account_id, to_account_id, amount, currency, note)
+    # 3) Onaylandı → create (client_ref ile idempotent)
+    res = pay.create(customer_id, from_account_id, to_account_id, amount, currency, note, client_ref)
     return [{"type": "json", "json": {"phase": "commit", **res}}]
 
 
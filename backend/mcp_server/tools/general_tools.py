@@ -13,6 +13,7 @@ from geopy.geocoders import Nominatim
 # TCMB servisini import etmek için path ekle
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
 from tcmb_service import TCMBService
+from ..data.account_types import normalize_account_type, account_type_label
 
 class GeneralTools:
     """
@@ -67,29 +68,14 @@ class GeneralTools:
         except (TypeError, ValueError):
             return {"error": "customer_id geçersiz (int olmalı)"}
         
-        # Hesap türü eşleştirmesi - case insensitive mapping
-        account_type_mapping = {
-            "Vadeli Mevduat": ["vadeli mevduat", "vadeli"],
-            "Vadesiz Mevduat": ["vadesiz mevduat", "vadesiz"],
-            "Maaş": ["maaş", "maas"],
-            "Yatırım": ["yatırım", "yatirim"]
-        }
-        
-        # Gelen hesap türünü normalize et
-        input_type = account_type.lower().strip()
-        normalized_type = None
-        
-        # Mapping'de ara - case insensitive
-        for db_type, aliases in account_type_mapping.items():
-            if input_type in [alias.lower() for alias in aliases]:
-                normalized_type = db_type
-                break
-        
-        if not normalized_type:
+        # Hesap türü eşleştirmesi (önceden derlenmiş eş anlamlılar tablosu, Türkçe karakter duyarsız)
+        type_norm = normalize_account_type(account_type)
+        if not type_norm:
             return {"error": f"Geçersiz hesap türü: {account_type}. Desteklenen türler: vadeli mevduat, vadesiz mevduat, maaş, yatırım"}
+        normalized_type = account_type_label(type_norm)
         
-        # Hesap türüne göre hesapları getir
-        accounts = self.repo.get_accounts_by_customer(cust_id, normalized_type)
+        # Hesap türüne göre hesapları getir ((customer_id, account_type_norm) indeksi)
+        accounts = self.repo.get_accounts_by_type(cust_id, type_norm)
         
         if not accounts:
             # Debug: Tüm hesapları kontrol et
@@ -554,11 +540,13 @@ class GeneralTools:
         items: List[Dict[str, Any]] = []
         for r in rows:
             raw = r.get("pricing_json")
-            # pricing_json'u mümkünse JSON'a çevir
-            try:
-                pricing = json.loads(raw) if isinstance(raw, str) else raw
-            except Exception:
-                pricing = raw  # bozuksa string olarak bırak
+            # referans verisi pricing'i önceden parse eder; yoksa burada çevir
+            pricing = r.get("pricing")
+            if pricing is None:
+                try:
+                    pricing = json.loads(raw) if isinstance(raw, str) else raw
+                except Exception:
+                    pricing = raw  # bozuksa string olarak bırak
 
             items.append({
                 "service_code": r.get("service_code"),
@@ -587,18 +575,30 @@ class GeneralTools:
         if not service_code or not isinstance(service_code, str):
             return {"error": "service_code gerekli"}
         row = self.repo.get_fee(service_code.strip())
+        resolved = None
+        if not row:
+            # birebir kod yoksa serbest metinden çöz ("eft ücreti", "para çekme", "swft")
+            try:
+                resolved = self.repo.resolve_fee_code(service_code)
+            except Exception:
+                resolved = None
+            if resolved and resolved.get("service_code"):
+                row = self.repo.get_fee(resolved["service_code"])
         if not row:
             try:
                 codes = [r["service_code"] for r in self.repo.list_fees()]
             except Exception:
                 codes = []
-            return {"error": f"Ücret bulunamadı: {service_code}", "available_codes": codes}
+            return {"error": f"Ücret bulunamadı: {service_code}", "available_codes": codes,
+                    "suggestions": (resolved or {}).get("suggestions", [])}
 
-        pricing = row.get("pricing_json")
-        try:
-            pricing = json.loads(pricing) if isinstance(pricing, str) else pricing
-        except Exception:
-            pricing = {"raw": row.get("pricing_json")}
+        pricing = row.get("pricing")
+        if pricing is None:
+            pricing = row.get("pricing_json")
+            try:
+                pricing = json.loads(pricing) if isinstance(pricing, str) else pricing
+            except Exception:
+                pricing = {"raw": row.get("pricing_json")}
 
         result = {
             "service_code": row["service_code"],
@@ -606,6 +606,9 @@ class GeneralTools:
             "pricing": pricing,          # JSON tablo olduğu gibi döner 
             "updated_at": row["updated_at"],
         }
+        if resolved:
+            result["resolved_from"] = service_code
+            result["match"] = {"type": resolved["match"], "score": resolved["score"]}
         
         # Frontend FeesCard component için structured data
         result["ui_component"] = {
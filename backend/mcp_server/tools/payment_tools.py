@@ -1,35 +1,24 @@
 # tools/payment_service.py
 from __future__ import annotations
-import os, math, datetime
-from typing import Dict, Any
+import os, math
+from typing import Dict, Any, List
 
+from ..data.account_types import normalize_account_type, fold_tr
+from ..data.sql_payment_repo import today_str  # sayaçla aynı gün anahtarı
 
 DAILY_LIMIT = float(os.getenv("PAYMENT_DAILY_LIMIT", "50000"))
 PER_TXN_LIMIT = float(os.getenv("PAYMENT_PER_TXN_LIMIT", "20000"))
 DEFAULT_CCY = os.getenv("DEFAULT_CURRENCY", "TRY")
 
-def today_str() -> str:
-    return datetime.date.today().isoformat()
-
 def _is_active(v): return str(v).strip().lower() in ("active","aktif")
 def _is_external(v): return str(v).strip().lower() in ("external","harici")
 
-def _map_account_type_to_db(account_type: str) -> str:
+def _account_type_key(account_type: str) -> str:
     """
-    Kullanıcı dostu account type'ları veritabanı değerlerine çevirir.
-    Veritabanında Türkçe değerler: vadeli mevduat, vadesiz mevduat, maaş, yatırım
+    Kullanıcı dostu account type'ı accounts.account_type_norm anahtarına çevirir
+    (eş anlamlılar data/account_types.py'de).
     """
-    mapping = {
-        "vadeli": "vadeli mevduat",
-        "vadeli mevduat": "vadeli mevduat",
-        "vadesiz mevduat": "vadesiz mevduat", 
-        "vadesiz": "vadesiz mevduat",
-        "maaş": "maaş",
-        "maaş hesabı": "maaş",
-        "yatırım": "yatırım",
-        "yatırım hesabı": "yatırım"
-    }
-    return mapping.get(account_type.lower().strip(), account_type)
+    return normalize_account_type(account_type) or fold_tr(account_type or "")
 
 class PaymentService:
     def __init__(self, repo):
@@ -46,33 +35,37 @@ class PaymentService:
         Müşterinin belirtilen account type'ına sahip hesabını bulur.
         """
         try:
-            # Account type'ı veritabanı formatına çevir
-            db_account_type = _map_account_type_to_db(account_type)
-            
-            # Müşterinin tüm hesaplarını al
-            accounts = self.repo.get_accounts_by_customer(customer_id)
+            # (customer_id, account_type_norm) indeksiyle yalnızca o türdeki hesaplar
+            accounts = self.repo.get_accounts_by_type(customer_id, account_type)
             if not accounts:
-                return {"ok": False, "error": "no_accounts_found", "message": "Hesap bulunamadı."}
-            
-            # Account type'a göre filtrele
-            matching_accounts = []
-            for acc in accounts:
-                if acc.get("account_type", "").lower() == db_account_type.lower():
-                    matching_accounts.append(acc)
-            
-            if not matching_accounts:
-                return {"ok": False, "error": "account_type_not_found", 
+                return {"ok": False, "error": "account_type_not_found",
                        "message": f"{account_type} tipinde hesap bulunamadı."}
-            
-            if len(matching_accounts) > 1:
-                return {"ok": False, "error": "multiple_accounts_found",
-                       "message": f"Birden fazla {account_type} hesabınız var. Lütfen hesap numarası belirtin."}
-            
-            return {"ok": True, "account": matching_accounts[0]}
-            
+            return self._pick_account_by_type(accounts, account_type)
         except Exception as e:
             return {"ok": False, "error": "find_account_error", "message": f"Hesap bulunurken hata: {str(e)}"}
 
+    @staticmethod
+    def _pick_account_by_type(accounts: List[Dict[str, Any]], account_type: str) -> Dict[str, Any]:
+        """
+        Önceden yüklenmiş hesap listesinden account type'a uyan tek hesabı seçer.
+        """
+        if not accounts:
+            return {"ok": False, "error": "no_accounts_found", "message": "Hesap bulunamadı."}
+
+        key = _account_type_key(account_type)
+        matching_accounts = [acc for acc in accounts
+                             if fold_tr(acc.get("account_type", "")) == key]
+
+        if not matching_accounts:
+            return {"ok": False, "error": "account_type_not_found",
+                   "message": f"{account_type} tipinde hesap bulunamadı."}
+
+        if len(matching_accounts) > 1:
+            return {"ok": False, "error": "multiple_accounts_found",
+                   "message": f"Birden fazla {account_type} hesabınız var. Lütfen hesap numarası belirtin."}
+
+        return {"ok": True, "account": matching_accounts[0]}
+
     # def precheck(self, from_account: int, to_account: int, amount: float,
     #              currency: str | None, note: str | None) -> Dict[str, Any]:
     #     if amount is None or amount <= 0:
@@ -120,15 +113,86 @@ class PaymentService:
     #     }
     def precheck(self, from_account: int, to_account: int, amount: float,
                   currency: str | None, note: str | None, customer_id: int = None) -> Dict[str, Any]:
+        bad = self._check_amount(amount)
+        if bad:
+            return bad
+
+        # iki hesap + sahiplik için customer_id + bugünkü çıkış toplamı: tek sorgu
+        ctx = self.repo.get_transfer_context(from_account, to_account, today_str())
+        acc_from = ctx["from_account"]
+        return self._check_transfer(acc_from, ctx["to_account"], from_account, to_account, amount,
+                                    currency, note, customer_id,
+                                    available=acc_from["balance"] if acc_from else 0.0,
+                                    used_today=ctx["used_today"])
+
+    def precheck_by_type(self, customer_id: int, from_account_type: str, to_account_type: str,
+                         amount: float, currency: str | None, note: str | None) -> Dict[str, Any]:
+        """
+        Hesap türleriyle transfer ön kontrolü. Müşterinin hesapları ve bugünkü
+        kullanım tek sorguda okunur; her iki tür aynı listeden çözülür.
+        Başarılıysa precheck ile aynı sözlük döner (from_account/to_account id'leri dahil).
+        """
+        try:
+            accounts, used_today = self.repo.get_customer_transfer_context(customer_id, today_str())
+        except Exception as e:
+            return {"ok": False, "error": "find_account_error", "message": f"Hesap bulunurken hata: {str(e)}"}
+
+        pair = self._pick_transfer_pair(accounts, from_account_type, to_account_type)
+        if not pair.get("ok"):
+            return pair
+
+        bad = self._check_amount(amount)
+        if bad:
+            return bad
+
+        acc_from, acc_to = pair["from"], pair["to"]
+        return self._check_transfer(acc_from, acc_to, acc_from["account_id"], acc_to["account_id"],
+                                    amount, currency, note, customer_id,
+                                    available=acc_from["balance"], used_today=used_today)
+
+    def resolve_accounts_by_type(self, customer_id: int, from_account_type: str,
+                                 to_account_type: str) -> Dict[str, Any]:
+        """
+        Hesap türlerini müşterinin hesap id'lerine çözer; bakiye/limit kontrolü yapmaz.
+        Dönüş: {"ok": True, "from": hesap, "to": hesap} veya hata sözlüğü.
+        """
+        try:
+            accounts, _ = self.repo.get_customer_transfer_context(customer_id, today_str())
+        except Exception as e:
+            return {"ok": False, "error": "find_account_error", "message": f"Hesap bulunurken hata: {str(e)}"}
+        return self._pick_transfer_pair(accounts, from_account_type, to_account_type)
+
+    @classmethod
+    def _pick_transfer_pair(cls, accounts: List[Dict[str, Any]], from_account_type: str,
+                            to_account_type: str) -> Dict[str, Any]:
+        from_result = cls._pick_account_by_type(accounts, from_account_type)
+        if not from_result.get("ok"):
+            return from_result
+        to_result = cls._pick_account_by_type(accounts, to_account_type)
+        if not to_result.get("ok"):
+            return to_result
+        return {"ok": True, "from": from_result["account"], "to": to_result["account"]}
+
+    @staticmethod
+    def _check_amount(amount: float) -> Dict[str, Any] | None:
+        """Tutar ve tek işlem limiti kontrolü; geçerliyse None."""
         if amount is None or amount <= 0:
             return {"ok": False, "error": "invalid_amount", "message": "Tutar geçersiz."}
         if amount > PER_TXN_LIMIT:
             return {"ok": False, "error": "per_txn_limit_exceeded",
                     "limit": PER_TXN_LIMIT, "attempt": amount,
                     "message": "Tek işlem limiti aşıldı."}
+        return None
 
-        acc_from = self.repo.get_account(from_account)
-        acc_to = self.repo.get_account(to_account)
+    @staticmethod
+    def _check_transfer(acc_from: Dict[str, Any] | None, acc_to: Dict[str, Any] | None,
+                        from_account: int, to_account: int, amount: float,
+                        currency: str | None, note: str | None, customer_id: int | None,
+                        available: float, used_today: float) -> Dict[str, Any]:
+        """
+        Hesap kayıtları, kullanılabilir bakiye ve bugünkü kullanım üzerinden
+        precheck kurallarını uygular (hesaplar okunduktan sonraki kısım).
+        """
         if not acc_from:
             return {"ok": False, "error": "from_account_not_found", "message": "Kaynak hesap bulunamadı."}
         if not acc_to:
@@ -151,13 +215,12 @@ class PaymentService:
                     "message": "Hesap para birimleri uyumsuz."}
 
         fee = 0.0
-        if float(acc_from["balance"]) < amount + fee:
+        if available < amount + fee:
             return {"ok": False, "error": "insufficient_funds",
                     "required": round(amount + fee, 2),
-                    "available": float(acc_from["balance"]),
+                    "available": available,
                     "message": "Bakiye yetersiz."}
 
-        used_today = self.repo.get_daily_out_total(acc_from["customer_id"], today_str())
         if used_today + amount > DAILY_LIMIT:
             return {"ok": False, "error": "daily_limit_exceeded",
                     "limit": DAILY_LIMIT, "used": used_today, "attempt": amount,
@@ -167,9 +230,33 @@ class PaymentService:
                 "amount": round(amount,2), "currency": ccy, "fee": fee, "note": note or "",
                 "limits": {"per_txn": PER_TXN_LIMIT, "daily": DAILY_LIMIT, "used_today": used_today}}
     
+    @staticmethod
+    def _commit_result(txn: Dict[str, Any]) -> Dict[str, Any]:
+        out = {
+            "ok": True,
+            "txn": {k: v for k, v in txn.items() if k != "idempotent_replay"},
+            "receipt": {
+                "pdf": {"filename": f"receipt_{txn['payment_id']}.pdf"},
+                "hash": txn["payment_id"]
+            }
+        }
+        if txn.get("idempotent_replay"):
+            out["idempotent_replay"] = True
+        return out
+
     def create(self, customer_id: int, from_account: int, to_account: int, amount: float,
-               currency: str | None, note: str | None) -> Dict[str, Any]:
-        # Her transfer için yeni işlem yapılır (idempotency kaldırıldı)
+               currency: str | None, note: str | None, client_ref: str | None = None) -> Dict[str, Any]:
+        """
+        Transferi gerçekleştirir. client_ref verilirse commit idempotenttir:
+        aynı müşteri + client_ref ile tekrar gelen istek (agent retry vb.)
+        bakiyelere dokunmadan ilk commit'in sonucunu döner. Aynı client_ref farklı
+        hesap / tutar / para birimiyle gelirse idempotency_key_conflict döner.
+        """
+        client_ref = (client_ref or "").strip() or None
+        replay = self.replay(customer_id, client_ref, from_account, to_account, amount, currency)
+        if replay is not None:
+            return replay
+
         pre = self.precheck(from_account, to_account, amount, currency, note, customer_id)
         if not pre.get("ok"):
             return pre
@@ -182,21 +269,96 @@ class PaymentService:
                 amount=float(pre["amount"]),
                 currency=pre["currency"],
                 fee=float(pre["fee"]),
-                note=pre.get("note") or ""
+                note=pre.get("note") or "",
+                idempotency_key=client_ref,
             )
-            return {
-                "ok": True,
-                "txn": txn,
-                "receipt": {
-                    "pdf": {"filename": f"receipt_{txn['payment_id']}.pdf"},
-                    "hash": txn["payment_id"]
-                }
-            }
+            return self._commit_result(txn)
         except ValueError as ve:
-            return {"ok": False, "error": str(ve)}
+            return self._commit_error(str(ve))
         except Exception as e:
             return {"ok": False, "error": "create_failed", "detail": type(e).__name__}
-        
+
+    def replay(self, customer_id: int, client_ref: str | None, from_account: int, to_account: int,
+               amount: float, currency: str | None) -> Dict[str, Any] | None:
+        """
+        client_ref ile daha önce commit edilmiş transferin sonucu (yoksa None).
+        Ön kontrolden önce çağrılmalıdır: ilk commit bakiyeyi / günlük limiti
+        tüketmiş olabilir, tekrar deneme yine de saklı sonucu almalıdır.
+        """
+        client_ref = (client_ref or "").strip() or None
+        if not client_ref:
+            return None
+        try:
+            stored = self.repo.find_idempotent_result(customer_id, client_ref, from_account, to_account,
+                                                      amount, currency)
+        except ValueError as ve:
+            return self._commit_error(str(ve))
+        if stored is None:
+            return None
+        return self._commit_result({**stored, "idempotent_replay": True})
+
+    @staticmethod
+    def _commit_error(code: str) -> Dict[str, Any]:
+        if code == "idempotency_key_conflict":
+            return {"ok": False, "error": code,
+                    "message": "Bu işlem anahtarı (client_ref) farklı bir transfer için kullanılmış. "
+                               "Yeni bir ön kontrol yapıp yeni anahtarla onaylayın."}
+        return {"ok": False, "error": code}
+
+    def create_batch(self, customer_id: int, transfers: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Toplu transfer (düzenli ödeme talimatı, maaş bölüştürme vb.).
+
+        Tüm kalemler, repo'nun BEGIN IMMEDIATE altında bir kez okuduğu bakiye/limit
+        anlık görüntüsüne karşı sırayla doğrulanır (önceki kalemlerin bakiye ve günlük
+        limit etkisi dikkate alınır); geçerli olanlar aynı transaction içinde yazılır.
+
+        transfers: [{"from_account", "to_account", "amount", "currency"?, "note"?}, ...]
+        Dönüş: {ok, posted, failed, results:[{index, ok, txn|error, ...}]}
+        """
+        if not transfers:
+            return {"ok": False, "error": "empty_batch", "message": "Transfer listesi boş."}
+        try:
+            items = [{
+                "from_account": int(t["from_account"]),
+                "to_account": int(t["to_account"]),
+                "amount": float(t["amount"]),
+                "currency": t.get("currency"),
+                "note": t.get("note"),
+            } for t in transfers]
+        except Exception:
+            return {"ok": False, "error": "invalid_batch", "message": "Transfer kalemleri geçersiz."}
+
+        def plan(accounts: Dict[int, Dict[str, Any]], used: Dict[int, float]) -> List[Dict[str, Any]]:
+            available = {aid: acc["balance"] for aid, acc in accounts.items()}
+            used = dict(used)
+            decisions = []
+            for it in items:
+                acc_from = accounts.get(it["from_account"])
+                owner = acc_from["customer_id"] if acc_from else None
+                pre = self._check_amount(it["amount"]) or self._check_transfer(
+                    acc_from, accounts.get(it["to_account"]),
+                    it["from_account"], it["to_account"], it["amount"], it["currency"], it["note"],
+                    customer_id, available=available.get(it["from_account"], 0.0),
+                    used_today=used.get(owner, 0.0),
+                )
+                if pre.get("ok"):
+                    # anlık görüntüyü ilerlet: sonraki kalemler bu kalemin etkisini görür
+                    available[it["from_account"]] -= pre["amount"] + pre["fee"]
+                    available[it["to_account"]] += pre["amount"]
+                    used[owner] = used.get(owner, 0.0) + pre["amount"]
+                decisions.append(pre)
+            return decisions
+
+        try:
+            posted = self.repo.insert_payments_posted_batch(customer_id, items, plan)
+        except Exception as e:
+            return {"ok": False, "error": "create_failed", "detail": type(e).__name__}
+
+        results = [{"index": idx, **(self._commit_result(res) if res.get("payment_id") else res)}
+                   for idx, res in enumerate(posted)]
+        ok_count = sum(1 for r in results if r.get("ok"))
+        return {"ok": ok_count > 0, "posted": ok_count, "failed": len(results) - ok_count, "results": results}
 
     def card_limit_increase_request(
         self,
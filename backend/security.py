@@ -1,5 +1,5 @@
 import re
-from typing import Any, Dict, List, Optional, Tuple, Union
+from typing import Any, Dict, List, Optional, Union
 
 # 1) LLM sistem kuralları: sistem prompt’a eklenecek ek politika metni
 SYSTEM_POLICY_APPEND = """
@@ -22,6 +22,8 @@ _INJECTION_PATTERNS = [
     r"show (hidden|internal) (notes|policy|prompt)",
     r"<think>.*?</think>",
 ]
+_INJECTION_RES = [re.compile(p, re.IGNORECASE | re.DOTALL) for p in _INJECTION_PATTERNS]
+_THINK_RE = re.compile(r"<think>.*?</think>", re.IGNORECASE | re.DOTALL)
 
 # 3) HTML temizleme
 _HTML_DANGEROUS_TAGS = [
@@ -31,26 +33,25 @@ _HTML_DANGEROUS_TAGS = [
     ("<embed", "</embed>"),
     ("<style", "</style>"),
 ]
-_HTML_ATTR_PATTERN = re.compile(r"\son\w+\s*=\s*['\"].*?['\"]", re.IGNORECASE | re.DOTALL)
+_HTML_ATTR = r"\son\w+\s*=\s*['\"].*?['\"]"
+# açılış etiketinden kapanışına kadar; kapanış yoksa metnin sonuna kadar (kırpılır)
+_HTML_TAG = r"<(?P<tag>%s)(?:.*?</(?P=tag)>|.*\Z)" % "|".join(open_tag[1:] for open_tag, _ in _HTML_DANGEROUS_TAGS)
+_HTML_RE = re.compile(f"{_HTML_TAG}|{_HTML_ATTR}", re.IGNORECASE | re.DOTALL)
 
 def strip_dangerous_html(s: Optional[str]) -> Optional[str]:
+    """
+    Tehlikeli etiket bloklarını ve on* olay özniteliklerini tek derlenmiş regex ile,
+    soldan sağa tek geçişte siler. Silme yeni bir etiket oluşturabileceği için
+    ("<scr<script></script>ipt>") eşleşme kalmayana kadar tekrarlanır; normal
+    girdide bu tek geçiştir.
+    """
     if not isinstance(s, str) or not s:
         return s
     txt = s
-    low = txt.lower()
-    for open_tag, close_tag in _HTML_DANGEROUS_TAGS:
-        while True:
-            lo = low.find(open_tag)
-            if lo == -1:
-                break
-            hi = low.find(close_tag, lo)
-            if hi == -1:
-                txt = txt[:lo]
-                break
-            txt = txt[:lo] + txt[hi + len(close_tag):]
-            low = txt.lower()
-    txt = _HTML_ATTR_PATTERN.sub("", txt)
-    return txt
+    while True:
+        txt, n = _HTML_RE.subn("", txt)
+        if not n:
+            return txt
 
 # 4) Metin sanitizasyonu
 def sanitize_text_out(
@@ -65,14 +66,16 @@ def sanitize_text_out(
 
     # Injection desenleri
     if replace_injections:
-        for pat in _INJECTION_PATTERNS:
-            t = re.sub(pat, "[blocked]", t, flags=re.IGNORECASE | re.DOTALL)
+        for pat in _INJECTION_RES:
+            t = pat.sub("[blocked]", t)
 
     # Düşünme bloklarını tamamen temizle
-    t = re.sub(r"<think>.*?</think>", "", t, flags=re.IGNORECASE | re.DOTALL)
-
-    # Zararlı HTML kırpma
-    t = strip_dangerous_html(t) or ""
+    if "<" in t:
+        t = _THINK_RE.sub("", t)
+        # Zararlı HTML kırpma
+        t = strip_dangerous_html(t) or ""
+    elif "=" in t:
+        t = strip_dangerous_html(t) or ""
 
     if len(t) > max_len:
         t = t[:max_len] + "..."
@@ -82,25 +85,115 @@ def sanitize_text_out(
 _SENSITIVE_KEYS = {"api_key","apikey","token","secret","authorization","session","password","passwd",
                    "iban","tc","tckn","ssn","email","mail","phone","tel","card","cvv","cvc"}
 
+_IBAN = r"\bTR\d{20,26}\b"
+_LONG_DIGITS = r"\b\d{11,}\b"
+_EMAIL = r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}"
+_IBAN_RE = re.compile(_IBAN, re.IGNORECASE)
+_LONG_DIGITS_RE = re.compile(_LONG_DIGITS)
+_EMAIL_RE = re.compile(_EMAIL)
+# bu karakterlerden / 11+ haneli bir diziden hiçbiri yoksa string'e dokunulmaz
+_NEEDS_SANITIZE_RE = re.compile(r"[<=@]|\d{11}")
+
 def _mask_value(val: str) -> str:
     if not isinstance(val, str):
         return val  # primitive dışındaki türlere dokunma
     # kaba veri maskeleme
-    v = re.sub(r'\bTR\d{20,26}\b', 'TR**', val, flags=re.IGNORECASE)
-    v = re.sub(r'\b\d{11,}\b', '*', v)
-    v = re.sub(r'[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}', '@', v)
+    v = _IBAN_RE.sub('TR**', val)
+    v = _LONG_DIGITS_RE.sub('*', v)
+    v = _EMAIL_RE.sub('@', v)
     return v
 
 JsonLike = Union[Dict[str, Any], List[Any], str, int, float, bool, None]
 
+
+class ToolOutputSanitizer:
+    """
+    Derlenmiş, tek geçişli tool çıktısı temizleyicisi.
+
+    Tehlikeli HTML blokları, on* öznitelikleri ve PII (IBAN, 11+ haneli sayılar,
+    e-posta) tek bir birleşik regex ile tek taramada işlenir. '<', '=', '@'
+    içermeyen ve 11+ haneli sayı dizisi olmayan string'ler (çıktının büyük kısmı:
+    tarih, tutar, açıklama) regex'e hiç girmez.
+
+    iban_mask=None ise IBAN'lar maskelenmez. Eşleşmeler soldan sağa uygulanır;
+    sıralı sub() zincirinden farkı yalnızca çakışan kalıplardadır (ör. rakam dizisi
+    içeren e-posta yerel kısmı) ve bu durumda daha fazla maskeler.
+    """
+
+    def __init__(self, *, iban_mask: Optional[str] = "TR**", digits_mask: str = "*",
+                 email_mask: str = "@", max_str_len: int = 4000):
+        self.max_str_len = max_str_len
+        parts = [f"(?P<html>{_HTML_TAG}|{_HTML_ATTR})"]
+        self._masks = {"digits": digits_mask, "email": email_mask}
+        if iban_mask is not None:
+            parts.append(f"(?P<iban>{_IBAN})")
+            self._masks["iban"] = iban_mask
+        parts += [f"(?P<digits>{_LONG_DIGITS})", f"(?P<email>{_EMAIL})"]
+        self._re = re.compile("|".join(parts), re.IGNORECASE | re.DOTALL)
+
+    def _replace(self, m: "re.Match[str]") -> str:
+        return "" if m.lastgroup == "html" else self._masks[m.lastgroup]
+
+    def clean_str(self, s: str) -> str:
+        if _NEEDS_SANITIZE_RE.search(s):
+            had_html = "<" in s or "=" in s
+            s = self._re.sub(self._replace, s)
+            # HTML silinince birleşen parçalar yeni eşleşme oluşturabilir
+            while had_html and _HTML_RE.search(s):
+                s = self._re.sub(self._replace, s)
+        if len(s) > self.max_str_len:
+            s = s[:self.max_str_len] + "..."
+        return s
+
+    def __call__(self, obj: JsonLike) -> JsonLike:
+        if isinstance(obj, str):
+            return self.clean_str(obj)
+        if isinstance(obj, (dict, list)):
+            return self._walk(obj)
+        return obj
+
+    def _walk(self, obj: Union[Dict[str, Any], List[Any]]) -> JsonLike:
+        # sıcak döngü: temiz string'ler (çoğunluk) için fonksiyon çağrısı yapılmaz
+        needs, max_len, clean_str, walk = _NEEDS_SANITIZE_RE.search, self.max_str_len, self.clean_str, self._walk
+        if isinstance(obj, dict):
+            clean: Dict[str, Any] = {}
+            for k, v in obj.items():
+                if (k.lower() if type(k) is str else str(k).lower()) in _SENSITIVE_KEYS:
+                    clean[k] = "*"
+                elif type(v) is str:
+                    clean[k] = v if len(v) <= max_len and needs(v) is None else clean_str(v)
+                elif isinstance(v, (dict, list)):
+                    clean[k] = walk(v)
+                else:
+                    clean[k] = self(v)
+            return clean
+        out: List[Any] = []
+        for v in obj:
+            if type(v) is str:
+                out.append(v if len(v) <= max_len and needs(v) is None else clean_str(v))
+            elif isinstance(v, (dict, list)):
+                out.append(walk(v))
+            else:
+                out.append(self(v))
+        return out
+
+
+_DEFAULT_SANITIZERS: Dict[int, ToolOutputSanitizer] = {}
+
 def sanitize_tool_output(obj: JsonLike, *, mask_fn=None, max_str_len: int = 4000) -> JsonLike:
     """
     Tool’tan dönen objeyi güvenli biçimde temizler.
     - Tehlikeli HTML’i kırpar
     - Hassas anahtarları maskeler
     - Aşırı uzun string’leri kısaltır
-    - mask_fn verilirse ek maskeleme uygular
+    - mask_fn verilirse ek maskeleme uygular (derlenmiş yol yerine string başına çağrılır;
+      sık kullanılan maskeler için ToolOutputSanitizer tercih edilmeli)
     """
+    if mask_fn is None:
+        sanitizer = _DEFAULT_SANITIZERS.get(max_str_len)
+        if sanitizer is None:
+            sanitizer = _DEFAULT_SANITIZERS[max_str_len] = ToolOutputSanitizer(max_str_len=max_str_len)
+        return sanitizer(obj)
     if isinstance(obj, dict):
         clean: Dict[str, Any] = {}
         for k, v in obj.items():
@@ -115,12 +208,9 @@ def sanitize_tool_output(obj: JsonLike, *, mask_fn=None, max_str_len: int = 4000
     if isinstance(obj, str):
         s = obj
         s = strip_dangerous_html(s) or ""
-        if mask_fn:
-            try:
-                s = mask_fn(s)
-            except Exception:
-                s = _mask_value(s)
-        else:
+        try:
+            s = mask_fn(s)
+        except Exception:
             s = _mask_value(s)
         if len(s) > max_str_len:
             s = s[:max_str_len] + "..."
@@ -132,8 +222,8 @@ def looks_like_injection(s: Optional[str]) -> bool:
     if not isinstance(s, str) or not s:
         return False
     txt = s.strip()
-    for pat in _INJECTION_PATTERNS:
-        if re.search(pat, txt, flags=re.IGNORECASE | re.DOTALL):
+    for pat in _INJECTION_RES:
+        if pat.search(txt):
             return True
     return False
 
@@ -0,0 +1,46 @@
+# backend/stage_timing.py
+"""
+İstek başına aşama süreleri (auth, history, memory, llm, tools, format, agent).
+
+main.py'deki middleware her HTTP isteği için begin() ile boş bir sözlük açar;
+kod stage("llm") bloğu veya record("llm", ms) ile süre ekler (aynı aşama
+birden çok kez ölçülürse toplanır). Sözlük contextvar'da tutulur: FastAPI'nin
+thread havuzu ve LangGraph'ın alt görevleri bağlamı kopyalasa da aynı sözlüğe
+yazarlar. Sonuç Server-Timing başlığıyla döner (bench/chat_load.py okur).
+
+HTTP isteği dışında (bench, script) tüm çağrılar etkisizdir.
+"""
+
+from __future__ import annotations
+import contextlib
+import contextvars
+import time
+from typing import Dict, Optional
+
+_stages: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar("stage_timing", default=None)
+
+
+def begin() -> Dict[str, float]:
+    stages: Dict[str, float] = {}
+    _stages.set(stages)
+    return stages
+
+
+def record(name: str, ms: float) -> None:
+    stages = _stages.get()
+    if stages is not None:
+        stages[name] = stages.get(name, 0.0) + ms
+
+
+@contextlib.contextmanager
+def stage(name: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, (time.perf_counter() - t0) * 1000)
+
+
+def server_timing(stages: Dict[str, float]) -> str:
+    """{"llm": 812.4} -> 'llm;dur=812.4' (RFC Server-Timing)."""
+    return ", ".join(f"{name};dur={ms:.1f}" for name, ms in stages.items())
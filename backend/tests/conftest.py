@@ -0,0 +1,52 @@
+# tests/conftest.py
+"""
+Ortak fixture'lar. Testler backend dizininden çalışır (python -m pytest -q tests);
+veritabanı testleri dummy_bank.db'nin geçici bir kopyasını kullanır, repo'daki
+dosyaya yazılmaz.
+"""
+import importlib
+import os
+import shutil
+import sqlite3
+import sys
+
+import pytest
+
+BACKEND = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+for path in (BACKEND, os.path.dirname(BACKEND)):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+@pytest.fixture
+def bank_db(tmp_path):
+    """dummy_bank.db'nin test başına kopyası."""
+    path = tmp_path / "bank.db"
+    shutil.copy(os.path.join(BACKEND, "dummy_bank.db"), path)
+    return str(path)
+
+
+@pytest.fixture
+def transfer_accounts(bank_db):
+    """(customer_id, kaynak, hedef, para birimi): aynı müşterinin aktif, aynı para birimli iki hesabı."""
+    con = sqlite3.connect(bank_db)
+    try:
+        return con.execute("""
+          SELECT a.customer_id, a.account_id, b.account_id, a.currency
+          FROM accounts a JOIN accounts b
+            ON b.customer_id = a.customer_id AND b.currency = a.currency AND b.account_id <> a.account_id
+          WHERE a.status = 'Aktif' AND b.status = 'Aktif' AND a.balance > 1000
+          ORDER BY a.account_id LIMIT 1
+        """).fetchone()
+    finally:
+        con.close()
+
+
+@pytest.fixture
+def server(bank_db, monkeypatch):
+    """mcp_server.server'ı geçici DB kopyasıyla yeniden yükler."""
+    monkeypatch.setenv("BANK_DB_PATH", bank_db)
+    for name in ("backend.config_local", "mcp_server.server"):
+        sys.modules.pop(name, None)
+    yield importlib.import_module("mcp_server.server")
+    sys.modules.pop("mcp_server.server", None)
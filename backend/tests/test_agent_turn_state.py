@@ -0,0 +1,50 @@
+# tests/test_agent_turn_state.py
+import asyncio
+import time
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from agent.AdvancedAgent import BankingAgent
+
+
+class _SlowMemory:
+    """Müşteriye göre farklı geçmiş; A'nın okuması B'nin turu başladıktan sonra biter."""
+    DELAY = {1: 0.2, 2: 0.0}
+
+    def load(self, customer_id, chat_id, text):
+        time.sleep(self.DELAY[customer_id])
+        return f"özet-{chat_id}", [HumanMessage(content=f"önceki-{chat_id}")]
+
+
+class _RecordingGraph:
+    def __init__(self):
+        self.prompts = {}
+
+    async def ainvoke(self, inputs):
+        messages = inputs["messages"]
+        await asyncio.sleep(0.05)  # diğer tur araya girsin
+        self.prompts[messages[-1].content] = messages
+        return {"messages": [*messages, AIMessage(content="tamam")]}
+
+
+def test_interleaved_turns_build_their_own_prompts():
+    agent = BankingAgent()
+    agent.memory = _SlowMemory()
+    agent.agent = _RecordingGraph()
+
+    async def scenario():
+        a = asyncio.create_task(agent.run_with_tools("A sorusu", customer_id=1, session_id="s1", chat_id="chat-a"))
+        await asyncio.sleep(0.05)  # A geçmişi okurken B başlar
+        b = asyncio.create_task(agent.run_with_tools("B sorusu", customer_id=2, session_id="s2", chat_id="chat-b"))
+        await asyncio.gather(a, b)
+
+    asyncio.run(scenario())
+
+    for text, customer_id, chat in (("A sorusu", 1, "chat-a"), ("B sorusu", 2, "chat-b")):
+        system, previous, user = agent.agent.prompts[text]
+        assert f"Müşteri ID: {customer_id} " in system.content
+        assert f"özet-{chat}" in system.content
+        other = "chat-b" if chat == "chat-a" else "chat-a"
+        assert other not in system.content
+        assert previous.content == f"önceki-{chat}"
+        assert user.content == text
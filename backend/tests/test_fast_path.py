@@ -0,0 +1,34 @@
+# tests/test_fast_path.py
+import pytest
+
+from agent.fast_path import IntentRouter
+
+
+@pytest.mark.parametrize("text, account_type", [
+    ("yatırım hesabı bakiyem", "yatirim"),
+    ("Yatırım hesabımın bakiyesi ne kadar", "yatirim"),
+    ("maaş hesabımın bakiyesi", "maas"),
+    ("bakiyem vadesiz", "vadesiz"),
+])
+def test_balance_by_type(text, account_type):
+    assert IntentRouter().route(text) == ("balance_by_type", "get_balance_by_account_type",
+                                          {"account_type": account_type})
+
+
+@pytest.mark.parametrize("text", [
+    "yatırım hesabıma para yatır",
+    "vadesiz hesaba para yatırmak istiyorum",
+    "maaş hesabımdan yatırım hesabıma gönder",
+    "yatırdığım para bakiyeye geçti mi",
+])
+def test_transfer_verbs_go_to_react(text):
+    assert IntentRouter().route(text) is None
+
+
+def test_agent_and_accounts_share_one_turkish_fold():
+    from agent import fast_path, response_cache, tool_selector
+    from mcp_server.data import account_types
+
+    assert fast_path.fold_tr is response_cache.fold_tr is tool_selector.fold_tr is account_types.fold_tr
+    assert account_types.fold_tr("  Maaş  HESABI ") == "maas hesabi"
+    assert account_types.fold_tr(None) == ""
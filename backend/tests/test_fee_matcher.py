@@ -0,0 +1,44 @@
+# tests/test_fee_matcher.py
+import os
+import sqlite3
+
+import pytest
+
+from mcp_server.data.reference_data import FeeMatcher
+
+
+@pytest.fixture(scope="module")
+def matcher():
+    db = os.path.join(os.path.dirname(__file__), "..", "dummy_bank.db")
+    con = sqlite3.connect(f"file:{db}?mode=ro", uri=True)
+    con.row_factory = sqlite3.Row
+    try:
+        return FeeMatcher([dict(r) for r in con.execute("SELECT service_code, description FROM fees")])
+    finally:
+        con.close()
+
+
+@pytest.mark.parametrize("query, code", [
+    ("eft ücreti ne kadar", "eft"),
+    ("havaleden ücret", "havale"),
+    ("yurtdışı transfer", "swift"),
+    ("ATM'den para çekme", "atm_withdrawal"),
+    ("kart değişim ücreti", "card_replacement"),
+    ("hesap bakım", "account_maintenance"),
+    ("atm pin değiştirme", "atm_pin_change"),
+    ("elektronk fon transferi", "eft"),
+])
+def test_resolves_service_code(matcher, query, code):
+    assert matcher.resolve(query)["service_code"] == code
+
+
+@pytest.mark.parametrize("query", [
+    "kart aidatı",                 # tek ortak kelime ("kart") yetmez
+    "kredi kartı yıllık ücreti",
+    "hesap işletim ücreti",
+    "transfer",                    # eft / fast / swift arasında belirsiz
+])
+def test_partial_or_ambiguous_match_is_not_resolved(matcher, query):
+    res = matcher.resolve(query)
+    assert res["service_code"] is None
+    assert res["match"] is None
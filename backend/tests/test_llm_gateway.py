@@ -0,0 +1,181 @@
+# tests/test_llm_gateway.py
+"""
+LLM ağ geçidi (agent/llm_gateway.py), bench/mock_llm sahte OpenAI sunucusuna karşı.
+Sunucu ASGI taşımasıyla aynı süreçte çalışır; gecikme ve hatalar mock_llm.faults ile
+model adına göre enjekte edilir (birincil: "primary-model", yedek: "fallback-model").
+"""
+import asyncio
+import importlib
+import sys
+import time
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from starlette.testclient import TestClient
+
+from agent import llm_gateway
+from agent.llm_gateway import build_http_client, llm_deadline
+from bench import mock_llm
+
+BASE = "http://mock-llm/v1"
+PRIMARY, FALLBACK = "primary-model", "fallback-model"
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    monkeypatch.setitem(mock_llm.settings, "final_ms", 10.0)
+    for state in (mock_llm.faults, mock_llm.served, mock_llm.by_model, mock_llm.cancelled):
+        state.clear()
+    yield mock_llm
+    mock_llm.faults.clear()
+
+
+def _gateway(fallback: bool = False):
+    extra = {"fallback_api_base": BASE, "fallback_model": FALLBACK} if fallback else {}
+    return build_http_client(BASE, transport=httpx.ASGITransport(app=mock_llm.app), **extra)
+
+
+async def _chat(http: httpx.AsyncClient) -> httpx.Response:
+    return await http.post(f"{BASE}/chat/completions",
+                           json={"model": PRIMARY, "messages": [{"role": "user", "content": "merhaba"}]})
+
+
+def test_hedge_wins_and_cancels_the_slow_request(llm, monkeypatch):
+    monkeypatch.setattr(llm_gateway, "LLM_HEDGE_MIN_SAMPLES", 5)
+    monkeypatch.setattr(llm_gateway, "LLM_HEDGE_MIN_DELAY_SECONDS", 0.05)
+    http, gateway = _gateway()
+
+    async def scenario():
+        for _ in range(5):  # p95 için örnek
+            assert (await _chat(http)).status_code == 200
+        llm.faults[PRIMARY] = {"slow_next": 1, "slow_ms": 3000}
+        started = time.perf_counter()
+        response = await _chat(http)
+        elapsed = time.perf_counter() - started
+        await asyncio.sleep(0.05)  # iptal edilen görevin sunucuda sonlanması
+        await gateway.aclose()
+        return response, elapsed
+
+    response, elapsed = asyncio.run(scenario())
+
+    assert response.status_code == 200
+    assert elapsed < 1.0
+    assert gateway.counters["hedges"] == 1 and gateway.counters["hedge_wins"] == 1
+    assert llm.by_model[PRIMARY] == 7
+    assert llm.cancelled[PRIMARY] == 1
+
+
+def test_retry_budget_caps_upstream_retries(llm):
+    llm.faults[PRIMARY] = {"status": 503}
+    http, gateway = _gateway()
+    gateway.budget.minimum, gateway.budget.ratio = 2, 0.0
+
+    async def scenario():
+        statuses = [(await _chat(http)).status_code for _ in range(4)]
+        await gateway.aclose()
+        return statuses
+
+    statuses = asyncio.run(scenario())
+
+    assert statuses == [503] * 4
+    # ilk istek iki tekrarla bütçeyi bitirir; sonrakiler tek denemede kalır
+    assert llm.by_model[PRIMARY] == 3 + 1 + 1 + 1
+    assert gateway.counters["retries"] == 2
+    assert gateway.counters["budget_exhausted"] == 3
+
+
+def test_overall_deadline_stops_a_hung_upstream(llm, monkeypatch):
+    monkeypatch.setattr(llm_gateway, "LLM_MIN_ATTEMPT_SECONDS", 0.1)
+    llm.faults[PRIMARY] = {"delay_ms": 30_000}
+    http, gateway = _gateway()
+
+    async def scenario():
+        started = time.perf_counter()
+        with llm_deadline(0.5):
+            with pytest.raises(httpx.ReadTimeout):
+                await _chat(http)
+        elapsed = time.perf_counter() - started
+        await asyncio.sleep(0.05)
+        await gateway.aclose()
+        return elapsed
+
+    elapsed = asyncio.run(scenario())
+
+    assert elapsed < 1.0
+    assert gateway.counters["deadline_exceeded"] == 1
+    assert llm.by_model[PRIMARY] == 1 and llm.cancelled[PRIMARY] == 1
+
+
+def test_failing_primary_falls_back_to_secondary_model(llm):
+    llm.faults[PRIMARY] = {"status": 503}
+    http, gateway = _gateway(fallback=True)
+
+    async def scenario():
+        response = await _chat(http)
+        await gateway.aclose()
+        return response
+
+    response = asyncio.run(scenario())
+
+    assert response.status_code == 200
+    assert response.json()["model"] == FALLBACK  # model alanı yedek için yeniden yazıldı
+    assert llm.by_model == {PRIMARY: gateway.max_attempts, FALLBACK: 1}
+    assert gateway.counters["fallbacks"] == 1
+    endpoints = gateway.stats()["endpoints"]
+    assert endpoints["primary"]["errors"] == gateway.max_attempts
+    assert endpoints["fallback"] == {**endpoints["fallback"], "calls": 1, "errors": 0}
+
+
+def test_timed_out_primary_skips_retries_and_uses_fallback(llm):
+    llm.faults[PRIMARY] = {"delay_ms": 30_000}
+    http, gateway = _gateway(fallback=True)
+    gateway.attempt_timeout = 0.3
+
+    async def scenario():
+        started = time.perf_counter()
+        response = await _chat(http)
+        elapsed = time.perf_counter() - started
+        await gateway.aclose()
+        return response, elapsed
+
+    response, elapsed = asyncio.run(scenario())
+
+    assert response.status_code == 200 and response.json()["model"] == FALLBACK
+    assert elapsed < 1.0
+    assert llm.by_model[PRIMARY] == 1
+
+
+@pytest.fixture
+def api(monkeypatch, tmp_path, bank_db):
+    """app.main, geçici sohbet ve banka veritabanlarıyla."""
+    monkeypatch.setenv("CHAT_DB_PATH", str(tmp_path / "chat.db"))
+    monkeypatch.setenv("BANK_DB_PATH", bank_db)
+    for name in ("chat.chat_history", "app.main", "backend.config_local"):
+        sys.modules.pop(name, None)
+    yield importlib.import_module("app.main")
+    for name in ("chat.chat_history", "app.main"):
+        sys.modules.pop(name, None)
+
+
+def test_metrics_endpoint_reports_gateway_counters(llm, api, monkeypatch):
+    from agent import AdvancedAgent
+
+    llm.faults[PRIMARY] = {"status": 503}
+    http, gateway = _gateway(fallback=True)
+
+    async def scenario():
+        for _ in range(2):
+            assert (await _chat(http)).status_code == 200
+        await gateway.aclose()
+
+    asyncio.run(scenario())
+    monkeypatch.setattr(AdvancedAgent, "_agent_singleton", SimpleNamespace(llm_gateway=gateway))
+
+    stats = TestClient(api.app).get("/metrics/llm").json()
+
+    assert stats["initialized"] is True
+    assert stats["requests"] == 2 and stats["fallbacks"] == 2
+    assert stats["retries"] == 2 * (gateway.max_attempts - 1)
+    assert stats["endpoints"]["fallback"]["calls"] == 2
+    assert stats["endpoints"]["primary"]["errors"] == 2 * gateway.max_attempts
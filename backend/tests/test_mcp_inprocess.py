@@ -0,0 +1,61 @@
+# tests/test_mcp_inprocess.py
+import asyncio
+import time
+
+from fastmcp import FastMCP
+
+from agent.mcp_inprocess import InProcessMCPClient
+
+
+def _server():
+    mcp = FastMCP("test")
+
+    @mcp.tool()
+    def slow_lookup(customer_id: int) -> dict:
+        """Engelleyen (senkron) araç: DB / HTTP çağrısı yerine."""
+        time.sleep(0.3)
+        return {"customer_id": customer_id}
+
+    return mcp
+
+
+def test_sync_tools_do_not_block_the_event_loop():
+    client = InProcessMCPClient(_server())
+
+    async def scenario():
+        ticks = 0
+
+        async def heartbeat():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.02)
+                ticks += 1
+
+        beat = asyncio.create_task(heartbeat())
+        async with client.session() as session:
+            started = time.perf_counter()
+            results = await asyncio.gather(*(session.call_tool("slow_lookup", {"customer_id": i}) for i in range(3)))
+            elapsed = time.perf_counter() - started
+        beat.cancel()
+        return results, elapsed, ticks
+
+    results, elapsed, ticks = asyncio.run(scenario())
+    assert [r.structuredContent for r in results] == [{"customer_id": i} for i in range(3)]
+    assert elapsed < 0.6       # üç çağrı sırayla çalışsaydı ~0.9 s
+    assert ticks >= 5          # döngü araçlar çalışırken de işledi
+
+
+def test_timeout_releases_caller():
+    client = InProcessMCPClient(_server())
+
+    async def scenario():
+        async with client.session() as session:
+            started = time.perf_counter()
+            try:
+                await asyncio.wait_for(session.call_tool("slow_lookup", {"customer_id": 1}), timeout=0.05)
+            except asyncio.TimeoutError:
+                return time.perf_counter() - started
+        return None
+
+    waited = asyncio.run(scenario())
+    assert waited is not None and waited < 0.2
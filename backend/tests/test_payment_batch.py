@@ -0,0 +1,88 @@
+# tests/test_payment_batch.py
+import sqlite3
+
+import pytest
+
+from mcp_server.data.sql_payment_repo import SQLitePaymentRepository, today_str
+from mcp_server.tools import payment_tools
+from mcp_server.tools.payment_tools import PaymentService
+
+
+def _query(db_path, sql, *args):
+    con = sqlite3.connect(db_path)
+    try:
+        return con.execute(sql, args).fetchall()
+    finally:
+        con.close()
+
+
+def _balance(db_path, account_id):
+    return _query(db_path, "SELECT balance FROM accounts WHERE account_id=?", account_id)[0][0]
+
+
+@pytest.fixture
+def service(bank_db):
+    return PaymentService(SQLitePaymentRepository(db_path=bank_db))
+
+
+def test_mixed_batch_posts_valid_items_and_reports_the_rest(service, bank_db, transfer_accounts, monkeypatch):
+    customer_id, src, dst, ccy = transfer_accounts
+    monkeypatch.setattr(payment_tools, "PER_TXN_LIMIT", float("inf"))
+    monkeypatch.setattr(payment_tools, "DAILY_LIMIT", float("inf"))
+    src_before, dst_before = _balance(bank_db, src), _balance(bank_db, dst)
+    txns_before = _query(bank_db, "SELECT COUNT(*) FROM txns")[0][0]
+
+    res = service.create_batch(customer_id, [
+        {"from_account": src, "to_account": dst, "amount": 100.0, "note": "kira"},
+        {"from_account": src, "to_account": 999999, "amount": 10.0},
+        {"from_account": src, "to_account": dst, "amount": -5},
+        {"from_account": src, "to_account": dst, "amount": src_before},  # ilk kalemden sonra bakiye yetmez
+        {"from_account": dst, "to_account": src, "amount": 40.0},
+    ])
+
+    assert (res["ok"], res["posted"], res["failed"]) == (True, 2, 3)
+    assert [r["index"] for r in res["results"]] == [0, 1, 2, 3, 4]
+    assert [r["ok"] for r in res["results"]] == [True, False, False, False, True]
+    assert [r.get("error") for r in res["results"][1:4]] == ["to_account_not_found", "invalid_amount",
+                                                            "insufficient_funds"]
+    assert res["results"][3]["available"] == pytest.approx(src_before - 100.0)
+
+    assert _balance(bank_db, src) == pytest.approx(src_before - 60.0)
+    assert _balance(bank_db, dst) == pytest.approx(dst_before + 60.0)
+    assert res["results"][4]["txn"]["to_balance_after"] == pytest.approx(src_before - 60.0)
+    assert _query(bank_db, "SELECT COUNT(*) FROM txns")[0][0] == txns_before + 4
+    assert _query(bank_db, "SELECT description FROM txns WHERE account_id=? AND amount=-100.0", src) == \
+        [(f"Transfer: #{dst} | kira",)]
+    # sayaç kaynak hesabın sahibine işlenir
+    assert service.repo.get_daily_out_total(customer_id, today_str()) == pytest.approx(140.0)
+
+
+def test_batch_stops_items_that_cross_the_daily_limit(service, bank_db, transfer_accounts, monkeypatch):
+    customer_id, src, dst, ccy = transfer_accounts
+    monkeypatch.setattr(payment_tools, "DAILY_LIMIT", 500.0)
+    assert service.create(customer_id, src, dst, 150.0, ccy, None)["ok"]
+    src_before = _balance(bank_db, src)
+
+    res = service.create_batch(customer_id, [
+        {"from_account": src, "to_account": dst, "amount": 200.0},
+        {"from_account": src, "to_account": dst, "amount": 200.0},
+        {"from_account": src, "to_account": dst, "amount": 150.0},
+    ])
+
+    assert [r["ok"] for r in res["results"]] == [True, False, True]
+    blocked = res["results"][1]
+    assert blocked["error"] == "daily_limit_exceeded"
+    assert blocked["used"] == pytest.approx(350.0)
+    assert service.repo.get_daily_out_total(customer_id, today_str()) == pytest.approx(500.0)
+    assert _balance(bank_db, src) == pytest.approx(src_before - 350.0)
+
+
+def test_batch_with_no_valid_items_writes_nothing(service, bank_db, transfer_accounts):
+    customer_id, src, dst, ccy = transfer_accounts
+    payments_before = _query(bank_db, "SELECT COUNT(*) FROM payments")[0][0]
+
+    res = service.create_batch(customer_id, [{"from_account": src, "to_account": dst, "amount": 0}])
+
+    assert (res["ok"], res["posted"], res["failed"]) == (False, 0, 1)
+    assert _query(bank_db, "SELECT COUNT(*) FROM payments")[0][0] == payments_before
+    assert service.create_batch(customer_id, [])["error"] == "empty_batch"
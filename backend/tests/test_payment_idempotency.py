@@ -0,0 +1,55 @@
+# tests/test_payment_idempotency.py
+import sqlite3
+
+import pytest
+
+from mcp_server.data.sql_payment_repo import SQLitePaymentRepository
+from mcp_server.tools.payment_tools import PaymentService
+
+
+def _balance(db_path, account_id):
+    con = sqlite3.connect(db_path)
+    try:
+        return con.execute("SELECT balance FROM accounts WHERE account_id=?", (account_id,)).fetchone()[0]
+    finally:
+        con.close()
+
+
+@pytest.fixture
+def service(bank_db):
+    return PaymentService(SQLitePaymentRepository(db_path=bank_db))
+
+
+def test_same_key_same_request_replays(service, bank_db, transfer_accounts):
+    customer_id, src, dst, ccy = transfer_accounts
+    first = service.create(customer_id, src, dst, 100.0, ccy, "kira", client_ref="ref-1")
+    assert first["ok"] and "idempotent_replay" not in first
+    balance = _balance(bank_db, src)
+
+    again = service.create(customer_id, src, dst, 100.0, ccy, "kira", client_ref="ref-1")
+    assert again["ok"] and again["idempotent_replay"] is True
+    assert again["txn"]["payment_id"] == first["txn"]["payment_id"]
+    assert _balance(bank_db, src) == balance
+
+
+@pytest.mark.parametrize("change", [{"amount": 250.0}, {"swap": True}])
+def test_same_key_different_request_conflicts(service, bank_db, transfer_accounts, change):
+    customer_id, src, dst, ccy = transfer_accounts
+    assert service.create(customer_id, src, dst, 100.0, ccy, None, client_ref="ref-2")["ok"]
+    balances = _balance(bank_db, src), _balance(bank_db, dst)
+
+    if change.get("swap"):
+        src, dst = dst, src
+    res = service.create(customer_id, src, dst, change.get("amount", 100.0), ccy, None, client_ref="ref-2")
+    assert res["ok"] is False
+    assert res["error"] == "idempotency_key_conflict"
+    assert (_balance(bank_db, src), _balance(bank_db, dst)) in (balances, balances[::-1])
+
+
+def test_repo_checks_fingerprint_inside_transaction(bank_db, transfer_accounts):
+    """Ön kontrolü atlayan (eşzamanlı) commit de aynı transaction içinde çakışmayı görür."""
+    repo = SQLitePaymentRepository(db_path=bank_db)
+    customer_id, src, dst, ccy = transfer_accounts
+    repo.insert_payment_posted(customer_id, src, dst, 50.0, ccy, 0.0, "", idempotency_key="ref-3")
+    with pytest.raises(ValueError, match="idempotency_key_conflict"):
+        repo.insert_payment_posted(customer_id, src, dst, 75.0, ccy, 0.0, "", idempotency_key="ref-3")
@@ -0,0 +1,61 @@
+# tests/test_payment_tools.py
+import pytest
+
+from mcp_server.tools import payment_tools
+
+# dummy_bank.db: müşteri 50 → 5 (Vadesiz Mevduat, 7219.18 TRY), 6 (Yatırım, TRY)
+CUSTOMER, SRC, DST, FULL_BALANCE = 50, 5, 6, 7219.18
+
+
+def _call(tool, **kwargs):
+    """MCP aracını doğrudan çağırır; log_tool / içerik sarmalayıcılarını açar."""
+    out = tool.fn(**kwargs)
+    assert out["ok"], out
+    return out["data"]["value"][0]["json"]
+
+
+def _commit(server, client_ref, amount):
+    return _call(server.payment_request, from_account=SRC, to_account=DST, amount=amount,
+                 customer_id=CUSTOMER, confirm=True, client_ref=client_ref)
+
+
+def test_retry_after_full_balance_transfer_replays(server):
+    first = _commit(server, "K1", FULL_BALANCE)
+    assert first["ok"] and first["txn"]["from_balance_after"] == 0.0
+
+    again = _commit(server, "K1", FULL_BALANCE)
+    assert again["ok"] and again["phase"] == "commit" and again["idempotent_replay"] is True
+    assert again["txn"]["payment_id"] == first["txn"]["payment_id"]
+
+    # yeni anahtarla aynı transfer artık ön kontrolde reddedilir
+    fresh = _commit(server, "K2", FULL_BALANCE)
+    assert (fresh["ok"], fresh["phase"], fresh["error"]) == (False, "precheck", "insufficient_funds")
+
+
+def test_retry_after_limit_reaching_transfer_replays(server, monkeypatch):
+    monkeypatch.setattr(payment_tools, "DAILY_LIMIT", 1000.0)
+    first = _commit(server, "L1", 1000.0)
+    assert first["ok"]
+
+    again = _commit(server, "L1", 1000.0)
+    assert again["ok"] and again["idempotent_replay"] is True
+    assert again["txn"]["payment_id"] == first["txn"]["payment_id"]
+    assert server.pay.repo.get_daily_out_total(CUSTOMER, payment_tools.today_str()) == 1000.0
+
+
+def test_retry_by_type_after_full_balance_transfer_replays(server):
+    kwargs = dict(from_account_type="vadesiz", to_account_type="yatırım", amount=FULL_BALANCE,
+                  customer_id=CUSTOMER, confirm=True, client_ref="T1")
+    first = _call(server.payment_request_by_type, **kwargs)
+    assert first["ok"]
+
+    again = _call(server.payment_request_by_type, **kwargs)
+    assert again["ok"] and again["idempotent_replay"] is True
+    assert again["txn"]["payment_id"] == first["txn"]["payment_id"]
+
+
+@pytest.mark.parametrize("amount", [FULL_BALANCE, 10.0])
+def test_reused_key_for_another_transfer_still_conflicts(server, amount):
+    assert _commit(server, "C1", 50.0)["ok"]
+    res = _commit(server, "C1", amount)
+    assert (res["ok"], res["error"]) == (False, "idempotency_key_conflict")
@@ -0,0 +1,25 @@
+# tests/test_payment_txns.py
+import sqlite3
+
+from mcp_server.data.sql_payment_repo import SQLitePaymentRepository, today_str
+
+
+def test_transfer_writes_txns_and_owner_counter(bank_db, transfer_accounts):
+    customer_id, src, dst, ccy = transfer_accounts
+    repo = SQLitePaymentRepository(db_path=bank_db)
+    txn = repo.insert_payment_posted(customer_id, src, dst, 120.0, ccy, 0.0, "kira")
+
+    con = sqlite3.connect(bank_db)
+    try:
+        rows = con.execute(
+            "SELECT account_id, amount, txn_type, txn_date, description FROM txns "
+            "WHERE txn_id > (SELECT MAX(txn_id) - 2 FROM txns) ORDER BY txn_id"
+        ).fetchall()
+    finally:
+        con.close()
+
+    assert [(r[0], r[1], r[2]) for r in rows] == [(src, -120.0, "havale"), (dst, 120.0, "havale")]
+    assert rows[0][3][:10] == today_str() and len(rows[0][3]) == 19
+    assert rows[0][4] == f"Transfer: #{dst} | kira"
+    assert repo.get_daily_out_total(customer_id, today_str()) == 120.0
+    assert txn["from_balance_after"] is not None
@@ -0,0 +1,17 @@
+# tests/test_read_cache_metrics.py
+from starlette.testclient import TestClient
+
+
+def test_read_cache_hit_ratio_is_exposed(server, transfer_accounts):
+    customer_id = transfer_accounts[0]
+    server.repo.get_accounts_by_customer(customer_id)  # miss
+    server.repo.get_accounts_by_customer(customer_id)  # hit
+
+    with TestClient(server.mcp.http_app(transport="sse")) as client:
+        resp = client.get("/metrics/read-cache")
+
+    assert resp.status_code == 200
+    stats = resp.json()
+    assert stats["hits"] == 1 and stats["misses"] == 1
+    assert stats["hit_ratio"] == 0.5
+    assert {"invalidations", "entries", "ttl_seconds", "reference_reloads"} <= stats.keys()
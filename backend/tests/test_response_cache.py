@@ -0,0 +1,97 @@
+# tests/test_response_cache.py
+import pytest
+
+from agent import response_cache
+from agent.response_cache import ResponseCache
+
+FX = {"text": "Güncel kurlar", "ui_component": {"type": "exchange_rates"}}
+
+
+@pytest.fixture(autouse=True)
+def no_reference_throttle(monkeypatch):
+    monkeypatch.setattr(response_cache, "REFERENCE_VERSION_CHECK_SECONDS", 0.0)
+
+
+def test_hit_requires_same_conversation_context():
+    cache = ResponseCache()
+    assert cache.put("Döviz kurları?", FX, ["get_exchange_rates"], context="")
+    assert cache.get("döviz kurları", context="") == FX
+    # aynı soru, geçmişi olan başka bir sohbet: önbellekten cevaplanmaz
+    assert cache.get("döviz kurları", context="3f2a") is None
+
+
+def test_reference_data_change_invalidates():
+    version = {"v": "a"}
+    cache = ResponseCache(reference_version=lambda: version["v"])
+    cache.put("eft ücreti", FX, ["get_fee"])
+    assert cache.get("eft ücreti") == FX
+    version["v"] = "b"  # ücret tablosu güncellendi
+    assert cache.get("eft ücreti") is None
+
+
+def test_unknown_reference_version_bypasses_cache():
+    def broken():
+        raise OSError("db yok")
+    cache = ResponseCache(reference_version=broken)
+    assert cache.put("eft ücreti", FX, ["get_fee"]) is False
+    assert cache.get("eft ücreti") is None
+
+
+def test_history_fingerprint_depends_on_prior_turns():
+    import asyncio
+    from agent.AdvancedAgent import BankingAgent
+    from agent.memory import ConversationMemory
+
+    chats = {
+        "new": [],
+        "a": [{"message_id": 1, "sender": "user", "text": "vadeli hesabım"},
+              {"message_id": 2, "sender": "bot", "text": "Vadeli hesabınız 10.000 TL."}],
+        "b": [{"message_id": 1, "sender": "user", "text": "kartlarım"},
+              {"message_id": 2, "sender": "bot", "text": "İki kartınız var."}],
+    }
+    agent = BankingAgent()
+    agent.memory = ConversationMemory(
+        loader=lambda user, chat, after, limit: [r for r in chats[chat] if r["message_id"] > after])
+
+    async def _fingerprint(chat):
+        agent._prepare_turn("peki ya diğeri?", 7, None, chat)
+        return await agent.history_fingerprint()
+
+    def fingerprint(chat):
+        return asyncio.run(_fingerprint(chat))
+
+    assert fingerprint("new") == ""
+    assert fingerprint("a") and fingerprint("b")
+    assert fingerprint("a") != fingerprint("b")
+    assert fingerprint("a") == fingerprint("a")  # tekrar okuma bağlamı değiştirmez
+
+
+def test_history_is_read_once_per_turn(monkeypatch):
+    """Önbellek anahtarı ve prompt aynı geçmiş okumasını kullanır."""
+    import asyncio
+    from langchain_core.messages import AIMessage, HumanMessage
+    from agent import AdvancedAgent
+
+    loads = []
+
+    class Memory:
+        def load(self, customer_id, chat_id, text):
+            loads.append((customer_id, chat_id))
+            return "özet", [HumanMessage(content="önceki soru")]
+
+    class Graph:
+        async def ainvoke(self, inputs):
+            self.messages = inputs["messages"]
+            return {"messages": [*inputs["messages"], AIMessage(content="tamam")]}
+
+    agent = AdvancedAgent.BankingAgent()
+    agent.memory, agent.agent = Memory(), Graph()
+    monkeypatch.setattr(AdvancedAgent, "_agent_singleton", agent)
+    monkeypatch.setattr(AdvancedAgent, "_response_cache", ResponseCache())
+
+    asyncio.run(AdvancedAgent.agent_handle_message_async("peki ya diğeri?", customer_id=7, session_id="s",
+                                                         chat_id="c"))
+
+    assert loads == [(7, "c")]
+    assert "özet" in agent.agent.messages[0].content
+    assert agent.agent.messages[1].content == "önceki soru"
@@ -0,0 +1,55 @@
+# tests/test_turn_memo.py
+import asyncio
+
+from agent.AdvancedAgent import BankingAgent
+
+
+class _CountingTool:
+    def __init__(self):
+        self.calls = []
+
+    async def ainvoke(self, payload):
+        self.calls.append(dict(payload))
+        await asyncio.sleep(0.05)
+        return {"accounts": [payload["customer_id"]]}
+
+
+def test_concurrent_turns_do_not_share_the_tool_memo():
+    agent = BankingAgent()
+    tool = _CountingTool()
+
+    async def turn(customer_id):
+        agent._prepare_turn("hesaplarım", customer_id, None)
+        await asyncio.sleep(0)  # diğer tur da self alanlarını ezsin
+        # Anahtarda müşteri olmayan aynı argümanlar: tur hafızası paylaşılsaydı A'nın sonucu B'ye dönerdi
+        first = await agent._memo_invoke("get_accounts", tool, {"customer_id": customer_id, "limit": 5})
+        again = await agent._memo_invoke("get_accounts", tool, {"customer_id": customer_id, "limit": 5})
+        shared = await agent._memo_invoke("get_exchange_rates", tool, {"customer_id": 0})
+        return first, again, shared
+
+    async def scenario():
+        return await asyncio.gather(asyncio.create_task(turn(1)), asyncio.create_task(turn(2)))
+
+    (a_first, a_again, _), (b_first, b_again, _) = asyncio.run(scenario())
+
+    assert a_first == a_again == {"accounts": [1]}
+    assert b_first == b_again == {"accounts": [2]}
+    # Her tur kendi içinde tekrarı hafızadan alır, turlar arası ise paylaşım yoktur
+    assert [c["customer_id"] for c in tool.calls].count(1) == 1
+    assert [c["customer_id"] for c in tool.calls].count(2) == 1
+    assert [c["customer_id"] for c in tool.calls].count(0) == 2
+
+
+def test_write_tool_clears_only_its_own_turn():
+    agent = BankingAgent()
+    tool = _CountingTool()
+
+    async def scenario():
+        agent._prepare_turn("bakiye", 7, None)
+        await agent._memo_invoke("get_balance", tool, {"customer_id": 7})
+        await agent._memo_invoke("payment_request", tool, {"customer_id": 7})
+        await agent._memo_invoke("get_balance", tool, {"customer_id": 7})
+
+    asyncio.run(scenario())
+
+    assert [c["customer_id"] for c in tool.calls] == [7, 7, 7]
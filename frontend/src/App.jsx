@@ -63,7 +63,8 @@ const PaymentConfirmationTrigger = ({ uiComponent, setPaymentConfirmationData, s
         fee: data.fee,
         note: data.note,
         limits: data.limits,
-        customer_id: data.customer_id
+        customer_id: data.customer_id,
+        client_ref: data.client_ref
       })
       setShowPaymentConfirmation(true)
     }
@@ -1285,6 +1286,7 @@ function App() {
   const handlePaymentConfirmation = async (paymentData) => {
     try {
       const noteText = paymentData.note ? `, note="${paymentData.note}"` : ''
+      const clientRefText = paymentData.client_ref ? `, client_ref=${paymentData.client_ref}` : ''
       const userMessage = `Transferi onaylıyorum.`
       
       // Add user message to chat first
@@ -1299,7 +1301,7 @@ function App() {
       setMessages(messagesWithUser)
       
       // Call the payment tool with confirm=true
-      const apiMessage = `Transfer onayı: ${paymentData.from_account} numaralı hesabımdan ${paymentData.to_account} numaralı hesabıma ${paymentData.amount} ${paymentData.currency} gönder${noteText}. confirm=True, customer_id=${paymentData.customer_id}`
+      const apiMessage = `Transfer onayı: ${paymentData.from_account} numaralı hesabımdan ${paymentData.to_account} numaralı hesabıma ${paymentData.amount} ${paymentData.currency} gönder${noteText}. confirm=True, customer_id=${paymentData.customer_id}${clientRefText}`
       
       const response = await fetch('http://127.0.0.1:8000/chat', {
         method: 'POST',
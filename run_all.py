@@ -126,12 +126,16 @@ def main():
     threads = []
 
     try:
-        p1, t1 = spawn("MCP", mcp_cmd, BACKEND)
+        # MCP_TRANSPORT=inprocess: MCP sunucusu API sürecinin içinde çalışır, ayrı süreç gerekmez
+        if os.environ.get("MCP_TRANSPORT", "sse") != "inprocess":
+            p1, t1 = spawn("MCP", mcp_cmd, BACKEND)
+            procs.append(("MCP", p1))
+            threads.append(t1)
         p2, t2 = spawn("API", uvicorn_cmd, BACKEND)
         p3, t3 = spawn("WEB", npm_cmd, FRONTEND)
 
-        procs.extend([("MCP", p1), ("API", p2), ("WEB", p3)])
-        threads.extend([t1, t2, t3])
+        procs.extend([("API", p2), ("WEB", p3)])
+        threads.extend([t2, t3])
 
         # Çalışır halde bekle
         while True: